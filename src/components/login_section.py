@@ -0,0 +1,104 @@
+import flet as ft
+from controllers.authentication import auth, AuthenticationError, AuthSession
+from utils.logger import get_logger
+from utils.theme import AppColors, AppTextStyles, AppSpacing
+from typing import Callable
+
+logger = get_logger()
+
+class LoginSection(ft.Container):
+    """Sign-in screen shown until an operator is logged in.
+
+    On a fresh install it creates the first administrator account instead.
+    Password checks run on the auth worker pool, so the KDF never blocks
+    the UI.
+    """
+
+    def __init__(self, on_login: Callable[[AuthSession], None]):
+        super().__init__()
+        self.expand = True
+        self.alignment = ft.alignment.center
+        self.bgcolor = AppColors.BACKGROUND_VARIANT
+        self.on_login = on_login
+
+        self.title_text = ft.Text(style=AppTextStyles.HEADER_MEDIUM)
+        self.hint_text = ft.Text(size=14, color=AppColors.TEXT_SECONDARY)
+        self.username_field = ft.TextField(label="Username", autofocus=True)
+        self.email_field = ft.TextField(label="Email")
+        self.password_field = ft.TextField(
+            label="Password", password=True, can_reveal_password=True, on_submit=self.submit
+        )
+        self.error_text = ft.Text(color=AppColors.ERROR)
+        self.progress = ft.ProgressRing(width=20, height=20, visible=False)
+        self.submit_button = ft.ElevatedButton(on_click=self.submit)
+
+        self.content = ft.Container(
+            content=ft.Column([
+                self.title_text,
+                self.hint_text,
+                self.username_field,
+                self.email_field,
+                self.password_field,
+                self.error_text,
+                ft.Row([self.progress, self.submit_button], alignment=ft.MainAxisAlignment.END),
+            ], tight=True, spacing=AppSpacing.SMALL),
+            width=400,
+            padding=AppSpacing.LARGE,
+            bgcolor=AppColors.BACKGROUND,
+            border_radius=10,
+            border=ft.border.all(1, AppColors.BORDER_LIGHT),
+        )
+        self.reset()
+
+    def reset(self):
+        """Clear the form and pick sign-in or first-run setup."""
+        self.first_run = not auth.has_users()
+        self.title_text.value = "Create administrator" if self.first_run else "Sign in"
+        self.hint_text.value = (
+            "No accounts exist yet. This account can create the others."
+            if self.first_run else "Log in to use the terminal."
+        )
+        self.email_field.visible = self.first_run
+        self.submit_button.text = "Create and sign in" if self.first_run else "Sign in"
+        self.password_field.value = ""
+        self.error_text.value = ""
+        self.set_busy(False)
+
+    def set_busy(self, busy: bool):
+        self.progress.visible = busy
+        self.submit_button.disabled = busy
+        if self.page:
+            self.update()
+
+    def submit(self, e):
+        username = (self.username_field.value or "").strip()
+        password = self.password_field.value or ""
+        if not username or not password:
+            self.error_text.value = "Enter a username and password."
+            self.update()
+            return
+
+        self.error_text.value = ""
+        self.set_busy(True)
+        if self.first_run:
+            email = (self.email_field.value or "").strip()
+            future = auth.create_first_admin_async(username, email, password)
+        else:
+            future = auth.login_async(username, password)
+        future.add_done_callback(self._on_result)
+
+    def _on_result(self, future):
+        try:
+            auth_session = future.result()
+        except AuthenticationError as ex:
+            self.error_text.value = str(ex)
+            self.set_busy(False)
+            return
+        except Exception as ex:
+            logger.exception(f"Login failed: {ex}")
+            self.error_text.value = "Could not sign in."
+            self.set_busy(False)
+            return
+        self.password_field.value = ""
+        self.set_busy(False)
+        self.on_login(auth_session)
@@ -1,14 +1,60 @@
 import flet as ft
 from controllers.inventory import list_products
 from controllers.payment import PaymentController
+from controllers.authorization import PermissionDenied
+from controllers.reservations import reservations
+from controllers import sync
+from utils.events import bus, Debouncer, AvailabilityChanged, ProductChanged, StockChanged, affected_products
 from models.item import Product
 from models.payment import PaymentMethod
 from utils.logger import get_logger
 from utils.theme import AppColors, AppTextStyles, AppSpacing
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Optional, Set
+import uuid
 
 logger = get_logger()
 
+class ProductCard(ft.Container):
+    """POS grid tile that can be patched in place when its product changes.
+
+    Shows available-to-sell: on-hand minus what other carts hold.
+    """
+
+    def __init__(self, product: Product, available: int, on_click):
+        super().__init__()
+        self.name_text = ft.Text(product.name, style=AppTextStyles.LABEL_BOLD, text_align="center")
+        self.price_text = ft.Text(f"${product.price:.2f}", size=14)
+        self.stock_text = ft.Text(self.stock_label(available), size=12, color=AppColors.TEXT_SECONDARY)
+        self.content = ft.Column([
+            ft.Icon(ft.Icons.SHOPPING_BAG, size=40, color=AppColors.PRIMARY),
+            self.name_text,
+            self.price_text,
+            self.stock_text,
+        ], alignment=ft.MainAxisAlignment.CENTER, horizontal_alignment=ft.CrossAxisAlignment.CENTER)
+        self.bgcolor = AppColors.SURFACE_VARIANT
+        self.border_radius = 10
+        self.padding = AppSpacing.SMALL
+        self.ink = True
+        self.on_click = on_click
+        self.border = ft.border.all(1, AppColors.BORDER_LIGHT)
+
+    @staticmethod
+    def stock_label(available: int) -> str:
+        return f"Available: {max(available, 0)}"
+
+    def patch(self, product: Product, available: int) -> bool:
+        """Copy changed fields from ``product``; returns whether anything changed."""
+        changed = False
+        for control, value in (
+            (self.name_text, product.name),
+            (self.price_text, f"${product.price:.2f}"),
+            (self.stock_text, self.stock_label(available)),
+        ):
+            if control.value != value:
+                control.value = value
+                changed = True
+        return changed
+
 class PaymentSection(ft.Container):
     def __init__(self):
         super().__init__()
@@ -18,6 +64,15 @@ class PaymentSection(ft.Container):
         
         # Cart state: {product_id: {'product': Product, 'quantity': int}}
         self.cart: Dict[str, Dict[str, Any]] = {}
+        # Cart quantities are held in stock reservations under this id.
+        self.cart_id = uuid.uuid4()
+
+        # Local catalog copy kept current through the change feed
+        self.products: Dict[str, Product] = {}
+        # Available-to-sell per product from this cart's point of view.
+        self.available: Dict[str, int] = {}
+        self.product_cards: Dict[str, ProductCard] = {}
+        self.sync_seq: Optional[int] = None
         
         # UI Components
         self.products_grid = ft.GridView(
@@ -111,47 +166,139 @@ class PaymentSection(ft.Container):
         
         self.load_products()
 
+        self._catalog_debouncer = Debouncer(self.on_catalog_events, delay=0.2)
+        bus.subscribe(ProductChanged, self._catalog_debouncer)
+        bus.subscribe(StockChanged, self._catalog_debouncer)
+        # Other carts taking or releasing holds change what this one can sell.
+        self._availability_debouncer = Debouncer(self.on_availability_events, delay=0.2)
+        bus.subscribe(AvailabilityChanged, self._availability_debouncer)
+
+    def on_catalog_events(self, events):
+        # The change feed already narrows the refresh to the touched products.
+        self.sync_products()
+
+    def on_availability_events(self, events):
+        product_ids = {str(pid) for pid in affected_products(events)} & set(self.products)
+        if product_ids:
+            self.refresh_availability(product_ids)
+            self.reconcile_products(product_ids)
+
     def load_products(self):
         logger.info("Loading products for PaymentSection")
-        products = list_products()
-        self.products_grid.controls = []
-        for product in products:
-            if product.in_stock and product.quantity > 0:
-                self.products_grid.controls.append(self.create_product_card(product))
-        if self.page:
-            self.update()
+        # Read the position first so changes made during the load are replayed, not lost.
+        self.sync_seq = sync.latest_seq()
+        self.products = {str(product.id): product for product in list_products()}
+        self.available = {}
+        self.refresh_availability(self.products)
+        self.reconcile_products()
 
-    def create_product_card(self, product: Product):
-        return ft.Container(
-            content=ft.Column([
-                ft.Icon(ft.Icons.SHOPPING_BAG, size=40, color=AppColors.PRIMARY),
-                ft.Text(product.name, style=AppTextStyles.LABEL_BOLD, text_align="center"),
-                ft.Text(f"${product.price:.2f}", size=14),
-                ft.Text(f"Stock: {product.quantity}", size=12, color=AppColors.TEXT_SECONDARY),
-            ], alignment=ft.MainAxisAlignment.CENTER, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-            bgcolor=AppColors.SURFACE_VARIANT,
-            border_radius=10,
-            padding=AppSpacing.SMALL,
-            ink=True,
-            on_click=lambda e: self.add_to_cart(product),
-            border=ft.border.all(1, AppColors.BORDER_LIGHT)
+    def refresh_availability(self, product_ids: Iterable[str]):
+        """Re-read available-to-sell for these products."""
+        ids = [self.products[pid].id for pid in product_ids if pid in self.products]
+        if ids:
+            for pid, available in reservations.available(ids, self.cart_id).items():
+                self.available[str(pid)] = available
+
+    def sync_products(self):
+        """Apply catalog changes made since the last load or sync."""
+        if self.sync_seq is None:
+            self.load_products()
+            return
+
+        changed = set()
+        while True:
+            change_set = sync.changes_since(self.sync_seq)
+            if change_set.reset_required:
+                self.load_products()
+                return
+            for change in change_set.changes:
+                changed.add(self.apply_change(change))
+            self.sync_seq = change_set.seq
+            if not change_set.has_more:
+                break
+
+        if changed:
+            self.refresh_availability(changed)
+            self.reconcile_products(changed)
+
+    def apply_change(self, change: Dict[str, Any]) -> str:
+        """Fold one change-feed delta into the local catalog and return its product id."""
+        pid = str(change["id"])
+        if change["op"] == "delete":
+            self.products.pop(pid, None)
+            self.available.pop(pid, None)
+            return pid
+
+        fields = {key: value for key, value in change.items() if key not in ("id", "op")}
+        product = self.products.get(pid)
+        if product is None:
+            if change["op"] == "upsert":
+                self.products[pid] = Product(id=change["id"], **fields)
+        else:
+            for key, value in fields.items():
+                setattr(product, key, value)
+        return pid
+
+    def reconcile_products(self, product_ids: Optional[Set[str]] = None):
+        """Bring the grid in line with ``self.products`` for the given ids (default: all).
+
+        Cards are keyed by product id: existing cards are patched in place,
+        and only cards that appear or disappear change the grid's children.
+        When nothing structural changed, just the patched cards are sent.
+        """
+        if product_ids is None:
+            product_ids = set(self.products) | set(self.product_cards)
+
+        structural = False
+        patched = []
+        for pid in product_ids:
+            product = self.products.get(pid)
+            visible = product is not None and product.in_stock and product.quantity > 0
+            card = self.product_cards.get(pid)
+
+            if card and not visible:
+                self.products_grid.controls.remove(card)
+                del self.product_cards[pid]
+                structural = True
+            elif visible and not card:
+                card = self.create_product_card(product)
+                self.product_cards[pid] = card
+                self.products_grid.controls.append(card)
+                structural = True
+            elif card and card.patch(product, self.available.get(pid, product.quantity)):
+                patched.append(card)
+
+        if not self.page:
+            return
+        if structural:
+            self.products_grid.update()
+        else:
+            for card in patched:
+                card.update()
+
+    def create_product_card(self, product: Product) -> "ProductCard":
+        pid = str(product.id)
+        return ProductCard(
+            product,
+            self.available.get(pid, product.quantity),
+            on_click=lambda e: self.add_to_cart(self.products[pid]),
         )
 
     def add_to_cart(self, product: Product):
         pid = str(product.id)
+        quantity = self.cart[pid]['quantity'] + 1 if pid in self.cart else 1
+        if not self.reserve(product, quantity):
+            return
         if pid in self.cart:
-            if self.cart[pid]['quantity'] < product.quantity:
-                self.cart[pid]['quantity'] += 1
-            else:
-                self.page.show_snack_bar(ft.SnackBar(content=ft.Text(f"Max stock reached for {product.name}")))
-                return
+            self.cart[pid]['quantity'] = quantity
         else:
-            self.cart[pid] = {'product': product, 'quantity': 1}
+            self.cart[pid] = {'product': product, 'quantity': quantity}
         
         self.update_cart_ui()
 
     def remove_from_cart(self, product_id: str):
         if product_id in self.cart:
+            self.reserve(self.cart[product_id]['product'], 0)
             del self.cart[product_id]
             self.update_cart_ui()
 
@@ -162,11 +309,22 @@ class PaymentSection(ft.Container):
             
             if new_qty <= 0:
                 self.remove_from_cart(product_id)
-            elif new_qty <= product.quantity:
+            elif self.reserve(product, new_qty):
                 self.cart[product_id]['quantity'] = new_qty
                 self.update_cart_ui()
-            else:
-                self.page.show_snack_bar(ft.SnackBar(content=ft.Text(f"Max stock reached for {product.name}")))
+
+    def reserve(self, product: Product, quantity: int) -> bool:
+        """Hold ``quantity`` units for this cart; shows why and returns False if it can't."""
+        try:
+            reservations.reserve(self.cart_id, product.id, quantity)
+        except ValueError as ve:
+            self.page.open(ft.SnackBar(content=ft.Text(str(ve)), bgcolor=AppColors.ERROR))
+            return False
+        except Exception as ex:
+            logger.exception(f"Failed to reserve stock for {product.name}: {ex}")
+            self.page.open(ft.SnackBar(content=ft.Text(f"Could not reserve {product.name}"), bgcolor=AppColors.ERROR))
+            return False
+        return True
 
     def update_cart_ui(self):
         self.cart_list.controls = []
@@ -231,7 +389,7 @@ class PaymentSection(ft.Container):
             received = float(self.amount_received_field.value)
             
             if received < total:
-                self.page.show_snack_bar(ft.SnackBar(content=ft.Text("Insufficient amount received!")))
+                self.page.open(ft.SnackBar(content=ft.Text("Insufficient amount received!")))
                 return
 
             items_to_process = [
@@ -246,21 +404,25 @@ class PaymentSection(ft.Container):
 
             sale = self.payment_controller.create_sale(
                 items=items_to_process,
-                payment_method=payment_method
+                payment_method=payment_method,
+                cart_id=self.cart_id,
             )
             
             logger.info(f"Sale successful: {sale.id}")
             
             self.close_payment_dialog(e)
             self.cart.clear()
+            self.cart_id = uuid.uuid4()
             self.update_cart_ui()
-            self.load_products() # Refresh stock
+            # Stock refresh follows from the StockChanged event once the sale is committed
             
-            self.page.show_snack_bar(ft.SnackBar(content=ft.Text("Payment successful!"), bgcolor=AppColors.SUCCESS))
+            self.page.open(ft.SnackBar(content=ft.Text("Payment successful!"), bgcolor=AppColors.SUCCESS))
             
+        except PermissionDenied as pd:
+            self.page.open(ft.SnackBar(content=ft.Text(str(pd)), bgcolor=AppColors.ERROR))
         except ValueError as ve:
             logger.error(f"Payment validation error: {ve}")
-            self.page.show_snack_bar(ft.SnackBar(content=ft.Text(str(ve)), bgcolor=AppColors.ERROR))
+            self.page.open(ft.SnackBar(content=ft.Text(str(ve)), bgcolor=AppColors.ERROR))
         except Exception as ex:
             logger.exception(f"Payment processing failed: {ex}")
-            self.page.show_snack_bar(ft.SnackBar(content=ft.Text("An error occurred during payment."), bgcolor=AppColors.ERROR))
+            self.page.open(ft.SnackBar(content=ft.Text("An error occurred during payment."), bgcolor=AppColors.ERROR))
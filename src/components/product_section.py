@@ -1,7 +1,11 @@
 import flet as ft
-from controllers.inventory import list_products, add_product, remove_product
+from controllers.inventory import list_products, get_products, add_product, remove_product
+from controllers.authorization import PermissionDenied
 from models.item import Product
 from utils.theme import AppColors
+from utils.events import bus, Debouncer, StockChanged, affected_products
+from typing import Dict, Iterable
+import uuid
 
 class ProductSection(ft.Container):
     def __init__(self):
@@ -10,6 +14,7 @@ class ProductSection(ft.Container):
         self.padding = 20
         
         self.products = list_products()
+        self.rows: Dict[uuid.UUID, ft.DataRow] = {}
         self.data_table = ft.DataTable(
             columns=[
                 ft.DataColumn(ft.Text("Name")),
@@ -65,12 +70,39 @@ class ProductSection(ft.Container):
             expand=True,
         )
 
+        # Sales change quantities shown here; edits made in this section reload directly.
+        self._stock_debouncer = Debouncer(self.on_stock_events, delay=0.5)
+        bus.subscribe(StockChanged, self._stock_debouncer)
+
+    def on_stock_events(self, events):
+        if self.page:
+            self.refresh_products(affected_products(events))
+
     def load_products(self):
         self.products = list_products()
-        self.data_table.rows = [self.create_row(p) for p in self.products]
+        self.rows = {p.id: self.create_row(p) for p in self.products}
+        self.data_table.rows = list(self.rows.values())
         if self.page:
             self.update()
 
+    def refresh_products(self, product_ids: Iterable[uuid.UUID]):
+        """Patch the quantity and stock cells of just these products' rows.
+
+        Falls back to a full reload when a product appeared or disappeared.
+        """
+        product_ids = set(product_ids)
+        products = get_products(product_ids)
+        if len(products) != len(product_ids) or any(p.id not in self.rows for p in products):
+            self.load_products()
+            return
+        for product in products:
+            cells = self.rows[product.id].cells
+            cells[4].content.value = str(product.quantity)
+            cells[5].content.name = ft.Icons.CHECK_CIRCLE if product.in_stock else ft.Icons.CANCEL
+            cells[5].content.color = AppColors.SUCCESS if product.in_stock else AppColors.ERROR
+        if self.page:
+            self.data_table.update()
+
     def create_row(self, product: Product):
         return ft.DataRow(
             cells=[
@@ -121,10 +153,16 @@ class ProductSection(ft.Container):
             
             self.page.open(ft.SnackBar(content=ft.Text("Product added successfully!")))
             
+        except PermissionDenied as pd:
+            self.page.open(ft.SnackBar(content=ft.Text(str(pd))))
         except ValueError:
             self.page.open(ft.SnackBar(content=ft.Text("Invalid input! Please check price and quantity.")))
 
     def delete_product_click(self, product: Product):
-        remove_product(product.id)
+        try:
+            remove_product(product.id)
+        except PermissionDenied as pd:
+            self.page.open(ft.SnackBar(content=ft.Text(str(pd))))
+            return
         self.load_products()
         self.page.open(ft.SnackBar(content=ft.Text("Product deleted!")))
@@ -1,10 +1,60 @@
 import flet as ft
 from utils.theme import AppColors, AppTextStyles, AppSpacing
-from controllers.analytics import AnalyticsService
+from controllers.analytics import AnalyticsService, SalesCursor, SalesHistoryFilter
 from controllers.inventory import list_products
-import csv
-import io
-from datetime import datetime
+from controllers.payment import PaymentController
+from controllers.authorization import PermissionDenied
+from controllers.reports import get_report_queue, ReportFormat, ReportJob, ReportJobStatus, ReportKind
+from utils.events import bus, Debouncer, ProductChanged, ReportJobChanged, SaleAdjusted, SaleCompleted, StockChanged
+from models.payment import PaymentMethod
+from models.sale import SaleStatus, REFUNDABLE_STATUSES
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+import shutil
+import uuid
+
+SALES_PAGE_SIZE = 50
+
+class ReportJobRow(ft.Container):
+    """One background report in the jobs panel, patched as progress arrives."""
+
+    def __init__(self, job: ReportJob, on_cancel, on_save):
+        super().__init__()
+        self.job_id = job.id
+        self.title_text = ft.Text(
+            f"{job.kind.value.replace('_', ' ').title()} ({job.format.value.upper()})",
+            style=AppTextStyles.LABEL_BOLD,
+        )
+        self.status_text = ft.Text(size=12, color=AppColors.TEXT_SECONDARY)
+        self.progress_bar = ft.ProgressBar(width=200)
+        self.cancel_button = ft.IconButton(ft.Icons.CANCEL, tooltip="Cancel", on_click=lambda e: on_cancel(self.job_id))
+        self.save_button = ft.IconButton(ft.Icons.SAVE_ALT, tooltip="Save", on_click=lambda e: on_save(self.job_id))
+        self.content = ft.Row(
+            [
+                ft.Column([self.title_text, self.status_text], spacing=2, expand=True),
+                self.progress_bar,
+                self.cancel_button,
+                self.save_button,
+            ],
+            vertical_alignment=ft.CrossAxisAlignment.CENTER,
+        )
+        self.padding = AppSpacing.SMALL
+        self.border = ft.border.all(1, AppColors.BORDER_LIGHT)
+        self.border_radius = 5
+        self.patch(job)
+
+    def patch(self, job: ReportJob):
+        if job.status == ReportJobStatus.FAILED:
+            self.status_text.value = f"Failed: {job.error}"
+        elif job.status == ReportJobStatus.QUEUED:
+            self.status_text.value = "Queued"
+        else:
+            self.status_text.value = f"{job.status.value.title()} - {job.rows} rows"
+        # Indeterminate until the worker reports its first chunk.
+        self.progress_bar.value = job.progress if job.status != ReportJobStatus.QUEUED else None
+        self.progress_bar.visible = not job.finished
+        self.cancel_button.visible = not job.finished
+        self.save_button.visible = job.status == ReportJobStatus.COMPLETED
 
 class ReportSection(ft.Container):
     def __init__(self):
@@ -12,6 +62,24 @@ class ReportSection(ft.Container):
         self.expand = True
         self.padding = AppSpacing.MEDIUM
         self.analytics = AnalyticsService()
+        self.payment_controller = PaymentController()
+        self.job_rows: Dict[uuid.UUID, ReportJobRow] = {}
+        self.saving_job_id: Optional[uuid.UUID] = None
+
+        # Sales history paging: the start cursor of every page visited so far.
+        self.sales_filter = SalesHistoryFilter(statuses=("completed",))
+        self.sales_page_starts: List[Optional[SalesCursor]] = [None]
+        self.sales_next_cursor: Optional[SalesCursor] = None
+        self.jobs_column = ft.Column(spacing=AppSpacing.SMALL, scroll=ft.ScrollMode.AUTO)
+        self.format_dropdown = ft.Dropdown(
+            label="Export format",
+            width=160,
+            value=ReportFormat.CSV.value,
+            options=[
+                ft.dropdown.Option(ReportFormat.CSV.value, "CSV"),
+                ft.dropdown.Option(ReportFormat.XLSX.value, "Excel (XLSX)"),
+            ],
+        )
         
         self.tabs = ft.Tabs(
             selected_index=0,
@@ -24,33 +92,108 @@ class ReportSection(ft.Container):
         
         self.content = ft.Column(
             [
-                ft.Text("Reports & Export", style=AppTextStyles.HEADER_LARGE),
-                self.tabs
+                ft.Row(
+                    [
+                        ft.Text("Reports & Export", style=AppTextStyles.HEADER_LARGE, expand=True),
+                        self.format_dropdown,
+                        ft.ElevatedButton("Export Workbook", icon=ft.Icons.TABLE_VIEW, on_click=self.export_workbook),
+                    ],
+                    vertical_alignment=ft.CrossAxisAlignment.CENTER,
+                ),
+                self.tabs,
+                ft.Text("Report Jobs", style=AppTextStyles.HEADER_MEDIUM),
+                ft.Container(content=self.jobs_column, height=160),
             ],
             expand=True
         )
 
+        self._refresh_debouncer = Debouncer(self.on_domain_events, delay=0.5)
+        for event_type in (SaleCompleted, SaleAdjusted, StockChanged, ProductChanged):
+            bus.subscribe(event_type, self._refresh_debouncer)
+        self._jobs_debouncer = Debouncer(self.on_report_jobs_changed, delay=0.2)
+        bus.subscribe(ReportJobChanged, self._jobs_debouncer)
+
+    def on_domain_events(self, events):
+        if not self.page:
+            return
+        # New sales only ever land on the first (newest) page.
+        if any(isinstance(event, SaleCompleted) for event in events) and len(self.sales_page_starts) == 1:
+            self.load_sales()
+        # A refund or void changes the status of a sale on any page.
+        elif any(isinstance(event, SaleAdjusted) for event in events):
+            self.load_sales()
+        if any(isinstance(event, (StockChanged, ProductChanged)) for event in events):
+            self.load_inventory()
+        self.update()
+
     def _build_sales_tab(self):
         self.sales_data_table = ft.DataTable(
             columns=[
                 ft.DataColumn(ft.Text("Date")),
                 ft.DataColumn(ft.Text("Total")),
+                ft.DataColumn(ft.Text("Method")),
                 ft.DataColumn(ft.Text("Status")),
+                ft.DataColumn(ft.Text("Actions")),
             ],
             rows=[]
         )
+
+        self.start_date_field = ft.TextField(label="From (YYYY-MM-DD)", width=170, dense=True)
+        self.end_date_field = ft.TextField(label="To (YYYY-MM-DD)", width=170, dense=True)
+        self.min_amount_field = ft.TextField(label="Min $", width=100, dense=True)
+        self.max_amount_field = ft.TextField(label="Max $", width=100, dense=True)
+        self.status_dropdown = ft.Dropdown(
+            label="Status",
+            width=140,
+            dense=True,
+            value="completed",
+            options=[ft.dropdown.Option("", "All")] + [
+                ft.dropdown.Option(status.value, status.value.replace("_", " ").title())
+                for status in SaleStatus
+            ],
+        )
+        self.method_dropdown = ft.Dropdown(
+            label="Method",
+            width=160,
+            dense=True,
+            value="",
+            options=[ft.dropdown.Option("", "All")] + [
+                ft.dropdown.Option(method.value, method.value.replace("_", " ").title())
+                for method in PaymentMethod
+            ],
+        )
+        self.prev_page_button = ft.IconButton(ft.Icons.CHEVRON_LEFT, tooltip="Newer", on_click=self.prev_sales_page)
+        self.next_page_button = ft.IconButton(ft.Icons.CHEVRON_RIGHT, tooltip="Older", on_click=self.next_sales_page)
+        self.page_text = ft.Text("Page 1")
         
         return ft.Column(
             [
                 ft.Row([
-                    ft.ElevatedButton("Export CSV", icon=ft.Icons.DOWNLOAD, on_click=self.export_sales_csv)
+                    ft.ElevatedButton("Export", icon=ft.Icons.DOWNLOAD, on_click=self.export_sales),
+                    ft.ElevatedButton("Export Ledger", icon=ft.Icons.RECEIPT_LONG, on_click=self.export_sales_ledger),
                 ]),
+                ft.Row(
+                    [
+                        self.start_date_field,
+                        self.end_date_field,
+                        self.status_dropdown,
+                        self.method_dropdown,
+                        self.min_amount_field,
+                        self.max_amount_field,
+                        ft.ElevatedButton("Apply", icon=ft.Icons.FILTER_ALT, on_click=self.apply_sales_filter),
+                    ],
+                    wrap=True,
+                ),
                 ft.Container(
                     content=ft.Column([self.sales_data_table], scroll=ft.ScrollMode.AUTO),
                     expand=True,
                     border=ft.border.all(1, AppColors.BORDER),
                     border_radius=5,
-                )
+                ),
+                ft.Row(
+                    [self.prev_page_button, self.page_text, self.next_page_button],
+                    alignment=ft.MainAxisAlignment.END,
+                ),
             ],
             expand=True,
             spacing=AppSpacing.MEDIUM,
@@ -72,7 +215,7 @@ class ReportSection(ft.Container):
         return ft.Column(
             [
                 ft.Row([
-                    ft.ElevatedButton("Export CSV", icon=ft.Icons.DOWNLOAD, on_click=self.export_inventory_csv)
+                    ft.ElevatedButton("Export", icon=ft.Icons.DOWNLOAD, on_click=self.export_inventory)
                 ]),
                 ft.Container(
                     content=ft.Column([self.inventory_data_table], scroll=ft.ScrollMode.AUTO),
@@ -93,7 +236,12 @@ class ReportSection(ft.Container):
         self.load_data()
 
     def load_data(self):
-        # Load Inventory
+        self.load_inventory()
+        self.load_sales()
+        if self.page:
+            self.update()
+
+    def load_inventory(self):
         products = list_products()
         self.inventory_data_table.rows = []
         for p in products:
@@ -108,56 +256,190 @@ class ReportSection(ft.Container):
                     ]
                 )
             )
-            
-        # Load Sales (Recent 50 for now)
-        sales = self.analytics.get_recent_sales(limit=50)
+
+    def load_sales(self):
+        page = self.analytics.get_sales_history(
+            self.sales_filter, after=self.sales_page_starts[-1], limit=SALES_PAGE_SIZE
+        )
+        self.sales_next_cursor = page.next_cursor
         self.sales_data_table.rows = []
-        for s in sales:
+        for s in page.rows:
+            method = s["payment_method"]
             self.sales_data_table.rows.append(
                 ft.DataRow(
                     cells=[
-                        ft.DataCell(ft.Text(s.created_at.strftime("%Y-%m-%d %H:%M"))),
-                        ft.DataCell(ft.Text(f"${s.total_amount:.2f}")),
-                        ft.DataCell(ft.Text(s.status)),
+                        ft.DataCell(ft.Text(s["created_at"].strftime("%Y-%m-%d %H:%M"))),
+                        ft.DataCell(ft.Text(f"${s['total_amount']:.2f}")),
+                        ft.DataCell(ft.Text(method.value.replace("_", " ").title() if method else "-")),
+                        ft.DataCell(ft.Text(s["status"].replace("_", " ").title())),
+                        ft.DataCell(self._sale_actions(s)),
                     ]
                 )
             )
-        
-        if self.page:
-            self.update()
+        self.page_text.value = f"Page {len(self.sales_page_starts)}"
+        self.prev_page_button.disabled = len(self.sales_page_starts) == 1
+        self.next_page_button.disabled = page.next_cursor is None
+
+    def _sale_actions(self, sale) -> ft.Control:
+        if sale["status"] not in REFUNDABLE_STATUSES:
+            return ft.Text("-")
+        buttons = [
+            ft.IconButton(
+                ft.Icons.UNDO,
+                tooltip="Refund remaining items",
+                on_click=lambda e, sale_id=sale["id"]: self.refund_sale(sale_id),
+            )
+        ]
+        if sale["status"] == SaleStatus.COMPLETED:
+            buttons.append(ft.IconButton(
+                ft.Icons.BLOCK,
+                tooltip="Void sale",
+                on_click=lambda e, sale_id=sale["id"]: self.void_sale(sale_id),
+            ))
+        return ft.Row(buttons, spacing=0)
+
+    def refund_sale(self, sale_id: uuid.UUID):
+        self._adjust_sale(lambda: self.payment_controller.refund_sale(sale_id), "Sale refunded")
+
+    def void_sale(self, sale_id: uuid.UUID):
+        self._adjust_sale(lambda: self.payment_controller.void_sale(sale_id), "Sale voided")
+
+    def _adjust_sale(self, action, message: str):
+        try:
+            adjustment = action()
+        except (PermissionDenied, ValueError) as ex:
+            self.page.open(ft.SnackBar(content=ft.Text(str(ex)), bgcolor=AppColors.ERROR))
+            return
+        self.page.open(ft.SnackBar(
+            content=ft.Text(f"{message}: ${-adjustment.total_amount:.2f} returned"),
+            bgcolor=AppColors.SUCCESS,
+        ))
+
+    def next_sales_page(self, e):
+        if self.sales_next_cursor is None:
+            return
+        self.sales_page_starts.append(self.sales_next_cursor)
+        self.load_sales()
+        self.update()
+
+    def prev_sales_page(self, e):
+        if len(self.sales_page_starts) == 1:
+            return
+        self.sales_page_starts.pop()
+        self.load_sales()
+        self.update()
+
+    def apply_sales_filter(self, e):
+        try:
+            start = self._parse_date(self.start_date_field.value)
+            end = self._parse_date(self.end_date_field.value)
+            if end:
+                # The "to" date is inclusive.
+                end += timedelta(days=1) - timedelta(microseconds=1)
+            self.sales_filter = SalesHistoryFilter(
+                start=start,
+                end=end,
+                statuses=(self.status_dropdown.value,) if self.status_dropdown.value else (),
+                min_amount=self._parse_amount(self.min_amount_field.value),
+                max_amount=self._parse_amount(self.max_amount_field.value),
+                payment_methods=(PaymentMethod(self.method_dropdown.value),) if self.method_dropdown.value else (),
+            )
+        except ValueError as ex:
+            self.page.open(ft.SnackBar(content=ft.Text(f"Invalid filter: {ex}"), bgcolor=AppColors.ERROR))
+            return
+        self.sales_page_starts = [None]
+        self.load_sales()
+        self.update()
+
+    @staticmethod
+    def _parse_date(value: Optional[str]) -> Optional[datetime]:
+        value = (value or "").strip()
+        return datetime.strptime(value, "%Y-%m-%d") if value else None
+
+    @staticmethod
+    def _parse_amount(value: Optional[str]) -> Optional[float]:
+        value = (value or "").strip()
+        return float(value) if value else None
 
-    def export_sales_csv(self, e):
-        self.current_export = "sales"
-        self.file_picker.save_file(file_name="sales_report.csv")
+    def export_sales(self, e):
+        self.queue_report(ReportKind.SALES, self.selected_format(), **self.sales_window())
 
-    def export_inventory_csv(self, e):
-        self.current_export = "inventory"
-        self.file_picker.save_file(file_name="inventory_report.csv")
+    def export_sales_ledger(self, e):
+        self.queue_report(ReportKind.SALES_LEDGER, self.selected_format(), **self.sales_window())
+
+    def export_inventory(self, e):
+        self.queue_report(ReportKind.INVENTORY, self.selected_format())
+
+    def export_workbook(self, e):
+        # Sales, line items, payments and inventory as sheets of one file.
+        self.queue_report(ReportKind.WORKBOOK, ReportFormat.XLSX, **self.sales_window())
+
+    def selected_format(self) -> ReportFormat:
+        return ReportFormat(self.format_dropdown.value or ReportFormat.CSV.value)
+
+    def sales_window(self) -> Dict[str, Optional[datetime]]:
+        # Exports follow the date range applied to the sales history.
+        return {"start": self.sales_filter.start, "end": self.sales_filter.end}
+
+    def queue_report(self, kind: ReportKind, fmt: ReportFormat, **params):
+        # Reports are built in worker processes; the row tracks progress.
+        try:
+            job = get_report_queue().submit(kind, fmt, **params)
+        except PermissionDenied as pd:
+            self.page.open(ft.SnackBar(content=ft.Text(str(pd)), bgcolor=AppColors.ERROR))
+            return
+        self.upsert_job_row(job)
+        self.update()
+
+    def upsert_job_row(self, job: ReportJob):
+        row = self.job_rows.get(job.id)
+        if row is None:
+            row = ReportJobRow(job, on_cancel=self.cancel_report, on_save=self.save_report)
+            self.job_rows[job.id] = row
+            self.jobs_column.controls.insert(0, row)
+        else:
+            row.patch(job)
+
+    def on_report_jobs_changed(self, events):
+        if not self.page:
+            return
+        queue = get_report_queue()
+        # Latest status per job in this batch; "finished" is always a job's last event.
+        latest = {event.job_id: event.status for event in events}
+        for job_id, status in latest.items():
+            job = queue.get(job_id)
+            if job is None:
+                continue
+            self.upsert_job_row(job)
+            if status == ReportJobStatus.COMPLETED:
+                self.page.open(ft.SnackBar(
+                    content=ft.Text(f"Report ready: {job.file_name}"),
+                    action="Save",
+                    on_action=lambda e, job_id=job.id: self.save_report(job_id),
+                    bgcolor=AppColors.SUCCESS,
+                ))
+            elif status == ReportJobStatus.FAILED:
+                self.page.open(ft.SnackBar(
+                    content=ft.Text(f"Report failed: {job.error}"), bgcolor=AppColors.ERROR
+                ))
+        self.update()
+
+    def cancel_report(self, job_id: uuid.UUID):
+        get_report_queue().cancel(job_id)
+
+    def save_report(self, job_id: uuid.UUID):
+        job = get_report_queue().get(job_id)
+        if job is None or job.status != ReportJobStatus.COMPLETED:
+            return
+        self.saving_job_id = job_id
+        self.file_picker.save_file(file_name=job.file_name)
 
     def on_save_file_result(self, e: ft.FilePickerResultEvent):
-        if e.path:
+        job = get_report_queue().get(self.saving_job_id) if self.saving_job_id else None
+        self.saving_job_id = None
+        if e.path and job:
             try:
-                if self.current_export == "sales":
-                    self._write_sales_csv(e.path)
-                elif self.current_export == "inventory":
-                    self._write_inventory_csv(e.path)
-                
-                self.page.show_snack_bar(ft.SnackBar(content=ft.Text(f"Saved to {e.path}"), bgcolor=AppColors.SUCCESS))
+                shutil.copyfile(job.output_path, e.path)
+                self.page.open(ft.SnackBar(content=ft.Text(f"Saved to {e.path}"), bgcolor=AppColors.SUCCESS))
             except Exception as ex:
-                self.page.show_snack_bar(ft.SnackBar(content=ft.Text(f"Error saving file: {ex}"), bgcolor=AppColors.ERROR))
-
-    def _write_sales_csv(self, path):
-        sales = self.analytics.get_recent_sales(limit=1000) # Fetch more for export
-        with open(path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["ID", "Date", "Total Amount", "Status"])
-            for s in sales:
-                writer.writerow([s.id, s.created_at, s.total_amount, s.status])
-
-    def _write_inventory_csv(self, path):
-        products = list_products()
-        with open(path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["ID", "Name", "Category", "Price", "Cost", "Quantity", "In Stock"])
-            for p in products:
-                writer.writerow([p.id, p.name, p.category, p.price, p.cost_price, p.quantity, p.in_stock])
+                self.page.open(ft.SnackBar(content=ft.Text(f"Error saving file: {ex}"), bgcolor=AppColors.ERROR))
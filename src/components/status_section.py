@@ -3,12 +3,21 @@ from datetime import datetime, timedelta
 
 import flet as ft
 from controllers.analytics import AnalyticsService
+from controllers.authorization import PermissionDenied
+from utils.clock import store_now
+from utils.events import bus, Debouncer, ProductChanged, SaleAdjusted, SaleCompleted, StockChanged
 from utils.logger import get_logger
 from utils.theme import AppColors, AppTextStyles, AppSpacing
 
 
 logger = get_logger()
 
+WEEKDAY_LABELS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# Rough pixel width shared by the trend bars, and the most axis labels shown.
+SALES_CHART_WIDTH = 600
+SALES_CHART_LABELS = 8
+
 class StatusSection(ft.Container):
     def __init__(self):
         super().__init__()
@@ -48,13 +57,75 @@ class StatusSection(ft.Container):
             expand=True,
         )
 
+        self.top_products_chart = ft.BarChart(
+            bar_groups=[],
+            border=ft.border.all(1, AppColors.BORDER),
+            left_axis=ft.ChartAxis(labels_size=40),
+            bottom_axis=ft.ChartAxis(labels_size=40),
+            horizontal_grid_lines=ft.ChartGridLines(
+                color=AppColors.GRID_LINES,
+                width=1,
+                dash_pattern=[3, 3],
+            ),
+            tooltip_bgcolor=AppColors.TOOLTIP_BG,
+            expand=True,
+        )
+        self.category_pie_chart = ft.PieChart(
+            sections=[],
+            sections_space=0,
+            center_space_radius=40,
+            expand=True,
+        )
+
+        self.heatmap_cells = [
+            [
+                ft.Container(
+                    width=24,
+                    height=20,
+                    border_radius=3,
+                    bgcolor=AppColors.SURFACE,
+                )
+                for _ in range(24)
+            ]
+            for _ in range(7)
+        ]
+        self.heatmap_grid = ft.Column(
+            [
+                ft.Row(
+                    [ft.Container(width=40)]
+                    + [
+                        ft.Container(
+                            content=ft.Text(str(hour) if hour % 3 == 0 else "", size=10),
+                            width=24,
+                        )
+                        for hour in range(24)
+                    ],
+                    spacing=2,
+                )
+            ]
+            + [
+                ft.Row(
+                    [ft.Container(content=ft.Text(WEEKDAY_LABELS[weekday], size=10), width=40)]
+                    + self.heatmap_cells[weekday],
+                    spacing=2,
+                )
+                for weekday in range(7)
+            ],
+            spacing=2,
+        )
+
         metrics_row = ft.Row(
             [
                 self.create_metric_card("Inventory Value", self.inventory_value_text, ft.Icons.INVENTORY),
                 self.create_metric_card("Revenue", self.revenue_value_text, ft.Icons.ATTACH_MONEY),
                 self.create_metric_card("Profit", self.profit_value_text, ft.Icons.MONEY),
                 self.create_metric_card("Margin", self.margin_value_text, ft.Icons.PERCENT),
-                self.create_metric_card("Low Stock", self.low_stock_value_text, ft.Icons.WARNING),
+                self.create_metric_card(
+                    "Low Stock",
+                    self.low_stock_value_text,
+                    ft.Icons.WARNING,
+                    on_click=self.open_low_stock_dialog,
+                ),
             ],
             alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
         )
@@ -98,6 +169,44 @@ class StatusSection(ft.Container):
             expand=True,
         )
 
+        sales_breakdown_row = ft.Row(
+            [
+                ft.Container(
+                    content=ft.Column([
+                        ft.Text("Top Products by Revenue", style=AppTextStyles.HEADER_SMALL),
+                        self.top_products_chart,
+                    ]),
+                    expand=2,
+                    height=300,
+                    padding=AppSpacing.SMALL,
+                    border=ft.border.all(1, AppColors.BORDER),
+                    border_radius=10,
+                ),
+                ft.Container(
+                    content=ft.Column([
+                        ft.Text("Revenue by Category", style=AppTextStyles.HEADER_SMALL),
+                        self.category_pie_chart,
+                    ]),
+                    expand=1,
+                    height=300,
+                    padding=AppSpacing.SMALL,
+                    border=ft.border.all(1, AppColors.BORDER),
+                    border_radius=10,
+                ),
+            ],
+            expand=True,
+        )
+
+        heatmap_row = ft.Container(
+            content=ft.Column([
+                ft.Text("Busy Hours (Revenue by Weekday and Hour)", style=AppTextStyles.HEADER_SMALL),
+                self.heatmap_grid,
+            ]),
+            padding=AppSpacing.SMALL,
+            border=ft.border.all(1, AppColors.BORDER),
+            border_radius=10,
+        )
+
         self.period_dropdown = ft.Dropdown(
             width=200,
             options=[
@@ -110,6 +219,14 @@ class StatusSection(ft.Container):
             on_change=self.on_period_change,
         )
 
+        self.low_stock_items: List[Dict[str, Any]] = []
+        self.low_stock_list = ft.Column([], tight=True, scroll=ft.ScrollMode.AUTO)
+        self.low_stock_dialog = ft.AlertDialog(
+            title=ft.Text("Below Reorder Point"),
+            content=ft.Container(content=self.low_stock_list, width=450, height=300),
+            actions=[ft.TextButton("Close", on_click=self.close_low_stock_dialog)],
+        )
+
         self.loading_indicator = ft.ProgressBar(visible=False, color=AppColors.PRIMARY)
 
         header = ft.Row(
@@ -128,6 +245,8 @@ class StatusSection(ft.Container):
                 metrics_row,
                 ft.Divider(color=AppColors.DIVIDER),
                 charts_row,
+                sales_breakdown_row,
+                heatmap_row,
             ],
             scroll=ft.ScrollMode.AUTO,
             expand=True,
@@ -135,13 +254,42 @@ class StatusSection(ft.Container):
 
         self.load_data()
 
+        # Sales, refunds and voids move every card; catalog edits only the inventory ones.
+        self._refresh_debouncer = Debouncer(self.on_domain_events, delay=0.5)
+        for event_type in (SaleCompleted, SaleAdjusted, StockChanged, ProductChanged):
+            bus.subscribe(event_type, self._refresh_debouncer)
+
+    def on_domain_events(self, events):
+        if not self.page:
+            return
+        if any(isinstance(event, (SaleCompleted, SaleAdjusted)) for event in events):
+            self.load_data()
+        else:
+            self.refresh_inventory()
+
+    def refresh_inventory(self):
+        """Reload only the inventory value, low-stock and stock distribution widgets."""
+        try:
+            inventory = self.analytics.get_inventory_metrics()
+            self.low_stock_items = self.analytics.get_low_stock_products(limit=10)
+            distribution = self.analytics.get_stock_distribution(top_n=5)
+        except Exception as exc:
+            logger.exception(f"Failed to refresh inventory metrics: {exc}")
+            return
+
+        self.inventory_value_text.value = f"${inventory['inventory_value']:,.2f}"
+        self.low_stock_value_text.value = str(inventory["low_stock_count"])
+        self._update_stock_chart(distribution)
+        if self.page:
+            self.update()
+
     def on_period_change(self, e):
         self.load_data()
 
     def _metric_value_text(self) -> ft.Text:
         return ft.Text("—", style=AppTextStyles.METRIC_VALUE)
 
-    def create_metric_card(self, title: str, value_control: ft.Text, icon) -> ft.Card:
+    def create_metric_card(self, title: str, value_control: ft.Text, icon, on_click=None) -> ft.Card:
         return ft.Card(
             content=ft.Container(
                 content=ft.Column(
@@ -156,9 +304,40 @@ class StatusSection(ft.Container):
                 padding=AppSpacing.MEDIUM,
                 width=250,
                 height=150,
+                ink=on_click is not None,
+                on_click=on_click,
             )
         )
 
+    def open_low_stock_dialog(self, e):
+        # The card only carries the first few; the drill-down lists them all.
+        try:
+            self.low_stock_items = self.analytics.get_low_stock_products(limit=None)
+        except Exception as exc:
+            logger.exception(f"Failed to load low-stock products: {exc}")
+        if not self.low_stock_items:
+            self.low_stock_list.controls = [ft.Text("No products below their reorder point.")]
+        else:
+            self.low_stock_list.controls = [
+                ft.ListTile(
+                    leading=ft.Icon(ft.Icons.WARNING, color=AppColors.WARNING),
+                    title=ft.Text(item["name"]),
+                    subtitle=ft.Text(
+                        f"Stock {item['quantity']} / reorder at {item['reorder_point']}"
+                        + (
+                            f" · {item['days_of_cover']:.1f} days of cover"
+                            if item["days_of_cover"] is not None
+                            else ""
+                        )
+                    ),
+                )
+                for item in self.low_stock_items
+            ]
+        self.page.open(self.low_stock_dialog)
+
+    def close_low_stock_dialog(self, e):
+        self.page.close(self.low_stock_dialog)
+
     def load_data(self):
         self.loading_indicator.visible = True
         if self.page:
@@ -166,7 +345,7 @@ class StatusSection(ft.Container):
 
         period = self.period_dropdown.value
         start_date: Optional[datetime] = None
-        end_date: Optional[datetime] = datetime.utcnow()
+        end_date: Optional[datetime] = store_now()
         
         if period == "today":
             start_date = datetime(end_date.year, end_date.month, end_date.day)
@@ -183,10 +362,17 @@ class StatusSection(ft.Container):
                 start_date=start_date,
                 end_date=end_date
             )
+        except PermissionDenied as exc:
+            if self.page:
+                self.page.open(ft.SnackBar(content=ft.Text(str(exc)), bgcolor=AppColors.ERROR))
+            self.loading_indicator.visible = False
+            if self.page:
+                self.update()
+            return
         except Exception as exc:
             logger.exception("Failed to load dashboard data: %s", exc)
             if self.page:
-                self.page.show_snack_bar(
+                self.page.open(
                     ft.SnackBar(
                         content=ft.Text("Unable to load dashboard data."),
                         bgcolor=AppColors.ERROR,
@@ -208,10 +394,14 @@ class StatusSection(ft.Container):
             self.margin_value_text.value = "0.0%"
 
         self.low_stock_value_text.value = str(snapshot.low_stock_count)
+        self.low_stock_items = snapshot.low_stock_items
 
         self._update_stock_chart(snapshot.stock_distribution)
         self._update_sales_chart(snapshot.sales_trends)
         self._update_payment_chart(snapshot.payment_method_distribution)
+        self._update_top_products_chart(snapshot.top_products)
+        self._update_category_chart(snapshot.category_sales)
+        self._update_heatmap(snapshot.sales_heatmap)
 
         self.loading_indicator.visible = False
         if self.page:
@@ -283,10 +473,16 @@ class StatusSection(ft.Container):
         bar_groups = []
         axis_labels = []
         max_amount = 0.0
+        # The snapshot caps the number of bars; thin them and their labels to fit.
+        bar_width = max(4, min(30, SALES_CHART_WIDTH // len(trends)))
+        label_every = max(1, -(-len(trends) // SALES_CHART_LABELS))
 
         for index, entry in enumerate(trends):
             amount = entry["revenue"]
             max_amount = max(max_amount, amount)
+            tooltip = f"${amount:.2f}\n{entry['label']}"
+            if entry.get("periods", 1) > 1:
+                tooltip += f"\nbest period ${entry['revenue_max']:.2f}"
             bar_groups.append(
                 ft.BarChartGroup(
                     x=index,
@@ -294,9 +490,53 @@ class StatusSection(ft.Container):
                         ft.BarChartRod(
                             from_y=0,
                             to_y=amount,
-                            width=30,
+                            width=bar_width,
                             color=AppColors.CHART_BAR,
-                            tooltip=f"${amount:.2f}\n{entry['label']}",
+                            tooltip=tooltip,
+                            border_radius=min(5, bar_width // 2),
+                        )
+                    ],
+                )
+            )
+            if index % label_every == 0:
+                axis_labels.append(
+                    ft.ChartAxisLabel(
+                        value=index,
+                        label=ft.Text(entry["period"], size=10),
+                    )
+                )
+
+        self.revenue_bar_chart.bar_groups = bar_groups
+        self.revenue_bar_chart.bottom_axis.labels = axis_labels
+        self.revenue_bar_chart.max_y = max_amount * 1.2 if max_amount else 1
+
+    def _update_top_products_chart(self, products: List[Dict[str, Any]]):
+        if not products:
+            self.top_products_chart.bar_groups = []
+            self.top_products_chart.bottom_axis.labels = []
+            self.top_products_chart.max_y = 0
+            return
+
+        bar_groups = []
+        axis_labels = []
+        max_amount = 0.0
+
+        for index, entry in enumerate(products):
+            amount = entry["revenue"]
+            max_amount = max(max_amount, amount)
+            bar_groups.append(
+                ft.BarChartGroup(
+                    x=index,
+                    bar_rods=[
+                        ft.BarChartRod(
+                            from_y=0,
+                            to_y=amount,
+                            width=30,
+                            color=AppColors.CHART_1,
+                            tooltip=(
+                                f"{entry['name']}\n${amount:.2f} · {entry['units']} units\n"
+                                f"Profit ${entry['profit']:.2f} ({entry['margin']:.1f}%)"
+                            ),
                             border_radius=5,
                         )
                     ],
@@ -305,10 +545,55 @@ class StatusSection(ft.Container):
             axis_labels.append(
                 ft.ChartAxisLabel(
                     value=index,
-                    label=ft.Text(entry["label"], size=10),
+                    label=ft.Text(entry["name"], size=10),
                 )
             )
 
-        self.revenue_bar_chart.bar_groups = bar_groups
-        self.revenue_bar_chart.bottom_axis.labels = axis_labels
-        self.revenue_bar_chart.max_y = max_amount * 1.2 if max_amount else 1
+        self.top_products_chart.bar_groups = bar_groups
+        self.top_products_chart.bottom_axis.labels = axis_labels
+        self.top_products_chart.max_y = max_amount * 1.2 if max_amount else 1
+
+    def _update_category_chart(self, categories: List[Dict[str, Any]]):
+        colors = [
+            AppColors.CHART_1,
+            AppColors.CHART_2,
+            AppColors.CHART_3,
+            AppColors.CHART_4,
+            AppColors.CHART_5,
+        ]
+
+        if not categories:
+            self.category_pie_chart.sections = []
+            return
+
+        sections = []
+        for index, item in enumerate(categories):
+            sections.append(
+                ft.PieChartSection(
+                    value=item["revenue"],
+                    title=f"${item['revenue']:.0f}",
+                    color=colors[index % len(colors)],
+                    radius=100,
+                    title_style=AppTextStyles.CHART_LABEL,
+                    badge=ft.Text(f"{item['category']} ({item['margin']:.0f}%)", size=10),
+                )
+            )
+
+        self.category_pie_chart.sections = sections
+
+    def _update_heatmap(self, heatmap: Dict[str, Any]):
+        max_revenue = heatmap["max_revenue"]
+        for weekday, cells in enumerate(self.heatmap_cells):
+            for hour, cell in enumerate(cells):
+                amount = heatmap["revenue"][weekday][hour]
+                count = heatmap["transactions"][weekday][hour]
+                if amount > 0 and max_revenue > 0:
+                    # Keep faint cells visible against the empty background.
+                    intensity = 0.15 + 0.85 * (amount / max_revenue)
+                    cell.bgcolor = ft.Colors.with_opacity(intensity, AppColors.PRIMARY)
+                else:
+                    cell.bgcolor = AppColors.SURFACE
+                cell.tooltip = (
+                    f"{WEEKDAY_LABELS[weekday]} {hour:02d}:00\n"
+                    f"${amount:,.2f} · {count} sales"
+                )
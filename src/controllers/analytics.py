@@ -1,36 +1,354 @@
 from __future__ import annotations
 
 from contextlib import contextmanager
+from functools import lru_cache
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from enum import Enum
-from typing import Any, Dict, Generator, List, Optional
+from typing import Any, Dict, Generator, List, Optional, Tuple
+import uuid
 
-from sqlalchemy import func
+from sqlalchemy import Integer, bindparam, case, exists, func, tuple_
 from sqlmodel import Session, select
 
-from db.conn import engine
+from controllers.authorization import requires, Permission
+from db.conn import session_scope
 from models.item import Product
-from models.sale import Sale, SaleItem
-from models.payment import Payment, PaymentStatus
+from models.inventory_stats import InventoryStats
+from models.sale import Sale, SaleItem, COUNTED_STATUSES, TRANSACTION_STATUSES
+from models.payment import Payment, PaymentMethod, PaymentStatus
+from models.velocity import ProductVelocity
+from models.heatmap import SalesHeatmapDay, HOURS_PER_DAY
+from utils.clock import from_epoch, from_local_seconds, store_now, to_epoch, utc_offsets
+from utils.downsample import bucket_sum
 
 
 class AnalyticsGranularity(str, Enum):
+    HOUR = "hour"
     DAY = "day"
     WEEK = "week"
     MONTH = "month"
 
 
+# Approximate length of one period; picks the finest granularity that fits a chart.
+_PERIOD_LENGTH = {
+    AnalyticsGranularity.HOUR: timedelta(hours=1),
+    AnalyticsGranularity.DAY: timedelta(days=1),
+    AnalyticsGranularity.WEEK: timedelta(weeks=1),
+    AnalyticsGranularity.MONTH: timedelta(days=30.44),
+}
+
+# Most points a sales trend chart gets, however long the window.
+CHART_POINTS = 60
+
+
+def auto_granularity(start: datetime, end: datetime, max_points: int = CHART_POINTS) -> AnalyticsGranularity:
+    """The finest granularity with at most ``max_points`` periods in the window."""
+    span = end - start
+    for granularity, length in _PERIOD_LENGTH.items():
+        if span / length <= max_points:
+            return granularity
+    return AnalyticsGranularity.MONTH
+
+
+class SalesMetric(str, Enum):
+    REVENUE = "revenue"
+    UNITS = "units"
+    PROFIT = "profit"
+
+
 @dataclass(slots=True)
 class DashboardSnapshot:
     inventory_value: float
     total_revenue: float
     total_profit: float
     low_stock_count: int
+    low_stock_items: List[Dict[str, Any]]
     stock_distribution: List[Dict[str, Any]]
     recent_sales: List[Sale]
     sales_trends: List[Dict[str, Any]]
     payment_method_distribution: List[Dict[str, Any]]
+    top_products: List[Dict[str, Any]]
+    category_sales: List[Dict[str, Any]]
+    sales_heatmap: Dict[str, Any]
+
+
+@dataclass(slots=True)
+class SalesHistoryFilter:
+    """Composite filter for the sales history; empty fields do not filter."""
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    statuses: Tuple[str, ...] = ()
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    payment_methods: Tuple[PaymentMethod, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class SalesCursor:
+    """Keyset position: the (created_at_epoch, id) of the last row of a page."""
+    created_at_epoch: int
+    id: uuid.UUID
+
+
+@dataclass(slots=True)
+class SalesHistoryPage:
+    rows: List[Dict[str, Any]]
+    # None on the last page.
+    next_cursor: Optional[SalesCursor]
+
+
+# Prebuilt statements ----------------------------------------------------------
+#
+# The dashboard queries are built once at import and executed with bound
+# parameters, so a call neither rebuilds the select nor misses SQLAlchemy's
+# compiled cache. Open-ended windows bind sentinel bounds rather than
+# changing the statement's shape.
+
+_NO_LIMIT = -1  # SQLite reads a negative LIMIT as "no limit"
+
+_WINDOW_START = bindparam("window_start")
+_WINDOW_END = bindparam("window_end")
+_EPOCH_START = bindparam("epoch_start", type_=Integer)
+_EPOCH_END = bindparam("epoch_end", type_=Integer)
+_LIMIT = bindparam("limit")
+
+# Open-ended bounds for created_at_epoch (SQLite integers are 64-bit).
+_EPOCH_MIN = -(2**63)
+_EPOCH_MAX = 2**63 - 1
+
+
+def _window(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    *,
+    limit: Optional[int] = _NO_LIMIT,
+) -> Dict[str, Any]:
+    # Sales are windowed on created_at_epoch, payments (which have no epoch
+    # column) on their wall-clock created_at.
+    return {
+        "window_start": start or datetime.min,
+        "window_end": end or datetime.max,
+        "epoch_start": to_epoch(start) if start else _EPOCH_MIN,
+        "epoch_end": to_epoch(end) if end else _EPOCH_MAX,
+        "limit": _NO_LIMIT if limit is None else limit,
+    }
+
+
+def _sales_in_window(statement):
+    # Refund and void adjustments are negative sales, so summing over every
+    # counted status nets them out without touching the original rows.
+    return statement.where(
+        Sale.status.in_(COUNTED_STATUSES),
+        Sale.created_at_epoch >= _EPOCH_START,
+        Sale.created_at_epoch <= _EPOCH_END,
+    )
+
+
+def _line_item_totals(group_column):
+    return _sales_in_window(
+        select(
+            group_column,
+            func.sum(SaleItem.quantity).label("units"),
+            func.sum(SaleItem.unit_price * SaleItem.quantity).label("revenue"),
+            func.sum(
+                (SaleItem.unit_price - SaleItem.cost_price) * SaleItem.quantity
+            ).label("profit"),
+        )
+        .join(Sale, Sale.id == SaleItem.sale_id)
+    )
+
+
+def _product_sales_statement(rank_by: SalesMetric):
+    # Rank on SaleItem alone so Product is only joined for the top N rows.
+    totals = _line_item_totals(SaleItem.product_id.label("product_id"))
+    totals = totals.group_by(SaleItem.product_id)
+    totals = totals.order_by(totals.selected_columns[rank_by.value].desc())
+    totals = totals.limit(_LIMIT).subquery()
+
+    return (
+        select(
+            Product.id,
+            Product.name,
+            Product.category,
+            totals.c.units,
+            totals.c.revenue,
+            totals.c.profit,
+        )
+        .join(Product, Product.id == totals.c.product_id)
+        .order_by(totals.c[rank_by.value].desc())
+    )
+
+
+def _category_sales_statement(rank_by: SalesMetric):
+    statement = _line_item_totals(Product.category.label("category"))
+    statement = statement.join(Product, Product.id == SaleItem.product_id)
+    statement = statement.group_by(Product.category)
+    statement = statement.order_by(statement.selected_columns[rank_by.value].desc())
+    return statement.limit(_LIMIT)
+
+
+# Trend buckets are integer divisions of local seconds (epoch + UTC offset).
+# Epoch day 0 was a Thursday, so shifting by 3 days starts weeks on Monday.
+# Months are not a fixed width: they are summed from day buckets.
+_BUCKET_SECONDS = {
+    AnalyticsGranularity.HOUR: 3600,
+    AnalyticsGranularity.DAY: 86400,
+    AnalyticsGranularity.WEEK: 86400,
+    AnalyticsGranularity.MONTH: 86400,
+}
+
+_PERIOD_FORMAT = {
+    AnalyticsGranularity.HOUR: "%Y-%m-%d %H:00",
+    AnalyticsGranularity.DAY: "%Y-%m-%d",
+    AnalyticsGranularity.WEEK: "%Y-%W",
+    AnalyticsGranularity.MONTH: "%Y-%m",
+}
+
+
+@lru_cache(maxsize=None)
+def _sales_trends_statement(granularity: AnalyticsGranularity, offset_changes: int):
+    """Revenue and transactions per bucket, from ix_sale_status_epoch alone.
+
+    One statement per granularity and number of DST changes in the window;
+    the change instants and offsets are bound, so each shape is built and
+    compiled once.
+    """
+    epoch = Sale.created_at_epoch
+    offset = bindparam("offset_0", type_=Integer)
+    if offset_changes:
+        offset = case(
+            *[
+                (epoch < bindparam(f"change_{i}", type_=Integer), bindparam(f"offset_{i}", type_=Integer))
+                for i in range(offset_changes)
+            ],
+            else_=bindparam(f"offset_{offset_changes}", type_=Integer),
+        )
+    bucket = (epoch + offset) // _BUCKET_SECONDS[granularity]
+    if granularity == AnalyticsGranularity.WEEK:
+        bucket = (bucket + 3) // 7
+    bucket = bucket.label("bucket")
+    return (
+        select(
+            bucket,
+            func.coalesce(func.sum(Sale.total_amount), 0.0).label("revenue"),
+            func.sum(
+                case((Sale.status.in_(TRANSACTION_STATUSES), 1), else_=0)
+            ).label("sales"),
+        )
+        .where(
+            epoch >= _EPOCH_START,
+            epoch <= _EPOCH_END,
+            Sale.status.in_(COUNTED_STATUSES),
+        )
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+
+
+def _trend_params(start: datetime, end: datetime) -> Tuple[Dict[str, Any], int]:
+    epoch_start, epoch_end = to_epoch(start), to_epoch(end)
+    offset, changes = utc_offsets(epoch_start, epoch_end)
+    params = {"epoch_start": epoch_start, "epoch_end": epoch_end, "offset_0": offset}
+    for i, (instant, new_offset) in enumerate(changes):
+        params[f"change_{i}"] = instant
+        params[f"offset_{i + 1}"] = new_offset
+    return params, len(changes)
+
+
+# Maintained by triggers on product (see models/inventory_stats.py).
+_INVENTORY_STATS = select(InventoryStats.inventory_value, InventoryStats.low_stock_count).where(
+    InventoryStats.id == 1
+)
+
+# Full-scan fallbacks for a database whose stats row is missing.
+_INVENTORY_VALUE = select(func.coalesce(func.sum(Product.price * Product.quantity), 0.0))
+
+_LOW_STOCK_COUNT = select(func.count(Product.id)).where(Product.quantity < Product.reorder_point)
+
+_LOW_STOCK_COUNT_BELOW = select(func.count(Product.id)).where(
+    Product.quantity < bindparam("threshold")
+)
+
+_DAILY_DEMAND = func.coalesce(ProductVelocity.daily_demand, 0.0)
+_DAYS_OF_COVER = Product.quantity / func.nullif(_DAILY_DEMAND, 0.0)
+
+_LOW_STOCK_PRODUCTS = (
+    select(
+        Product.id,
+        Product.name,
+        Product.quantity,
+        Product.reorder_point,
+        _DAILY_DEMAND.label("daily_demand"),
+        _DAYS_OF_COVER.label("days_of_cover"),
+    )
+    .outerjoin(ProductVelocity, ProductVelocity.product_id == Product.id)
+    .where(Product.quantity < Product.reorder_point)
+    .order_by(_DAYS_OF_COVER.asc().nulls_last(), Product.quantity.asc())
+    .limit(_LIMIT)
+)
+
+_REVENUE_TOTAL = _sales_in_window(select(func.coalesce(func.sum(Sale.total_amount), 0.0)))
+
+_PROFIT_TOTAL = _sales_in_window(
+    select(
+        func.coalesce(
+            func.sum((SaleItem.unit_price - SaleItem.cost_price) * SaleItem.quantity),
+            0.0,
+        )
+    )
+    .join(Sale, Sale.id == SaleItem.sale_id)
+)
+
+_STOCK_DISTRIBUTION = (
+    select(Product.name, Product.quantity)
+    .where(Product.quantity > 0)
+    .order_by(Product.quantity.desc())
+    .limit(_LIMIT)
+)
+
+_CATEGORY_DISTRIBUTION = select(Product.category, func.count(Product.id)).group_by(Product.category)
+
+_PRODUCT_SALES = {metric: _product_sales_statement(metric) for metric in SalesMetric}
+
+_CATEGORY_SALES = {metric: _category_sales_statement(metric) for metric in SalesMetric}
+
+_HEATMAP_DAYS = select(SalesHeatmapDay).where(
+    SalesHeatmapDay.day >= bindparam("first_day"),
+    SalesHeatmapDay.day <= bindparam("last_day"),
+)
+
+_RECENT_SALES = (
+    select(Sale)
+    .where(Sale.status.in_(TRANSACTION_STATUSES))
+    .order_by(Sale.created_at_epoch.desc())
+    .limit(_LIMIT)
+)
+
+# Served from ix_sale_epoch_id without touching the table.
+_FIRST_SALE_EPOCH = select(func.min(Sale.created_at_epoch))
+
+_SALE_PAYMENT_METHOD = (
+    select(Payment.payment_method)
+    .where(Payment.sale_id == Sale.id)
+    .limit(1)
+    .scalar_subquery()
+)
+
+_PAYMENT_METHODS = (
+    select(
+        Payment.payment_method,
+        func.sum(case((Payment.status == PaymentStatus.COMPLETED, 1), else_=0)),
+        # Refund payments are negative, so the total is net of refunds.
+        func.sum(Payment.amount),
+    )
+    .where(
+        Payment.status.in_((PaymentStatus.COMPLETED, PaymentStatus.REFUNDED)),
+        Payment.created_at >= _WINDOW_START,
+        Payment.created_at <= _WINDOW_END,
+    )
+    .group_by(Payment.payment_method)
+)
 
 
 class AnalyticsService:
@@ -45,15 +363,25 @@ class AnalyticsService:
             yield self._session
             return
 
-        with Session(engine) as session:
+        with session_scope(read_only=True) as session:
             yield session
 
     # Public API -----------------------------------------------------------------
 
-    def get_inventory_metrics(self, *, low_stock_threshold: int = 5) -> Dict[str, Any]:
+    def get_inventory_metrics(self, *, low_stock_threshold: Optional[int] = None) -> Dict[str, Any]:
         with self._session_scope() as session:
             return self._inventory_metrics(session, low_stock_threshold)
 
+    def get_low_stock_products(self, *, limit: Optional[int] = 20) -> List[Dict[str, Any]]:
+        """Products below their reorder point, least cover first; ``limit=None`` lists all.
+
+        Served from the partial index on low-stock products, so the cost
+        follows the number of low items, not the catalog size.
+        """
+        with self._session_scope() as session:
+            return self._low_stock_products(session, limit)
+
+    @requires(Permission.VIEW_REVENUE)
     def get_revenue_metrics(
         self,
         *,
@@ -71,78 +399,172 @@ class AnalyticsService:
         with self._session_scope() as session:
             return self._category_distribution(session)
 
+    @requires(Permission.VIEW_REVENUE)
+    def get_product_sales_breakdown(
+        self,
+        *,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        top_n: Optional[int] = 10,
+        rank_by: SalesMetric = SalesMetric.REVENUE,
+    ) -> List[Dict[str, Any]]:
+        with self._session_scope() as session:
+            return self._product_sales(session, start, end, top_n, rank_by)
+
+    @requires(Permission.VIEW_REVENUE)
+    def get_category_sales_breakdown(
+        self,
+        *,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        top_n: Optional[int] = None,
+        rank_by: SalesMetric = SalesMetric.REVENUE,
+    ) -> List[Dict[str, Any]]:
+        with self._session_scope() as session:
+            return self._category_sales(session, start, end, top_n, rank_by)
+
+    def get_sales_heatmap(
+        self,
+        *,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        with self._session_scope() as session:
+            return self._sales_heatmap(session, start, end)
+
     def get_recent_sales(self, *, limit: int = 5) -> List[Sale]:
         with self._session_scope() as session:
             return self._recent_sales(session, limit)
 
+    def get_sales_history(
+        self,
+        filters: Optional[SalesHistoryFilter] = None,
+        *,
+        after: Optional[SalesCursor] = None,
+        limit: int = 50,
+    ) -> SalesHistoryPage:
+        """One page of sales, newest first, starting after ``after``.
+
+        Keyset pagination on (created_at_epoch, id): every page is an index
+        range scan, so page 10,000 costs the same as page 1.
+        """
+        with self._session_scope() as session:
+            return self._sales_history(session, filters or SalesHistoryFilter(), after, limit)
+
     def get_sales_aggregations(
         self,
         *,
-        granularity: AnalyticsGranularity = AnalyticsGranularity.DAY,
+        granularity: Optional[AnalyticsGranularity] = AnalyticsGranularity.DAY,
         start: Optional[datetime] = None,
         end: Optional[datetime] = None,
+        max_points: Optional[int] = None,
     ) -> List[Dict[str, Any]]:
+        """Revenue and sale count per period; ``granularity=None`` picks one for ``max_points``."""
         with self._session_scope() as session:
-            return self._sales_trends(session, granularity, start, end)
+            return self._sales_trends(session, granularity, start, end, max_points=max_points)
 
+    @requires(Permission.VIEW_REVENUE)
     def get_dashboard_snapshot(
         self,
         *,
-        low_stock_threshold: int = 5,
+        low_stock_threshold: Optional[int] = None,
+        low_stock_limit: int = 10,
         top_n_products: int = 5,
+        top_n_sellers: int = 5,
         sales_limit: int = 5,
-        granularity: AnalyticsGranularity = AnalyticsGranularity.DAY,
+        granularity: Optional[AnalyticsGranularity] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
+        chart_points: int = CHART_POINTS,
     ) -> DashboardSnapshot:
+        """Everything the status tab shows, from one read snapshot.
+
+        Without a ``granularity`` the sales trend picks one from the window
+        (all history when ``start_date`` is None). Either way it is
+        downsampled to at most ``chart_points`` bars.
+        """
         with self._session_scope() as session:
             inventory = self._inventory_metrics(session, low_stock_threshold)
+            low_stock_items = self._low_stock_products(session, low_stock_limit)
             revenue = self._revenue_metrics(session, start_date, end_date)
             stock_distribution = self._stock_distribution(session, top_n_products)
             recent_sales = self._recent_sales(session, sales_limit)
-            sales_trends = self._sales_trends(session, granularity, start_date, end_date)
+            trend_start = start_date or self._first_sale_at(session)
+            sales_trends = self._sales_trends(
+                session, granularity, trend_start, end_date, max_points=chart_points
+            )
             payment_distribution = self._payment_method_distribution(session, start_date, end_date)
+            top_products = self._product_sales(
+                session, start_date, end_date, top_n_sellers, SalesMetric.REVENUE
+            )
+            category_sales = self._category_sales(
+                session, start_date, end_date, None, SalesMetric.REVENUE
+            )
+            sales_heatmap = self._sales_heatmap(session, start_date, end_date)
 
         return DashboardSnapshot(
             inventory_value=inventory["inventory_value"],
             total_revenue=revenue["total_revenue"],
             total_profit=revenue["total_profit"],
             low_stock_count=inventory["low_stock_count"],
+            low_stock_items=low_stock_items,
             stock_distribution=stock_distribution,
             recent_sales=recent_sales,
             sales_trends=sales_trends,
             payment_method_distribution=payment_distribution,
+            top_products=top_products,
+            category_sales=category_sales,
+            sales_heatmap=sales_heatmap,
         )
 
     # Internal helpers -----------------------------------------------------------
 
-    def _inventory_metrics(self, session: Session, low_stock_threshold: int) -> Dict[str, Any]:
-        value_statement = select(
-            func.coalesce(func.sum(Product.price * Product.quantity), 0.0)
-        )
-        total_inventory_value = session.exec(value_statement).one()
-
-        low_stock_statement = select(func.count(Product.id)).where(
-            Product.quantity < low_stock_threshold
-        )
-        low_stock_count = session.exec(low_stock_statement).one()
+    def _inventory_metrics(self, session: Session, low_stock_threshold: Optional[int]) -> Dict[str, Any]:
+        stats = session.exec(_INVENTORY_STATS).first()
+        if stats is not None:
+            total_inventory_value, low_stock_count = stats
+        else:
+            total_inventory_value = session.exec(_INVENTORY_VALUE).one()
+            low_stock_count = None
+
+        # Without an explicit threshold each product is measured against its
+        # own velocity-based reorder point.
+        if low_stock_threshold is None:
+            if low_stock_count is None:
+                low_stock_count = session.exec(_LOW_STOCK_COUNT).one()
+        else:
+            low_stock_count = session.exec(
+                _LOW_STOCK_COUNT_BELOW, params={"threshold": low_stock_threshold}
+            ).one()
 
         return {
             "inventory_value": float(total_inventory_value or 0.0),
             "low_stock_count": int(low_stock_count or 0),
         }
 
+    def _low_stock_products(self, session: Session, limit: Optional[int]) -> List[Dict[str, Any]]:
+        rows = session.exec(
+            _LOW_STOCK_PRODUCTS, params={"limit": _NO_LIMIT if limit is None else limit}
+        ).all()
+        return [
+            {
+                "id": row[0],
+                "name": row[1],
+                "quantity": int(row[2]),
+                "reorder_point": int(row[3]),
+                "daily_demand": float(row[4] or 0.0),
+                "days_of_cover": float(row[5]) if row[5] is not None else None,
+            }
+            for row in rows
+        ]
+
     def _revenue_metrics(
         self,
         session: Session,
         start: Optional[datetime],
         end: Optional[datetime],
     ) -> Dict[str, Any]:
-        revenue_statement = select(func.coalesce(func.sum(Sale.total_amount), 0.0)).where(
-            Sale.status == "completed"
-        )
-        revenue_statement = self._apply_sale_window(revenue_statement, start, end)
-        total_revenue = session.exec(revenue_statement).one()
+        total_revenue = session.exec(_REVENUE_TOTAL, params=_window(start, end)).one()
 
         profit_value = self._profit_value(session, start, end)
 
@@ -157,97 +579,215 @@ class AnalyticsService:
         start: Optional[datetime],
         end: Optional[datetime],
     ) -> float:
-        profit_statement = (
-            select(
-                func.coalesce(
-                    func.sum(
-                        (SaleItem.unit_price - SaleItem.cost_price)
-                        * SaleItem.quantity
-                    ),
-                    0.0,
-                )
-            )
-            .join(Sale, Sale.id == SaleItem.sale_id)
-            .where(Sale.status == "completed")
-        )
-        profit_statement = self._apply_sale_window(profit_statement, start, end)
-        profit = session.exec(profit_statement).one()
+        profit = session.exec(_PROFIT_TOTAL, params=_window(start, end)).one()
         return float(profit or 0.0)
 
     def _stock_distribution(self, session: Session, top_n: int) -> List[Dict[str, Any]]:
-        statement = (
-            select(Product.name, Product.quantity)
-            .where(Product.quantity > 0)
-            .order_by(Product.quantity.desc())
-            .limit(top_n)
-        )
-        rows = session.exec(statement).all()
+        rows = session.exec(_STOCK_DISTRIBUTION, params={"limit": top_n}).all()
         return [
             {"name": row[0], "quantity": int(row[1])}
             for row in rows
         ]
 
     def _category_distribution(self, session: Session) -> List[Dict[str, Any]]:
-        statement = (
-            select(Product.category, func.count(Product.id))
-            .group_by(Product.category)
-        )
-        rows = session.exec(statement).all()
+        rows = session.exec(_CATEGORY_DISTRIBUTION).all()
         return [
             {"category": row[0] or "Uncategorized", "count": int(row[1])}
             for row in rows
         ]
 
+    def _product_sales(
+        self,
+        session: Session,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        top_n: Optional[int],
+        rank_by: SalesMetric,
+    ) -> List[Dict[str, Any]]:
+        rows = session.exec(
+            _PRODUCT_SALES[rank_by], params=_window(start, end, limit=top_n)
+        ).all()
+        return [
+            self._sales_row(
+                {"id": row[0], "name": row[1], "category": row[2] or "Uncategorized"},
+                row[3],
+                row[4],
+                row[5],
+            )
+            for row in rows
+        ]
+
+    def _category_sales(
+        self,
+        session: Session,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        top_n: Optional[int],
+        rank_by: SalesMetric,
+    ) -> List[Dict[str, Any]]:
+        rows = session.exec(
+            _CATEGORY_SALES[rank_by], params=_window(start, end, limit=top_n)
+        ).all()
+        return [
+            self._sales_row({"category": row[0] or "Uncategorized"}, row[1], row[2], row[3])
+            for row in rows
+        ]
+
+    @staticmethod
+    def _sales_row(key: Dict[str, Any], units, revenue, profit) -> Dict[str, Any]:
+        revenue = float(revenue or 0.0)
+        profit = float(profit or 0.0)
+        return {
+            **key,
+            "units": int(units or 0),
+            "revenue": revenue,
+            "profit": profit,
+            "margin": (profit / revenue) * 100 if revenue else 0.0,
+        }
+
+    def _sales_heatmap(
+        self,
+        session: Session,
+        start: Optional[datetime],
+        end: Optional[datetime],
+    ) -> Dict[str, Any]:
+        """Weekday x hour revenue and transaction matrix (Monday is row 0).
+
+        Summed from the per-day rows maintained at checkout, so the window is
+        resolved to whole days and raw sales are never scanned.
+        """
+        revenue = [[0.0] * HOURS_PER_DAY for _ in range(7)]
+        transactions = [[0] * HOURS_PER_DAY for _ in range(7)]
+
+        params = {
+            "first_day": start.date() if start else date.min,
+            "last_day": end.date() if end else date.max,
+        }
+        for row in session.exec(_HEATMAP_DAYS, params=params):
+            weekday = row.day.weekday()
+            day_revenue = revenue[weekday]
+            day_transactions = transactions[weekday]
+            for hour, (amount, count) in enumerate(
+                zip(row.revenue_cells(), row.transaction_cells())
+            ):
+                day_revenue[hour] += amount
+                day_transactions[hour] += count
+
+        return {
+            "revenue": revenue,
+            "transactions": transactions,
+            "max_revenue": max(max(row) for row in revenue),
+            "max_transactions": max(max(row) for row in transactions),
+        }
+
     def _recent_sales(self, session: Session, limit: int) -> List[Sale]:
-        statement = (
-            select(Sale)
-            .where(Sale.status == "completed")
-            .order_by(Sale.created_at.desc())
-            .limit(limit)
+        return session.exec(_RECENT_SALES, params={"limit": limit}).all()
+
+    @staticmethod
+    def _first_sale_at(session: Session) -> Optional[datetime]:
+        epoch = session.exec(_FIRST_SALE_EPOCH).one()
+        return from_epoch(epoch) if epoch is not None else None
+
+    def _sales_history(
+        self,
+        session: Session,
+        filters: SalesHistoryFilter,
+        after: Optional[SalesCursor],
+        limit: int,
+    ) -> SalesHistoryPage:
+        statement = select(
+            Sale.id,
+            Sale.created_at,
+            Sale.total_amount,
+            Sale.status,
+            _SALE_PAYMENT_METHOD.label("payment_method"),
+            Sale.created_at_epoch,
         )
-        return session.exec(statement).all()
+        if filters.start:
+            statement = statement.where(Sale.created_at_epoch >= to_epoch(filters.start))
+        if filters.end:
+            statement = statement.where(Sale.created_at_epoch <= to_epoch(filters.end))
+        if filters.statuses:
+            statement = statement.where(Sale.status.in_(filters.statuses))
+        if filters.min_amount is not None:
+            statement = statement.where(Sale.total_amount >= filters.min_amount)
+        if filters.max_amount is not None:
+            statement = statement.where(Sale.total_amount <= filters.max_amount)
+        if filters.payment_methods:
+            statement = statement.where(
+                exists().where(
+                    Payment.sale_id == Sale.id,
+                    Payment.payment_method.in_(filters.payment_methods),
+                )
+            )
+        if after:
+            statement = statement.where(
+                tuple_(Sale.created_at_epoch, Sale.id) < tuple_(
+                    bindparam("after_epoch", after.created_at_epoch, type_=Integer),
+                    bindparam("after_id", after.id, type_=Sale.__table__.c.id.type),
+                )
+            )
+        statement = statement.order_by(Sale.created_at_epoch.desc(), Sale.id.desc()).limit(limit + 1)
+
+        rows = session.exec(statement).all()
+        page = [
+            {
+                "id": row[0],
+                "created_at": row[1],
+                "total_amount": float(row[2] or 0.0),
+                "status": row[3],
+                "payment_method": row[4],
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = SalesCursor(last[5], last[0])
+        return SalesHistoryPage(rows=page, next_cursor=next_cursor)
 
     def _sales_trends(
         self,
         session: Session,
-        granularity: AnalyticsGranularity,
+        granularity: Optional[AnalyticsGranularity],
         start: Optional[datetime],
         end: Optional[datetime],
+        *,
+        max_points: Optional[int] = None,
     ) -> List[Dict[str, Any]]:
-        fmt = {
-            AnalyticsGranularity.DAY: "%Y-%m-%d",
-            AnalyticsGranularity.WEEK: "%Y-%W",
-            AnalyticsGranularity.MONTH: "%Y-%m",
-        }[granularity]
-
         if not end:
-            end = datetime.utcnow()
+            end = store_now()
         if not start:
             start = end - timedelta(days=30)
-
-        statement = (
-            select(
-                func.strftime(fmt, Sale.created_at).label("period"),
-                func.coalesce(func.sum(Sale.total_amount), 0.0).label("revenue"),
-                func.count(Sale.id).label("sales"),
-            )
-            .where(Sale.status == "completed")
-        )
-        statement = self._apply_sale_window(statement, start, end)
-        statement = statement.group_by("period").order_by("period")
-
-        rows = session.exec(statement).all()
+        if granularity is None:
+            granularity = auto_granularity(start, end, max_points or CHART_POINTS)
+
+        params, offset_changes = _trend_params(start, end)
+        statement = _sales_trends_statement(granularity, offset_changes)
+        seconds = _BUCKET_SECONDS[granularity] * (7 if granularity == AnalyticsGranularity.WEEK else 1)
+        # Undo the Monday shift for weeks.
+        shift = 3 * 86400 if granularity == AnalyticsGranularity.WEEK else 0
+        fmt = _PERIOD_FORMAT[granularity]
         trend = []
-        for row in rows:
-            period = row.period
+        for row in session.exec(statement, params=params):
+            period = from_local_seconds(row.bucket * seconds - shift).strftime(fmt)
+            revenue, sales = float(row.revenue or 0.0), int(row.sales or 0)
+            if trend and trend[-1]["period"] == period:
+                # Day buckets of the same month.
+                trend[-1]["revenue"] += revenue
+                trend[-1]["sales"] += sales
+                continue
             trend.append(
                 {
                     "period": period,
                     "label": period,
-                    "revenue": float(row.revenue or 0.0),
-                    "sales": int(row.sales or 0),
+                    "revenue": revenue,
+                    "sales": sales,
                 }
             )
+        if max_points:
+            # Windows longer than even monthly bars fit, or a fixed granularity.
+            trend = bucket_sum(trend, max_points, sum_keys=("revenue", "sales"))
         return trend
 
     def _payment_method_distribution(
@@ -256,18 +796,7 @@ class AnalyticsService:
         start: Optional[datetime],
         end: Optional[datetime],
     ) -> List[Dict[str, Any]]:
-        statement = (
-            select(Payment.payment_method, func.count(Payment.id), func.sum(Payment.amount))
-            .where(Payment.status == PaymentStatus.COMPLETED)
-            .group_by(Payment.payment_method)
-        )
-        
-        if start:
-            statement = statement.where(Payment.created_at >= start)
-        if end:
-            statement = statement.where(Payment.created_at <= end)
-            
-        rows = session.exec(statement).all()
+        rows = session.exec(_PAYMENT_METHODS, params=_window(start, end)).all()
         return [
             {
                 "method": row[0],
@@ -276,11 +805,3 @@ class AnalyticsService:
             }
             for row in rows
         ]
-
-    @staticmethod
-    def _apply_sale_window(statement, start: Optional[datetime], end: Optional[datetime]):
-        if start:
-            statement = statement.where(Sale.created_at >= start)
-        if end:
-            statement = statement.where(Sale.created_at <= end)
-        return statement
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import json
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import uuid
+
+from sqlalchemy import insert
+from sqlmodel import select
+
+from controllers.authentication import auth
+from controllers.authorization import requires, Permission
+from db.conn import session_scope
+from models.audit import AuditEntry
+from utils.clock import utc_now
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class AuditLog:
+    """Buffers audit events in memory and appends them to AuditEntry in batches.
+
+    ``record`` only takes a lock and appends to a list, so auditing adds next
+    to nothing to the operation being audited. A background thread flushes
+    the buffer every ``flush_interval`` seconds, or sooner once
+    ``batch_size`` events are waiting, with one multi-row INSERT.
+    """
+
+    def __init__(self, *, flush_interval: float = 1.0, batch_size: int = 200):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._buffer: List[Dict[str, Any]] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Public API -----------------------------------------------------------------
+
+    def record(
+        self,
+        action: str,
+        entity: str,
+        entity_id: Any = None,
+        *,
+        before: Optional[Dict[str, Any]] = None,
+        after: Optional[Dict[str, Any]] = None,
+    ):
+        """Queue one audit event, attributed to the active operator."""
+        operator = auth.active
+        row = {
+            "occurred_at": utc_now(),
+            "actor_id": operator.user_id if operator else None,
+            "actor_name": operator.username if operator else None,
+            "action": action,
+            "entity": entity,
+            "entity_id": str(entity_id) if entity_id is not None else None,
+            "before": _dump(before),
+            "after": _dump(after),
+        }
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write everything buffered so far. Returns the number of entries written."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        try:
+            with session_scope() as session:
+                session.execute(insert(AuditEntry), rows)
+        except Exception as e:
+            # Keep the events for the next attempt rather than dropping them.
+            with self._lock:
+                self._buffer[:0] = rows
+            logger.error(f"Failed to flush {len(rows)} audit entries: {e}")
+            return 0
+        return len(rows)
+
+    def start(self) -> threading.Thread:
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-flush", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    @requires(Permission.VIEW_AUDIT)
+    def query(
+        self,
+        *,
+        actor_id: Optional[uuid.UUID] = None,
+        entity: Optional[str] = None,
+        entity_id: Any = None,
+        action: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        before_id: Optional[int] = None,
+        limit: int = 100,
+    ) -> List[AuditEntry]:
+        """Newest-first audit entries matching every given filter.
+
+        ``start`` and ``end`` are UTC, like ``occurred_at``. Pass the smallest
+        ``id`` of a page as ``before_id`` to fetch the next one.
+        Buffered events are flushed first so results are current.
+        """
+        self.flush()
+        statement = select(AuditEntry)
+        if actor_id is not None:
+            statement = statement.where(AuditEntry.actor_id == actor_id)
+        if entity is not None:
+            statement = statement.where(AuditEntry.entity == entity)
+        if entity_id is not None:
+            statement = statement.where(AuditEntry.entity_id == str(entity_id))
+        if action is not None:
+            statement = statement.where(AuditEntry.action == action)
+        if start:
+            statement = statement.where(AuditEntry.occurred_at >= start)
+        if end:
+            statement = statement.where(AuditEntry.occurred_at <= end)
+        if before_id is not None:
+            statement = statement.where(AuditEntry.id < before_id)
+        statement = statement.order_by(AuditEntry.occurred_at.desc(), AuditEntry.id.desc()).limit(limit)
+
+        with session_scope(read_only=True) as session:
+            return session.exec(statement).all()
+
+    # Internal helpers -----------------------------------------------------------
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+def _dump(values: Optional[Dict[str, Any]]) -> Optional[str]:
+    if values is None:
+        return None
+    return json.dumps(values, default=str, separators=(",", ":"))
+
+
+audit = AuditLog()
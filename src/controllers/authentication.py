@@ -1,4 +1,369 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import lru_cache
+from typing import Dict, Generator, Optional, Tuple
+import uuid
+
+from sqlmodel import Session, select
+
+from db.conn import session_scope
+from models.user import Role, User
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# scrypt cost for stored credentials. Raising these only affects new hashes;
+# older ones are upgraded on the next successful login (see needs_rehash).
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_MAXMEM = 128 * 1024 * 1024
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+TOKEN_TTL = timedelta(hours=12)
+# A PIN stays switchable for this long after it was last checked against its stored hash.
+PIN_CACHE_TTL = timedelta(hours=12)
+MAX_PIN_FAILURES = 5
+
+
+class AuthenticationError(Exception):
+    pass
+
+
+# Hashing ----------------------------------------------------------------------------
+
+def hash_secret(
+    secret: str,
+    *,
+    n: Optional[int] = None,
+    r: Optional[int] = None,
+    p: Optional[int] = None,
+) -> str:
+    """Hash a password or PIN as ``scrypt$n$r$p$salt$key`` (base64 parts).
+
+    Cost parameters default to the module settings at call time.
+    """
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(secret, salt, n, r, p)
+    return "$".join(("scrypt", str(n), str(r), str(p), _b64(salt), _b64(key)))
+
+
+def verify_secret(secret: str, encoded: str) -> bool:
+    try:
+        scheme, n, r, p, salt, key = encoded.split("$")
+    except ValueError:
+        return False
+    if scheme != "scrypt":
+        return False
+    candidate = _scrypt(secret, _unb64(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(candidate, _unb64(key))
+
+
+def needs_rehash(encoded: str) -> bool:
+    parts = encoded.split("$")
+    return len(parts) != 6 or parts[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+def _scrypt(secret: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        secret.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=SCRYPT_MAXMEM, dklen=KEY_BYTES
+    )
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _unb64(data: str) -> bytes:
+    return base64.b64decode(data.encode("ascii"))
+
+
+@lru_cache(maxsize=1)
+def _dummy_hash() -> str:
+    # Unknown usernames are checked against this, so they cost as much as a wrong password.
+    return hash_secret(secrets.token_hex(8))
+
+
+# Sessions ---------------------------------------------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class AuthSession:
+    token: str
+    user_id: uuid.UUID
+    username: str
+    role: Role
+    expires_at: float  # time.monotonic() deadline
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
 
 
 class AuthenticationController:
-    pass
\ No newline at end of file
+    """Password login, session tokens and PIN-based cashier switching.
+
+    Stored credentials are scrypt hashes, verified on a small worker pool
+    (``login_async`` / ``switch_user_async``) so Flet handlers never stall on
+    the KDF. Verified sessions live in an in-memory token cache.
+
+    Once a PIN has been checked against its stored hash, an HMAC of it under
+    a per-process key is cached, so later switches to that cashier during
+    the shift take microseconds. The stored hash stays full-strength, and
+    the cached verifier never leaves memory.
+    """
+
+    def __init__(self, session: Optional[Session] = None, *, workers: int = 2):
+        self._session = session
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth")
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, AuthSession] = {}
+        self._pin_key = secrets.token_bytes(32)
+        # user_id -> (HMAC of the PIN, expiry deadline)
+        self._pin_cache: Dict[uuid.UUID, Tuple[bytes, float]] = {}
+        self._pin_failures: Dict[uuid.UUID, int] = {}
+        self.active: Optional[AuthSession] = None
+
+    # Public API -----------------------------------------------------------------
+
+    def create_user(
+        self,
+        username: str,
+        email: str,
+        password: str,
+        *,
+        role: Role = Role.USER,
+        pin: Optional[str] = None,
+    ) -> User:
+        """Add an account. Needs MANAGE_USERS."""
+        self._check_manage_users()
+        user = User(
+            username=username,
+            email=email,
+            role=role,
+            password_hash=hash_secret(password),
+            pin_hash=hash_secret(pin) if pin else None,
+        )
+        with self._session_scope() as session:
+            if session.exec(select(User.id).where(User.username == username)).first():
+                raise AuthenticationError(f"Username {username!r} is already taken")
+            session.add(user)
+        return user
+
+    def has_users(self) -> bool:
+        with self._session_scope(read_only=True) as session:
+            return session.exec(select(User.id).limit(1)).first() is not None
+
+    def create_first_admin(self, username: str, email: str, password: str) -> User:
+        """Create the initial administrator. Only allowed while no account exists."""
+        user = User(username=username, email=email, role=Role.ADMIN, password_hash=hash_secret(password))
+        with self._session_scope() as session:
+            if session.exec(select(User.id).limit(1)).first() is not None:
+                raise AuthenticationError("An account already exists; log in instead")
+            session.add(user)
+        logger.info(f"Created administrator {username}")
+        return user
+
+    def create_first_admin_async(self, username: str, email: str, password: str) -> Future:
+        """``create_first_admin`` and then ``login`` on the auth worker pool."""
+        def run() -> AuthSession:
+            self.create_first_admin(username, email, password)
+            return self.login(username, password)
+
+        return self._executor.submit(run)
+
+    def set_password(self, user_id: uuid.UUID, password: str):
+        """Needs MANAGE_USERS, except for the active operator's own password."""
+        self._check_manage_users(user_id)
+        password_hash = hash_secret(password)
+        with self._session_scope() as session:
+            user = self._require_user(session, user_id)
+            user.password_hash = password_hash
+            session.add(user)
+        self.logout_user(user_id)
+
+    def set_pin(self, user_id: uuid.UUID, pin: str):
+        """Needs MANAGE_USERS, except for the active operator's own PIN."""
+        self._check_manage_users(user_id)
+        pin_hash = hash_secret(pin)
+        with self._session_scope() as session:
+            user = self._require_user(session, user_id)
+            user.pin_hash = pin_hash
+            session.add(user)
+        with self._lock:
+            self._pin_cache[user_id] = (self._pin_verifier(pin), self._deadline(PIN_CACHE_TTL))
+            self._pin_failures.pop(user_id, None)
+
+    def login(self, username: str, password: str) -> AuthSession:
+        """Verify a password and open a session. Blocks for one scrypt call."""
+        # The KDF runs outside any transaction so it never holds the write lock.
+        with self._session_scope(read_only=True) as session:
+            user = session.exec(select(User).where(User.username == username)).first()
+        if user is None or not user.is_active:
+            verify_secret(password, _dummy_hash())
+            raise AuthenticationError("Invalid username or password")
+        if not verify_secret(password, user.password_hash):
+            raise AuthenticationError("Invalid username or password")
+
+        if needs_rehash(user.password_hash):
+            password_hash = hash_secret(password)
+            with self._session_scope() as session:
+                stored = session.get(User, user.id)
+                stored.password_hash = password_hash
+                session.add(stored)
+
+        auth_session = self._open_session(user)
+        with self._lock:
+            # A password login clears a PIN lockout.
+            self._pin_failures.pop(user.id, None)
+        self.active = auth_session
+        logger.info(f"User {username} logged in")
+        return auth_session
+
+    def login_async(self, username: str, password: str) -> Future:
+        """``login`` on the auth worker pool; the future resolves to an AuthSession."""
+        return self._executor.submit(self.login, username, password)
+
+    def switch_user(self, username: str, pin: str) -> AuthSession:
+        """Make another cashier the active operator by PIN.
+
+        Fast when the PIN is cached for this shift; otherwise it is checked
+        once against the stored hash and cached.
+        """
+        with self._session_scope(read_only=True) as session:
+            user = session.exec(select(User).where(User.username == username)).first()
+            if user is None or not user.is_active or not user.pin_hash:
+                raise AuthenticationError("Invalid username or PIN")
+            pin_hash = user.pin_hash
+
+        with self._lock:
+            if self._pin_failures.get(user.id, 0) >= MAX_PIN_FAILURES:
+                raise AuthenticationError("Too many failed PIN attempts; log in with the password")
+            cached = self._pin_cache.get(user.id)
+
+        verifier = self._pin_verifier(pin)
+        if cached and cached[1] > time.monotonic():
+            valid = hmac.compare_digest(verifier, cached[0])
+        else:
+            valid = verify_secret(pin, pin_hash)
+
+        with self._lock:
+            if not valid:
+                self._pin_failures[user.id] = self._pin_failures.get(user.id, 0) + 1
+                raise AuthenticationError("Invalid username or PIN")
+            self._pin_failures.pop(user.id, None)
+            if not cached or cached[1] <= time.monotonic():
+                self._pin_cache[user.id] = (verifier, self._deadline(PIN_CACHE_TTL))
+
+        auth_session = self._open_session(user)
+        self.active = auth_session
+        logger.info(f"Switched operator to {username}")
+        return auth_session
+
+    def switch_user_async(self, username: str, pin: str) -> Future:
+        return self._executor.submit(self.switch_user, username, pin)
+
+    def validate(self, token: str) -> Optional[AuthSession]:
+        """The live session for ``token``, or None if unknown or expired.
+
+        An expired session is ended, and stops being the active one.
+        """
+        with self._lock:
+            auth_session = self._tokens.get(token)
+            if auth_session and auth_session.expired:
+                del self._tokens[token]
+                auth_session = None
+                if self.active and self.active.token == token:
+                    self.active = None
+        return auth_session
+
+    def logout(self, token: str):
+        with self._lock:
+            self._tokens.pop(token, None)
+            if self.active and self.active.token == token:
+                self.active = None
+
+    def logout_user(self, user_id: uuid.UUID):
+        """End every session of a user and forget their cached PIN."""
+        with self._lock:
+            for token in [t for t, s in self._tokens.items() if s.user_id == user_id]:
+                del self._tokens[token]
+            self._pin_cache.pop(user_id, None)
+            if self.active and self.active.user_id == user_id:
+                self.active = None
+
+    def end_shift(self):
+        """Drop all sessions and cached PIN verifiers."""
+        with self._lock:
+            self._tokens.clear()
+            self._pin_cache.clear()
+            self._pin_failures.clear()
+            self.active = None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # Internal helpers -----------------------------------------------------------
+
+    @contextmanager
+    def _session_scope(self, *, read_only: bool = False) -> Generator[Session, None, None]:
+        if self._session:
+            yield self._session
+            return
+
+        with session_scope(read_only=read_only) as session:
+            yield session
+
+    def _check_manage_users(self, user_id: Optional[uuid.UUID] = None):
+        """Raise PermissionDenied unless the active operator may manage
+        accounts, or is ``user_id`` changing their own credentials."""
+        active = self.active
+        if user_id is not None and active is not None and active.user_id == user_id and self.validate(active.token):
+            return
+        # Imported here: authorization imports this module.
+        from controllers.authorization import Permission, authz
+        authz.check(Permission.MANAGE_USERS)
+
+    @staticmethod
+    def _require_user(session: Session, user_id: uuid.UUID) -> User:
+        user = session.get(User, user_id)
+        if user is None:
+            raise AuthenticationError(f"User {user_id} not found")
+        return user
+
+    def _open_session(self, user: User) -> AuthSession:
+        auth_session = AuthSession(
+            token=secrets.token_urlsafe(32),
+            user_id=user.id,
+            username=user.username,
+            role=user.role,
+            expires_at=self._deadline(TOKEN_TTL),
+        )
+        with self._lock:
+            now = time.monotonic()
+            for token in [t for t, s in self._tokens.items() if s.expires_at <= now]:
+                del self._tokens[token]
+            self._tokens[auth_session.token] = auth_session
+        return auth_session
+
+    def _pin_verifier(self, pin: str) -> bytes:
+        return hmac.new(self._pin_key, pin.encode("utf-8"), hashlib.sha256).digest()
+
+    @staticmethod
+    def _deadline(ttl: timedelta) -> float:
+        return time.monotonic() + ttl.total_seconds()
+
+
+auth = AuthenticationController()
@@ -1,30 +1,176 @@
+from enum import IntFlag
+from functools import wraps
+from typing import Callable, Dict, Optional, TypeVar
+import os
+import threading
+import uuid
+
 from loguru import logger
-from models.user import Role
+from db.conn import after_commit, session_scope
+from models.user import Role, User
+from controllers.authentication import auth, AuthenticationError, AuthSession
+
+
+class Permission(IntFlag):
+    SELL = 1 << 0
+    VIEW_INVENTORY = 1 << 1
+    EDIT_PRODUCTS = 1 << 2
+    EDIT_PRICES = 1 << 3
+    DELETE_PRODUCTS = 1 << 4
+    VIEW_REVENUE = 1 << 5
+    EXPORT_REPORTS = 1 << 6
+    REFUND_SALES = 1 << 7
+    VOID_SALES = 1 << 8
+    MANAGE_USERS = 1 << 9
+    VIEW_AUDIT = 1 << 10
+
+
+# Opt-in for a terminal without accounts: with nobody logged in, everything
+# is allowed. Otherwise every guarded call needs a logged-in operator.
+SINGLE_OPERATOR = os.environ.get("HYPERSPIN_SINGLE_OPERATOR", "0") == "1"
+
+_CASHIER = Permission.SELL | Permission.VIEW_INVENTORY
+
+# Role -> granted permissions, resolved once to plain ints at import.
+ROLE_PERMISSIONS: Dict[Role, int] = {
+    Role.CASHIER: int(_CASHIER),
+    # Accounts created before the finer-grained roles keep cashier rights.
+    Role.USER: int(_CASHIER),
+    Role.INVENTORY_MANAGER: int(
+        _CASHIER
+        | Permission.EDIT_PRODUCTS
+        | Permission.EDIT_PRICES
+        | Permission.DELETE_PRODUCTS
+        | Permission.EXPORT_REPORTS
+    ),
+    Role.ADMIN: int(~Permission(0)),
+}
+
+
+class PermissionDenied(Exception):
+    def __init__(self, operator: AuthSession, permission: Permission):
+        super().__init__(f"{operator.username} ({operator.role.value}) lacks permission: {permission.name}")
+        self.operator = operator
+        self.permission = permission
+
+
+class NotAuthenticated(PermissionDenied):
+    """A guarded call was made with nobody logged in."""
+
+    def __init__(self, permission: Permission):
+        Exception.__init__(self, f"Log in to continue (requires {permission.name})")
+        self.operator = None
+        self.permission = permission
+
+
+F = TypeVar("F", bound=Callable)
+
+
+def requires(permission: Permission) -> Callable[[F], F]:
+    """Guard a controller function or method with ``permission``.
+
+    The check is an attribute read, a dict lookup and a bitwise AND, so it
+    is cheap enough for the checkout path.
+    """
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            authz.check(permission)
+            return func(*args, **kwargs)
+
+        wrapper.required_permission = permission
+        return wrapper
+
+    return decorator
 
 
 class AuthorizationController:
-    def __init__(self):
+    def __init__(self, *, single_operator: bool = False):
         self.roles = Role
+        self.single_operator = single_operator
+        self._lock = threading.Lock()
+        # Effective permission mask per user; dropped when their role changes.
+        self._effective: Dict[uuid.UUID, int] = {}
 
     def has_access(self, user_role: Role, required_role: Role) -> bool:
         """Check if a user has the required role for access."""
-        role_hierarchy = {
-            Role.ADMIN: 2,
-            Role.USER: 1,
-        }
-        return role_hierarchy[user_role] >= role_hierarchy[required_role]
-    
-    def assign_role(self, user, role: Role):
-        """Assign a role to a user."""
+        required = ROLE_PERMISSIONS[required_role]
+        return ROLE_PERMISSIONS[user_role] & required == required
+
+    def permissions_for(self, operator: AuthSession) -> int:
+        mask = self._effective.get(operator.user_id)
+        if mask is None:
+            mask = ROLE_PERMISSIONS[operator.role]
+            with self._lock:
+                self._effective[operator.user_id] = mask
+        return mask
+
+    def check(self, permission: Permission, operator: Optional[AuthSession] = None):
+        """Raise PermissionDenied unless the operator (default: the active one) holds ``permission``.
+
+        With nobody logged in, or an expired session, this raises
+        NotAuthenticated, unless the terminal was explicitly set up for
+        single-operator mode.
+        """
+        if operator is None:
+            active = auth.active
+            operator = auth.validate(active.token) if active is not None else None
+        if operator is None or operator.expired:
+            if self.single_operator:
+                return
+            raise NotAuthenticated(permission)
+        # Plain ints: IntFlag arithmetic is several times slower.
+        required = permission.value
+        if self.permissions_for(operator) & required != required:
+            raise PermissionDenied(operator, permission)
+
+    @requires(Permission.MANAGE_USERS)
+    def assign_role(self, user: User, role: Role) -> User:
+        """Assign a role to a user and make them sign in again."""
+        self._save_role(user.id, role)
         user.role = role
         return user
-    
-    def degrade_role_from_admin(self, user):
+
+    @requires(Permission.MANAGE_USERS)
+    def degrade_role_from_admin(self, user: User) -> User:
         """Demote an admin user to a regular user."""
-        if user.role == Role.ADMIN:
-            user.role = Role.USER
-        else:
+        if self._save_role(user.id, Role.USER, only_from=Role.ADMIN) is None:
             logger.warning(f"User {user} is not an admin and cannot be degraded. Already an {user.role}")
-            
+        else:
+            user.role = Role.USER
         return user
 
+    def invalidate(self, user_id: uuid.UUID):
+        with self._lock:
+            self._effective.pop(user_id, None)
+        # Open sessions carry the old role; make the user sign in again.
+        auth.logout_user(user_id)
+
+    def _save_role(self, user_id: uuid.UUID, role: Role, *, only_from: Optional[Role] = None) -> Optional[Role]:
+        """Store the role and return the previous one.
+
+        With ``only_from``, nothing changes unless that is the stored role,
+        and None is returned.
+        """
+        with session_scope() as session:
+            user = session.get(User, user_id)
+            if user is None:
+                raise AuthenticationError(f"User {user_id} not found")
+            previous = user.role
+            if only_from is not None and previous != only_from:
+                return None
+            user.role = role
+            session.add(user)
+            # Only a committed change is audited.
+            after_commit(session, lambda: self._audit_role_change(user_id, previous, role))
+        self.invalidate(user_id)
+        return previous
+
+    @staticmethod
+    def _audit_role_change(user_id: uuid.UUID, previous: Role, role: Role):
+        # Imported here: the audit log guards its own queries with ``requires``.
+        from controllers.audit import audit
+        audit.record("user.role", "user", user_id, before={"role": previous}, after={"role": role})
+
+
+authz = AuthorizationController(single_operator=SINGLE_OPERATOR)
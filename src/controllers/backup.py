@@ -0,0 +1,377 @@
+"""Online, compressed and checksummed database snapshots.
+
+    cd src
+    python -m controllers.backup create
+    python -m controllers.backup list
+    python -m controllers.backup verify storage/backups/hyperspin-20250101-020000.db.gz
+    python -m controllers.backup restore storage/backups/hyperspin-20250101-020000.db.gz
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from db.conn import engine, read_engine
+from controllers.maintenance import maintenance
+from utils.logger import get_logger
+
+logger = get_logger()
+
+BACKUP_DIR = os.path.join("storage", "backups")
+DEFAULT_KEEP = 14
+# Pages copied per backup step, and the pause between steps.
+STEP_PAGES = 256
+STEP_PAUSE = timedelta(milliseconds=20)
+# A write from another connection restarts the copy; past this many restarts
+# the rest goes in one step (a WAL read snapshot, so writers still proceed).
+MAX_RESTARTS = 3
+
+_PREFIX = "hyperspin-"
+_SUFFIX = ".db.gz"
+_CHUNK = 1024 * 1024
+
+
+class BackupError(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class BackupInfo:
+    path: str
+    created_at: datetime
+    size: int
+    sha256: str
+
+
+class _HashingWriter:
+    """File wrapper that hashes whatever is written through it."""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.hash = hashlib.sha256()
+
+    def write(self, data) -> int:
+        self.hash.update(data)
+        return self._fileobj.write(data)
+
+    def flush(self):
+        self._fileobj.flush()
+
+
+class BackupService:
+    """Snapshots ``hyperspin.db`` with SQLite's online backup API.
+
+    The copy runs in batches of ``step_pages`` with a pause after each one.
+    Every batch is a short read in WAL mode, so checkouts keep writing
+    throughout. The result is made a self-contained rollback-journal file,
+    checked with ``PRAGMA integrity_check`` and gzipped. It is stored next
+    to a ``sha256sum``-style sidecar, and the newest ``keep`` snapshots are
+    kept.
+
+    A restore checks the checksum and the integrity of the snapshot first,
+    then copies it back through the backup API. That takes the write lock
+    like any writer, so it is safe even with the app running; restart the
+    app afterwards so its in-memory caches are rebuilt.
+    """
+
+    def __init__(
+        self,
+        directory: str = BACKUP_DIR,
+        *,
+        keep: int = DEFAULT_KEEP,
+        step_pages: int = STEP_PAGES,
+        step_pause: timedelta = STEP_PAUSE,
+        interval: timedelta = timedelta(days=1),
+    ):
+        self.directory = directory
+        self.keep = keep
+        self.step_pages = step_pages
+        self.step_pause = step_pause
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Public API -----------------------------------------------------------------
+
+    def create_backup(self) -> BackupInfo:
+        """Snapshot the database now; returns the new, rotated-in backup."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            created_at = datetime.now()
+            path = self._unique_path(created_at)
+            partial = f"{path}.partial"
+            copy = f"{partial}.db"
+            started = time.perf_counter()
+            try:
+                restarts = self._copy(copy)
+                self._check_integrity(copy)
+                sha256 = self._compress(copy, partial)
+                os.replace(partial, path)
+                self._write_checksum(path, sha256)
+            finally:
+                for leftover in (copy, partial):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+
+            info = BackupInfo(path=path, created_at=created_at, size=os.path.getsize(path), sha256=sha256)
+            logger.info(
+                f"Backed up database to {path} ({info.size} bytes) in "
+                f"{time.perf_counter() - started:.1f}s, {restarts} restarts"
+            )
+            self.rotate()
+            return info
+
+    def list_backups(self) -> List[BackupInfo]:
+        """Snapshots in the backup directory, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        backups = []
+        for name in os.listdir(self.directory):
+            if not (name.startswith(_PREFIX) and name.endswith(_SUFFIX)):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                created_at = datetime.strptime(name[len(_PREFIX):-len(_SUFFIX)][:15], "%Y%m%d-%H%M%S")
+            except ValueError:
+                continue
+            backups.append(BackupInfo(
+                path=path,
+                created_at=created_at,
+                size=os.path.getsize(path),
+                sha256=self._read_checksum(path) or "",
+            ))
+        backups.sort(key=lambda info: (info.created_at, info.path), reverse=True)
+        return backups
+
+    def rotate(self) -> List[str]:
+        """Delete all but the newest ``keep`` snapshots. Returns the removed paths."""
+        removed = []
+        for info in self.list_backups()[self.keep:]:
+            for path in (info.path, self._checksum_path(info.path)):
+                if os.path.exists(path):
+                    os.remove(path)
+            removed.append(info.path)
+        if removed:
+            logger.info(f"Rotated out {len(removed)} old backups")
+        return removed
+
+    def verify(self, path: str) -> BackupInfo:
+        """Check a snapshot's checksum and integrity. Raises BackupError if either fails."""
+        self._verified_copy(path, keep_copy=False)
+        return BackupInfo(
+            path=path,
+            created_at=datetime.fromtimestamp(os.path.getmtime(path)),
+            size=os.path.getsize(path),
+            sha256=self._read_checksum(path) or "",
+        )
+
+    def restore(self, path: str, *, safety_backup: bool = True):
+        """Replace the database contents with a verified snapshot.
+
+        With ``safety_backup`` the current database is snapshotted first, so
+        a wrong restore can itself be undone.
+        """
+        copy = self._verified_copy(path, keep_copy=True)
+        try:
+            if safety_backup:
+                self.create_backup()
+            source = sqlite3.connect(copy)
+            target = sqlite3.connect(engine.url.database, timeout=30)
+            try:
+                # One step: the target is never left half-restored.
+                source.backup(target)
+            finally:
+                source.close()
+                target.close()
+        finally:
+            os.remove(copy)
+        # Pooled connections may have cached the old schema.
+        engine.dispose()
+        read_engine.dispose()
+        logger.info(f"Restored database from {path}")
+
+    def start(self) -> threading.Thread:
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-backup", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    # Internal helpers -----------------------------------------------------------
+
+    def _unique_path(self, created_at: datetime) -> str:
+        stamp = created_at.strftime("%Y%m%d-%H%M%S")
+        path, suffix = os.path.join(self.directory, f"{_PREFIX}{stamp}{_SUFFIX}"), 2
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f"{_PREFIX}{stamp}-{suffix}{_SUFFIX}")
+            suffix += 1
+        return path
+
+    def _copy(self, copy_path: str) -> int:
+        """Online-copy the live database to ``copy_path``. Returns the restart count."""
+        source = sqlite3.connect(engine.url.database, timeout=30)
+        target = sqlite3.connect(copy_path)
+        restarts = 0
+        remaining_before = None
+
+        def progress(status, remaining, total):
+            nonlocal restarts, remaining_before
+            if remaining_before is not None and remaining > remaining_before:
+                restarts += 1
+            remaining_before = remaining
+            if restarts > MAX_RESTARTS:
+                raise _TooManyRestarts()
+            self._stop.wait(self.step_pause.total_seconds())
+
+        try:
+            source.execute("PRAGMA query_only=ON")
+            try:
+                source.backup(target, pages=self.step_pages, progress=progress)
+            except _TooManyRestarts:
+                source.backup(target)
+            # A single file that opens without the WAL alongside it.
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            source.close()
+            target.close()
+        return restarts
+
+    @staticmethod
+    def _check_integrity(db_path: str):
+        connection = sqlite3.connect(db_path)
+        try:
+            result = connection.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            connection.close()
+        if result != "ok":
+            raise BackupError(f"Integrity check failed for {db_path}: {result}")
+
+    @staticmethod
+    def _compress(db_path: str, gz_path: str) -> str:
+        with open(gz_path, "wb") as raw:
+            writer = _HashingWriter(raw)
+            with open(db_path, "rb") as source, gzip.GzipFile(
+                filename=os.path.basename(db_path), mode="wb", fileobj=writer, mtime=0
+            ) as compressed:
+                shutil.copyfileobj(source, compressed, _CHUNK)
+            raw.flush()
+            os.fsync(raw.fileno())
+        return writer.hash.hexdigest()
+
+    def _verified_copy(self, path: str, *, keep_copy: bool) -> str:
+        if not os.path.exists(path):
+            raise BackupError(f"Backup {path} not found")
+        expected = self._read_checksum(path)
+        if expected is None:
+            raise BackupError(f"Backup {path} has no checksum file")
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK), b""):
+                digest.update(chunk)
+        if digest.hexdigest() != expected:
+            raise BackupError(f"Checksum mismatch for {path}")
+
+        copy = f"{path}.verify.db"
+        try:
+            with gzip.open(path, "rb") as compressed, open(copy, "wb") as target:
+                shutil.copyfileobj(compressed, target, _CHUNK)
+            self._check_integrity(copy)
+        except (OSError, EOFError, sqlite3.DatabaseError) as e:
+            os.remove(copy)
+            raise BackupError(f"Backup {path} is unreadable: {e}") from e
+        except BackupError:
+            os.remove(copy)
+            raise
+        if not keep_copy:
+            os.remove(copy)
+        return copy
+
+    @staticmethod
+    def _checksum_path(path: str) -> str:
+        return f"{path}.sha256"
+
+    def _write_checksum(self, path: str, sha256: str):
+        with open(self._checksum_path(path), "w", encoding="utf-8") as f:
+            f.write(f"{sha256}  {os.path.basename(path)}\n")
+
+    def _read_checksum(self, path: str) -> Optional[str]:
+        try:
+            with open(self._checksum_path(path), encoding="utf-8") as f:
+                return f.read().split()[0]
+        except (OSError, IndexError):
+            return None
+
+    def _due(self) -> bool:
+        backups = self.list_backups()
+        return not backups or datetime.now() - backups[0].created_at >= self.interval
+
+    def _run(self):
+        while not self._stop.wait(60):
+            # Scheduled snapshots wait for a lull in checkouts as well.
+            if not (self._due() and maintenance.is_idle()):
+                continue
+            try:
+                self.create_backup()
+            except Exception as e:
+                logger.exception(f"Database backup failed: {e}")
+
+
+backups = BackupService()
+
+
+def _main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m controllers.backup", description="HyperSpin database backups")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="backup directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create", help="snapshot the database now")
+    commands.add_parser("list", help="list snapshots, newest first")
+    verify = commands.add_parser("verify", help="check a snapshot's checksum and integrity")
+    verify.add_argument("path")
+    restore = commands.add_parser("restore", help="verify a snapshot and restore it")
+    restore.add_argument("path")
+    restore.add_argument("--no-safety-backup", action="store_true", help="skip snapshotting the current database first")
+    args = parser.parse_args(argv)
+
+    service = BackupService(args.dir)
+    try:
+        if args.command == "create":
+            info = service.create_backup()
+            print(f"{info.path}  {info.size} bytes  sha256 {info.sha256}")
+        elif args.command == "list":
+            for info in service.list_backups():
+                print(f"{info.created_at:%Y-%m-%d %H:%M:%S}  {info.size:>12}  {info.path}")
+        elif args.command == "verify":
+            service.verify(args.path)
+            print(f"{args.path}: OK")
+        elif args.command == "restore":
+            service.restore(args.path, safety_backup=not args.no_safety_backup)
+            print(f"Restored {args.path}")
+    except BackupError as e:
+        print(f"error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
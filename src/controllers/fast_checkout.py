@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.exc import OperationalError
+
+from db.conn import session_scope
+from db.journal import CheckoutJournal, JOURNAL_PATH
+from models.payment import PaymentMethod
+from models.sale import Sale, SaleStatus
+from utils.clock import store_now, utc_now
+from utils.logger import get_logger
+
+logger = get_logger()
+
+_active_writer: Optional["CheckoutJournalWriter"] = None
+
+# Backoff between attempts at a group commit that hit a busy or locked database.
+RETRY_DELAY = 0.1
+MAX_RETRY_DELAY = 30.0
+
+
+def active_writer() -> Optional["CheckoutJournalWriter"]:
+    """The running journal writer, or None when fast checkout is off."""
+    return _active_writer
+
+
+def start_fast_checkout(
+    *,
+    path: str = JOURNAL_PATH,
+    max_batch: int = 200,
+    commit_interval: float = 0.05,
+) -> "CheckoutJournalWriter":
+    """Recover any un-applied journal entries and start the background writer."""
+    global _active_writer
+    if _active_writer is None:
+        writer = CheckoutJournalWriter(
+            CheckoutJournal(path),
+            max_batch=max_batch,
+            commit_interval=commit_interval,
+        )
+        writer.recover()
+        writer.start()
+        _active_writer = writer
+    return _active_writer
+
+
+def stop_fast_checkout(timeout: Optional[float] = 5.0):
+    global _active_writer
+    if _active_writer is not None:
+        _active_writer.stop(timeout)
+        _active_writer = None
+
+
+class CheckoutJournalWriter:
+    """Journals checkouts on the click path and group-commits them to SQLite.
+
+    ``submit`` only pays for one fsync of the journal; a background thread
+    drains submitted sales into the database in batches, one commit per
+    batch. Until a sale is committed its units are tracked as pending so
+    later checkouts cannot oversell the same stock.
+
+    A batch that hits a busy or locked database is retried, with backoff,
+    before anything queued behind it. A batch that fails for any other
+    reason is applied one checkout at a time, and a checkout that still
+    fails is moved to the dead-letter file next to the journal
+    (``<journal>.dead``) so it cannot hold up the ones behind it.
+    """
+
+    def __init__(self, journal: CheckoutJournal, *, max_batch: int = 200, commit_interval: float = 0.05):
+        self.journal = journal
+        self.dead_letter_path = f"{journal.path}.dead"
+        self._dead_letters: Optional[CheckoutJournal] = None
+        self.max_batch = max_batch
+        self.commit_interval = commit_interval
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending: Dict[uuid.UUID, int] = defaultdict(int)
+        self._journaled = 0
+        self._applied = 0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Click path -----------------------------------------------------------------
+
+    def submit(
+        self,
+        price: Callable[[Callable[[uuid.UUID], int]], List[Dict[str, Any]]],
+        payment_method: PaymentMethod,
+    ) -> Sale:
+        """Price, journal and queue a sale.
+
+        ``price`` checks stock and returns the priced lines; it is given the
+        pending quantity per product. It runs under the writer lock, together
+        with the pending increment, so two checkouts cannot both pass the
+        check for the last unit.
+        """
+        with self._lock:
+            lines = price(lambda product_id: self._pending.get(product_id, 0))
+            sold_at = store_now()
+            sale = Sale(
+                total_amount=sum(line['unit_price'] * line['quantity'] for line in lines),
+                status=SaleStatus.COMPLETED.value,
+                created_at=sold_at,
+            )
+            record = self._record(sale, sold_at, lines, payment_method)
+            self.journal.append(record)
+            self._journaled += 1
+            for line in lines:
+                self._pending[line['product_id']] += line['quantity']
+
+        self._queue.put(record)
+        return sale
+
+    def pending_quantity(self, product_id: uuid.UUID) -> int:
+        with self._lock:
+            return self._pending.get(product_id, 0)
+
+    @staticmethod
+    def _record(
+        sale: Sale,
+        sold_at: datetime,
+        lines: List[Dict[str, Any]],
+        payment_method: PaymentMethod,
+    ) -> Dict[str, Any]:
+        return {
+            "sale_id": str(sale.id),
+            "sold_at": sold_at.isoformat(),
+            "payment_method": payment_method.value,
+            "lines": [
+                {
+                    "product_id": str(line['product_id']),
+                    "quantity": line['quantity'],
+                    "unit_price": line['unit_price'],
+                    "cost_price": line['cost_price'],
+                }
+                for line in lines
+            ],
+        }
+
+    # Background writer ----------------------------------------------------------
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="checkout-journal-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Flush everything still queued and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # Still inside a commit: the journal stays open for it, and
+            # whatever it did not finish is replayed by the next recover().
+            logger.warning("Checkout journal writer did not stop in time; leaving the journal to recovery")
+        else:
+            self.journal.close()
+            if self._dead_letters is not None:
+                self._dead_letters.close()
+        self._thread = None
+
+    def recover(self) -> int:
+        """Replay journal entries missing from the database. Returns how many are now in it.
+
+        Entries are keyed by sale id, so replaying an entry that was already
+        committed is a no-op. Entries that cannot be applied are dead-lettered.
+        """
+        records = list(self.journal.entries())
+        if not records:
+            return 0
+        dead = self._commit(records)
+        if dead is None:
+            return 0
+        self.journal.truncate()
+        logger.info(
+            f"Checkout journal recovery: {len(records) - len(dead)} of {len(records)} entries "
+            f"in the database, {len(dead)} dead-lettered"
+        )
+        return len(records) - len(dead)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            record = self._queue.get()
+            if record is None:
+                break
+            batch = [record]
+
+            # Give concurrent checkouts a moment to join this commit.
+            deadline = time.monotonic() + self.commit_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    record = self._queue.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            dead = self._commit(batch)
+            if dead is None:
+                # Stopped while retrying: the entries stay in the journal
+                # and are replayed on the next start.
+                return
+            self._mark_applied(batch)
+            self._publish([record for record in batch if record not in dead])
+
+    def _commit(self, batch: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """Apply a batch. Returns the dead-lettered records, or None if the writer stopped first."""
+        try:
+            if not self._retrying(batch):
+                return None
+            return []
+        except Exception as e:
+            if len(batch) == 1:
+                self._dead_letter(batch[0], e)
+                return batch
+            logger.error(f"Group commit of {len(batch)} checkouts failed, applying them one at a time: {e}")
+
+        dead = []
+        for record in batch:
+            try:
+                if not self._retrying([record]):
+                    return None
+            except Exception as e:
+                self._dead_letter(record, e)
+                dead.append(record)
+        return dead
+
+    def _retrying(self, batch: List[Dict[str, Any]]) -> bool:
+        """Apply a batch, retrying a busy or locked database with backoff.
+
+        Returns False if the writer stopped first; any other error is raised.
+        """
+        delay = RETRY_DELAY
+        while True:
+            try:
+                self._apply_batch(batch)
+                return True
+            except OperationalError as e:
+                logger.warning(f"Group commit of {len(batch)} checkouts failed, retrying in {delay:.1f}s: {e}")
+            if self._stopping.wait(delay):
+                return False
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    def _dead_letter(self, record: Dict[str, Any], error: Exception):
+        logger.error(f"Checkout {record['sale_id']} cannot be applied, moved to {self.dead_letter_path}: {error}")
+        if self._dead_letters is None:
+            self._dead_letters = CheckoutJournal(self.dead_letter_path)
+        self._dead_letters.append({"record": record, "error": str(error), "failed_at": utc_now().isoformat()})
+
+    def _apply_batch(self, records: List[Dict[str, Any]]) -> int:
+        from controllers.payment import PaymentController
+
+        applied = 0
+        with session_scope() as session:
+            controller = PaymentController(session)
+            for record in records:
+                sale_id = uuid.UUID(record["sale_id"])
+                if session.get(Sale, sale_id) is not None:
+                    continue
+                lines = [
+                    {
+                        'product_id': uuid.UUID(line["product_id"]),
+                        'quantity': line["quantity"],
+                        'unit_price': line["unit_price"],
+                        'cost_price': line["cost_price"],
+                    }
+                    for line in record["lines"]
+                ]
+                controller.apply_sale(
+                    session,
+                    lines,
+                    PaymentMethod(record["payment_method"]),
+                    sold_at=datetime.fromisoformat(record["sold_at"]),
+                    sale_id=sale_id,
+                )
+                # Make the sale visible to the duplicate check for the rest of the batch.
+                session.flush()
+                applied += 1
+        return applied
+
+    @staticmethod
+    def _publish(records: List[Dict[str, Any]]):
+        from controllers.payment import PaymentController
+
+        for record in records:
+            PaymentController.publish_sale(
+                uuid.UUID(record["sale_id"]),
+                [uuid.UUID(line["product_id"]) for line in record["lines"]],
+            )
+
+    def _mark_applied(self, records: List[Dict[str, Any]]):
+        with self._lock:
+            for record in records:
+                for line in record["lines"]:
+                    product_id = uuid.UUID(line["product_id"])
+                    self._pending[product_id] -= line["quantity"]
+                    if self._pending[product_id] <= 0:
+                        del self._pending[product_id]
+            self._applied += len(records)
+            # Nothing in the journal is outstanding any more, so it can be reset.
+            if self._applied == self._journaled:
+                self.journal.truncate()
@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Integer, case, cast, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from db.conn import session_scope
+from models.heatmap import SalesHeatmapDay
+from models.sale import Sale, COUNTED_STATUSES, TRANSACTION_STATUSES
+from utils.logger import get_logger
+
+logger = get_logger()
+
+_ANY_DAY = select(SalesHeatmapDay.day).limit(1)
+_ENSURE_DAY = sqlite_insert(SalesHeatmapDay.__table__).on_conflict_do_nothing(index_elements=["day"])
+
+
+def record_sale(session: Session, sold_at: datetime, amount: float, transactions: int = 1):
+    """Add a sale to its day/hour cell inside the caller's transaction.
+
+    Refunds and voids pass a negative amount and/or transaction count.
+    """
+    day = sold_at.date()
+    # The cells are packed blobs that SQL cannot add to, so the upsert only
+    # makes sure the row exists; the update below then always finds it.
+    session.execute(_ENSURE_DAY, SalesHeatmapDay(day=day).model_dump())
+    row = session.get(SalesHeatmapDay, day)
+    row.add(sold_at.hour, amount, transactions)
+    session.add(row)
+
+
+def is_empty(session: Optional[Session] = None) -> bool:
+    if session is None:
+        with session_scope(read_only=True) as session:
+            return is_empty(session)
+    return session.exec(_ANY_DAY).first() is None
+
+
+def rebuild(*, only_if_empty: bool = False) -> int:
+    """Rebuild every day row from the sales table. Returns the number of days written.
+
+    Only needed once for databases that predate the heatmap; afterwards
+    create_sale keeps the rows current. The read and the rewrite form one
+    write transaction, so sales recorded meanwhile land either before it
+    (and are read back from the sales table) or after it. With
+    ``only_if_empty`` nothing happens if some day already has a row.
+    """
+    with session_scope() as session:
+        # Take the write lock before reading the sales.
+        session.connection()
+        if only_if_empty and not is_empty(session):
+            return 0
+        statement = (
+            select(
+                func.date(Sale.created_at).label("day"),
+                cast(func.strftime("%H", Sale.created_at), Integer).label("hour"),
+                func.coalesce(func.sum(Sale.total_amount), 0.0).label("revenue"),
+                func.sum(
+                    case((Sale.status.in_(TRANSACTION_STATUSES), 1), else_=0)
+                ).label("transactions"),
+            )
+            .where(Sale.status.in_(COUNTED_STATUSES))
+            .group_by("day", "hour")
+        )
+
+        days = {}
+        for row in session.exec(statement):
+            day = datetime.strptime(row.day, "%Y-%m-%d").date()
+            entry = days.setdefault(day, SalesHeatmapDay(day=day))
+            entry.add(int(row.hour), float(row.revenue), int(row.transactions))
+
+        session.execute(delete(SalesHeatmapDay))
+        session.add_all(days.values())
+
+    logger.info(f"Rebuilt sales heatmap for {len(days)} days")
+    return len(days)
@@ -1,63 +1,73 @@
-from typing import List, Optional
+from typing import Iterable, List, Optional
 from models.item import Product
-from db.conn import get_session
+from db.conn import session_scope, after_commit
+from sqlalchemy import bindparam
 from sqlmodel import select
+from controllers import sync
+from controllers.audit import audit
+from controllers.authorization import authz, requires, Permission
+from utils.events import bus, ProductChanged, StockChanged
 import uuid
 
+_ALL_PRODUCTS = select(Product)
+_PRODUCTS_BY_ID = select(Product).where(Product.id.in_(bindparam("product_ids", expanding=True)))
+
+@requires(Permission.EDIT_PRODUCTS)
 def add_product(product: Product) -> Product:
-    session_gen = get_session()
-    session = next(session_gen)
-    try:
+    with session_scope() as session:
         session.add(product)
-        session.commit()
-        session.refresh(product)
+        sync.record_product_upsert(session, product)
+        session.flush()
+        after_commit(session, lambda: bus.publish(ProductChanged((product.id,))))
         return product
-    finally:
-        session.close()
 
+@requires(Permission.DELETE_PRODUCTS)
 def remove_product(product_id: uuid.UUID) -> bool:
-    session_gen = get_session()
-    session = next(session_gen)
-    try:
+    with session_scope() as session:
         product = session.get(Product, product_id)
         if product:
+            before = product.model_dump(mode="json")
             session.delete(product)
-            session.commit()
+            sync.record_product_delete(session, product_id)
+            after_commit(session, lambda: bus.publish(ProductChanged((product_id,))))
+            after_commit(session, lambda: audit.record("product.delete", "product", product_id, before=before))
             return True
         return False
-    finally:
-        session.close()
 
 def get_product(product_id: uuid.UUID) -> Optional[Product]:
-    session_gen = get_session()
-    session = next(session_gen)
-    try:
+    with session_scope(read_only=True) as session:
         return session.get(Product, product_id)
-    finally:
-        session.close()
 
 def list_products() -> List[Product]:
-    session_gen = get_session()
-    session = next(session_gen)
-    try:
-        statement = select(Product)
-        results = session.exec(statement)
-        return results.all()
-    finally:
-        session.close()
+    with session_scope(read_only=True) as session:
+        return session.exec(_ALL_PRODUCTS).all()
+
+def get_products(product_ids: Iterable[uuid.UUID]) -> List[Product]:
+    """The given products that still exist, for refreshing just what an event touched."""
+    with session_scope(read_only=True) as session:
+        return session.exec(_PRODUCTS_BY_ID, params={"product_ids": list(product_ids)}).all()
 
+@requires(Permission.EDIT_PRODUCTS)
 def update_product(product_id: uuid.UUID, **kwargs) -> Optional[Product]:
-    session_gen = get_session()
-    session = next(session_gen)
-    try:
+    if "price" in kwargs or "cost_price" in kwargs:
+        authz.check(Permission.EDIT_PRICES)
+    if "reorder_point" in kwargs:
+        # A hand-set reorder point is kept over the velocity-computed one.
+        kwargs.setdefault("reorder_point_manual", True)
+    with session_scope() as session:
         product = session.get(Product, product_id)
         if product:
+            before = {key: getattr(product, key) for key in kwargs}
             for key, value in kwargs.items():
                 setattr(product, key, value)
             session.add(product)
-            session.commit()
-            session.refresh(product)
+            sync.record_product_upsert(session, product)
+            session.flush()
+            after_commit(session, lambda: bus.publish(ProductChanged((product_id,))))
+            after_commit(session, lambda: audit.record(
+                "product.update", "product", product_id, before=before, after=dict(kwargs)
+            ))
+            if "quantity" in kwargs or "in_stock" in kwargs:
+                after_commit(session, lambda: bus.publish(StockChanged((product_id,))))
             return product
         return None
-    finally:
-        session.close()
@@ -0,0 +1,79 @@
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Integer, cast, func
+from sqlmodel import Session, select
+
+from db.conn import session_scope
+from models.inventory_stats import InventoryStats
+from models.item import Product
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# Floating-point drift tolerated in the running inventory value.
+VALUE_TOLERANCE = 0.005
+
+_CATALOG_TOTALS = select(
+    func.count(Product.id),
+    func.coalesce(func.sum(Product.price * Product.quantity), 0.0),
+    func.coalesce(func.sum(cast(Product.quantity < Product.reorder_point, Integer)), 0),
+)
+
+
+def get_stats(session: Optional[Session] = None) -> Optional[InventoryStats]:
+    if session is None:
+        with session_scope(read_only=True) as session:
+            return get_stats(session)
+    return session.get(InventoryStats, 1)
+
+
+def check(*, repair: bool = True) -> Dict[str, Any]:
+    """Compare the running aggregates with a full scan of the catalog.
+
+    Mismatches (or a missing row) are logged and, with ``repair``, fixed in
+    the same transaction. Returns both sets of numbers and whether they agreed.
+    """
+    with session_scope() as session:
+        expected = _catalog_totals(session)
+        stats = session.get(InventoryStats, 1)
+        stored = None
+        consistent = False
+        if stats is not None:
+            stored = {key: getattr(stats, key) for key in expected}
+            consistent = (
+                stats.product_count == expected["product_count"]
+                and stats.low_stock_count == expected["low_stock_count"]
+                and abs(stats.inventory_value - expected["inventory_value"]) <= VALUE_TOLERANCE
+            )
+
+        if not consistent:
+            logger.warning(f"Inventory stats out of sync: stored {stored}, actual {expected}")
+            if repair:
+                _store(session, stats, expected)
+
+    return {"consistent": consistent, "stored": stored, "actual": expected}
+
+
+def rebuild() -> Dict[str, Any]:
+    """Recompute the aggregates from the catalog unconditionally."""
+    with session_scope() as session:
+        totals = _catalog_totals(session)
+        _store(session, session.get(InventoryStats, 1), totals)
+    logger.info(f"Rebuilt inventory stats: {totals}")
+    return totals
+
+
+def _catalog_totals(session: Session) -> Dict[str, Any]:
+    product_count, inventory_value, low_stock_count = session.exec(_CATALOG_TOTALS).one()
+    return {
+        "product_count": int(product_count),
+        "inventory_value": float(inventory_value),
+        "low_stock_count": int(low_stock_count),
+    }
+
+
+def _store(session: Session, stats: Optional[InventoryStats], totals: Dict[str, Any]):
+    stats = stats or InventoryStats(id=1)
+    for key, value in totals.items():
+        setattr(stats, key, value)
+    session.add(stats)
@@ -0,0 +1,360 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Generator, List, Optional, Tuple
+
+from sqlalchemy import delete, func
+from sqlmodel import select
+
+from db.conn import engine, session_scope
+from models.maintenance import MaintenanceRun
+from utils.clock import utc_now
+from utils.events import bus, AvailabilityChanged, SaleAdjusted, SaleCompleted
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# Longest a maintenance statement may hold the write lock, i.e. keep a checkout waiting.
+DEFAULT_BUDGET = timedelta(milliseconds=200)
+# No checkout activity for this long counts as idle.
+DEFAULT_IDLE_AFTER = timedelta(minutes=2)
+# Rows ANALYZE samples per index; keeps its cost flat however big the tables get.
+ANALYSIS_LIMIT = 1000
+HISTORY_RETENTION = timedelta(days=90)
+
+# The progress handler runs every this many VM instructions.
+_PROGRESS_STEPS = 1000
+_VACUUM_MIN_PAGES = 16
+_VACUUM_MAX_PAGES = 4096
+
+_LAST_RUNS = select(MaintenanceRun.task, func.max(MaintenanceRun.started_at)).group_by(MaintenanceRun.task)
+
+# Task results: (status, reclaimed bytes, detail).
+_Result = Tuple[str, int, Optional[str]]
+
+
+class _Deferred(Exception):
+    """Checkout activity resumed before the task finished."""
+
+
+@dataclass(slots=True)
+class _Task:
+    name: str
+    interval: timedelta
+    run: Callable[[sqlite3.Connection], _Result]
+
+
+class MaintenanceScheduler:
+    """Keeps query plans fresh and the database file compact.
+
+    Runs WAL checkpoints, ``PRAGMA optimize``, ``ANALYZE`` and
+    ``incremental_vacuum`` once checkout activity (sales, refunds and cart
+    holds on the event bus) has been quiet for ``idle_after``, and stops as
+    soon as it picks up again.
+
+    Every statement that takes the write lock runs under a progress handler
+    that aborts it once it has run for ``budget``, so a checkout arriving
+    mid-task never waits longer than that. Work is split to fit: ANALYZE goes
+    one table at a time with a sampling limit, and the vacuum frees pages in
+    batches sized from the previous batch's speed. Each run is recorded in
+    ``maintenancerun`` with its duration and the space it reclaimed.
+    """
+
+    def __init__(
+        self,
+        *,
+        budget: timedelta = DEFAULT_BUDGET,
+        idle_after: timedelta = DEFAULT_IDLE_AFTER,
+        poll_interval: timedelta = timedelta(seconds=30),
+    ):
+        self.budget = budget
+        self.idle_after = idle_after
+        self.poll_interval = poll_interval
+        self._tasks = (
+            _Task("wal_checkpoint", timedelta(minutes=5), self._checkpoint),
+            _Task("optimize", timedelta(hours=1), self._optimize),
+            _Task("incremental_vacuum", timedelta(hours=1), self._incremental_vacuum),
+            _Task("analyze", timedelta(days=1), self._analyze),
+        )
+        self._last_activity = time.monotonic()
+        self._last_run: Dict[str, datetime] = {}
+        self._vacuum_batch = _VACUUM_MIN_PAGES
+        self._forced = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._unsubscribe: List[Callable[[], None]] = []
+
+    # Public API -----------------------------------------------------------------
+
+    @property
+    def task_names(self) -> List[str]:
+        return [task.name for task in self._tasks]
+
+    def touch(self, event=None):
+        """Note checkout activity; maintenance waits for the next idle period."""
+        self._last_activity = time.monotonic()
+
+    def is_idle(self) -> bool:
+        return time.monotonic() - self._last_activity >= self.idle_after.total_seconds()
+
+    def run_due(self, *, force: bool = False) -> List[MaintenanceRun]:
+        """Run every task whose interval has passed, while the terminal stays idle.
+
+        ``force`` ignores both the intervals and idleness; the budget still holds.
+        """
+        runs = []
+        for task in self._tasks:
+            if not force and not self.is_idle():
+                break
+            if force or self._is_due(task):
+                runs.append(self._execute(task, force=force))
+        if runs:
+            self._prune()
+        return runs
+
+    def run_task(self, name: str) -> MaintenanceRun:
+        """Run one task now, idle or not."""
+        for task in self._tasks:
+            if task.name == name:
+                return self._execute(task, force=True)
+        raise ValueError(f"Unknown maintenance task {name!r}")
+
+    def history(self, task: Optional[str] = None, limit: int = 50) -> List[MaintenanceRun]:
+        with session_scope(read_only=True) as session:
+            statement = select(MaintenanceRun).order_by(MaintenanceRun.started_at.desc()).limit(limit)
+            if task:
+                statement = statement.where(MaintenanceRun.task == task)
+            return list(session.exec(statement))
+
+    def start(self) -> threading.Thread:
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        if not self._unsubscribe:
+            self._unsubscribe = [
+                bus.subscribe(event_type, self.touch)
+                for event_type in (SaleCompleted, SaleAdjusted, AvailabilityChanged)
+            ]
+        with session_scope(read_only=True) as session:
+            self._last_run = {task: started_at for task, started_at in session.exec(_LAST_RUNS)}
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        for unsubscribe in self._unsubscribe:
+            unsubscribe()
+        self._unsubscribe = []
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    # Internal helpers -----------------------------------------------------------
+
+    def _is_due(self, task: _Task) -> bool:
+        last = self._last_run.get(task.name)
+        return last is None or utc_now() - last >= task.interval
+
+    def _execute(self, task: _Task, *, force: bool) -> MaintenanceRun:
+        started_at = utc_now()
+        started = time.perf_counter()
+        try:
+            with self._connection() as dbapi_connection:
+                status, reclaimed, detail = self._call(task, dbapi_connection, force)
+        except Exception as e:
+            logger.exception(f"Maintenance task {task.name} failed: {e}")
+            status, reclaimed, detail = "failed", 0, str(e)
+        run = MaintenanceRun(
+            task=task.name,
+            started_at=started_at,
+            duration_ms=(time.perf_counter() - started) * 1000,
+            status=status,
+            reclaimed_bytes=reclaimed,
+            detail=detail,
+        )
+        with session_scope() as session:
+            session.add(run)
+        # Deferred work is picked up again in the next idle period.
+        if status != "deferred":
+            self._last_run[task.name] = started_at
+        logger.info(f"Maintenance {task.name}: {status} in {run.duration_ms:.1f} ms, reclaimed {reclaimed} bytes")
+        return run
+
+    def _call(self, task: _Task, dbapi_connection: sqlite3.Connection, force: bool) -> _Result:
+        self._forced = force
+        try:
+            return task.run(dbapi_connection)
+        except _Deferred as e:
+            return "deferred", 0, str(e) or None
+
+    def _check_idle(self, progress: str):
+        if not self._forced and (self._stop.is_set() or not self.is_idle()):
+            raise _Deferred(progress)
+
+    @contextmanager
+    def _connection(self) -> Generator[sqlite3.Connection, None, None]:
+        with engine.connect() as conn:
+            dbapi_connection = conn.connection.dbapi_connection
+            # Waiting out a checkout for the lock is fine, but only up to the budget.
+            dbapi_connection.execute(f"PRAGMA busy_timeout={self._budget_ms()}")
+            try:
+                yield dbapi_connection
+            finally:
+                dbapi_connection.execute("PRAGMA busy_timeout=5000")
+
+    @contextmanager
+    def _write_lock(self, dbapi_connection: sqlite3.Connection) -> Generator[None, None, None]:
+        """One IMMEDIATE transaction that is rolled back if it outruns the budget.
+
+        The progress handler interrupts the running statement past the
+        deadline, which surfaces as sqlite3.OperationalError("interrupted").
+        """
+        deadline = time.perf_counter() + self.budget.total_seconds()
+        dbapi_connection.set_progress_handler(lambda: time.perf_counter() > deadline, _PROGRESS_STEPS)
+        try:
+            try:
+                dbapi_connection.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                # Somebody held the lock for the whole budget: not idle after all.
+                if "locked" in str(e) or "busy" in str(e):
+                    raise _Deferred("write lock busy") from e
+                raise
+            try:
+                yield
+                dbapi_connection.execute("COMMIT")
+            except BaseException:
+                dbapi_connection.execute("ROLLBACK")
+                raise
+        finally:
+            dbapi_connection.set_progress_handler(None, 0)
+
+    def _budget_ms(self) -> int:
+        return max(int(self.budget.total_seconds() * 1000), 1)
+
+    def _pause(self):
+        # Lets a checkout queued on the lock in between two batches.
+        self._stop.wait(self.budget.total_seconds())
+
+    @staticmethod
+    def _pragma(dbapi_connection: sqlite3.Connection, name: str) -> int:
+        return dbapi_connection.execute(f"PRAGMA {name}").fetchone()[0]
+
+    @staticmethod
+    def _wal_size() -> int:
+        try:
+            return os.path.getsize(f"{engine.url.database}-wal")
+        except OSError:
+            return 0
+
+    # Tasks ----------------------------------------------------------------------
+
+    def _checkpoint(self, dbapi_connection: sqlite3.Connection) -> _Result:
+        # PASSIVE copies what it can without taking the write lock, so it
+        # never blocks a checkout and needs no budget. It leaves the -wal
+        # file at its high-water mark, though; once every frame is copied
+        # and the terminal is still idle, TRUNCATE empties it. That one
+        # waits on the lock for at most the budget (the busy timeout).
+        before = self._wal_size()
+        busy, frames, checkpointed = dbapi_connection.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        mode = "PASSIVE"
+        if not busy and checkpointed == frames and (self._forced or self.is_idle()):
+            truncated = dbapi_connection.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            if not truncated[0]:
+                mode = "TRUNCATE"
+        reclaimed = max(before - self._wal_size(), 0)
+        return "ok", reclaimed, f"{mode}: {checkpointed} of {frames} WAL frames checkpointed" + (" (busy)" if busy else "")
+
+    def _optimize(self, dbapi_connection: sqlite3.Connection) -> _Result:
+        dbapi_connection.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+        try:
+            with self._write_lock(dbapi_connection):
+                dbapi_connection.execute("PRAGMA optimize").fetchall()
+        except sqlite3.OperationalError as e:
+            if not self._is_interrupt(e):
+                raise
+            return "over_budget", 0, f"rolled back after {self._budget_ms()} ms"
+        return "ok", 0, None
+
+    def _analyze(self, dbapi_connection: sqlite3.Connection) -> _Result:
+        tables = [row[0] for row in dbapi_connection.execute(
+            "SELECT name FROM sqlite_schema WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        dbapi_connection.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+        over_budget = []
+        for done, table in enumerate(tables):
+            self._check_idle(f"analyzed {done} of {len(tables)} tables")
+            try:
+                with self._write_lock(dbapi_connection):
+                    dbapi_connection.execute(f'ANALYZE "{table}"')
+            except sqlite3.OperationalError as e:
+                if not self._is_interrupt(e):
+                    raise
+                over_budget.append(table)
+            self._pause()
+        if over_budget:
+            return "over_budget", 0, f"skipped {', '.join(over_budget)}"
+        return "ok", 0, f"analyzed {len(tables)} tables"
+
+    def _incremental_vacuum(self, dbapi_connection: sqlite3.Connection) -> _Result:
+        # 2 = INCREMENTAL. Switching an existing file over takes a full
+        # VACUUM, which no budget allows, so those databases are skipped.
+        if self._pragma(dbapi_connection, "auto_vacuum") != 2:
+            return "skipped", 0, "auto_vacuum is not INCREMENTAL"
+        page_size = self._pragma(dbapi_connection, "page_size")
+        pages_before = self._pragma(dbapi_connection, "page_count")
+        budget = self.budget.total_seconds()
+        status, detail = "ok", None
+        try:
+            while self._pragma(dbapi_connection, "freelist_count"):
+                self._check_idle("stopped for checkout activity")
+                batch = self._vacuum_batch
+                started = time.perf_counter()
+                try:
+                    with self._write_lock(dbapi_connection):
+                        dbapi_connection.execute(f"PRAGMA incremental_vacuum({batch})").fetchall()
+                except sqlite3.OperationalError as e:
+                    if not self._is_interrupt(e):
+                        raise
+                    if batch == _VACUUM_MIN_PAGES:
+                        status, detail = "over_budget", f"{batch} pages took over {self._budget_ms()} ms"
+                        break
+                    self._vacuum_batch = max(batch // 4, _VACUUM_MIN_PAGES)
+                    continue
+                # Aim each batch at half the budget.
+                per_page = (time.perf_counter() - started) / batch
+                target = int(budget / 2 / per_page) if per_page else _VACUUM_MAX_PAGES
+                self._vacuum_batch = min(max(target, _VACUUM_MIN_PAGES), _VACUUM_MAX_PAGES, batch * 2)
+                self._pause()
+        except _Deferred as e:
+            status, detail = "deferred", str(e)
+        reclaimed = (pages_before - self._pragma(dbapi_connection, "page_count")) * page_size
+        return status, reclaimed, detail
+
+    @staticmethod
+    def _is_interrupt(error: sqlite3.OperationalError) -> bool:
+        return "interrupted" in str(error)
+
+    def _prune(self):
+        with session_scope() as session:
+            session.execute(delete(MaintenanceRun).where(
+                MaintenanceRun.started_at < utc_now() - HISTORY_RETENTION
+            ))
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval.total_seconds()):
+            if not self.is_idle():
+                continue
+            try:
+                self.run_due()
+            except Exception as e:
+                logger.exception(f"Database maintenance failed: {e}")
+
+
+maintenance = MaintenanceScheduler()
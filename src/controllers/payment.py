@@ -1,126 +1,403 @@
+from sqlalchemy import bindparam, case, func, or_, update
 from sqlmodel import Session, select
 from models.payment import Payment, PaymentStatus, PaymentMethod
-from models.sale import Sale, SaleItem
+from models.sale import Sale, SaleItem, SaleStatus, REFUNDABLE_STATUSES
 from models.item import Product
-from db.conn import get_session
-from typing import List, Dict, Any, Optional
+from db.conn import session_scope, current_session, after_commit
+from controllers.velocity import VelocityService
+from controllers import heatmap, fast_checkout, sync
+from controllers.audit import audit
+from controllers.reservations import reservations
+from controllers.authorization import requires, Permission
+from utils.clock import store_now
+from utils.events import bus, SaleAdjusted, SaleCompleted, StockChanged
+from typing import Callable, Generator, List, Dict, Any, Optional
+from contextlib import contextmanager
 import uuid
 from datetime import datetime
 
+_ALL_PAYMENTS = select(Payment).order_by(Payment.created_at.desc())
+
+# Units still returnable per product: the original lines plus the (negative)
+# lines of every earlier adjustment of the sale.
+_RETURNABLE_LINES = (
+    select(
+        SaleItem.product_id,
+        func.sum(SaleItem.quantity),
+        func.max(SaleItem.unit_price),
+        func.max(SaleItem.cost_price),
+    )
+    .join(Sale, Sale.id == SaleItem.sale_id)
+    .where(or_(Sale.id == bindparam("sale_id"), Sale.adjusts_sale_id == bindparam("sale_id")))
+    .group_by(SaleItem.product_id)
+)
+
+_SALE_PAYMENT = select(Payment).where(Payment.sale_id == bindparam("sale_id")).limit(1)
+
 class PaymentController:
     def __init__(self, session: Optional[Session] = None):
-        self.session = session
+        # An injected session belongs to the caller, who also commits it.
+        self._session = session
+        self.velocity = VelocityService()
+
+    @contextmanager
+    def _session_scope(self, *, read_only: bool = False) -> Generator[Session, None, None]:
+        if self._session:
+            yield self._session
+            return
 
-    def create_sale(self, items: List[Dict[str, Any]], payment_method: PaymentMethod) -> Sale:
+        with session_scope(read_only=read_only) as session:
+            yield session
+
+    @requires(Permission.SELL)
+    def create_sale(
+        self,
+        items: List[Dict[str, Any]],
+        payment_method: PaymentMethod,
+        *,
+        cart_id: Optional[uuid.UUID] = None,
+    ) -> Sale:
         """
         Create a new sale transaction.
         
         items: List of dicts with 'product_id' and 'quantity'
         payment_method: Method of payment
+        cart_id: The cart whose stock reservations this sale consumes.
+            Units other carts hold are never sold; the cart's own holds
+            are released with the sale.
+
+        With fast checkout enabled (and no enclosing transaction) the sale is
+        journaled and returned immediately; the background writer commits it
+        to the database.
         """
-        # If session was not provided, create a new one for this transaction
-        local_session = False
-        if not self.session:
-            session_gen = get_session()
-            self.session = next(session_gen)
-            local_session = True
-
-        try:
-            total_amount = 0.0
-            sale_items = []
-            
-            # 1. Validate items and calculate total
-            for item in items:
-                product_id = item['product_id']
-                quantity = item['quantity']
-                
-                product = self.session.get(Product, product_id)
-                if not product:
-                    raise ValueError(f"Product with ID {product_id} not found")
-                
-                if not product.in_stock or product.quantity < quantity:
-                    raise ValueError(f"Not enough stock for product: {product.name}")
-                
-                # Calculate line total
-                line_total = product.price * quantity
-                total_amount += line_total
-                
-                # Prepare SaleItem
-                sale_item = SaleItem(
-                    product_id=product_id,
-                    quantity=quantity,
-                    unit_price=product.price,
-                    cost_price=product.cost_price
-                )
-                sale_items.append(sale_item)
-                
-                # Update stock
-                product.quantity -= quantity
-                if product.quantity == 0:
-                    product.in_stock = False
-                self.session.add(product)
-
-            # 2. Create Sale record
-            sale = Sale(
-                total_amount=total_amount,
-                status="completed",
-                created_at=datetime.now()
-            )
-            self.session.add(sale)
-            self.session.flush() # Flush to get the sale ID
-
-            # 3. Associate items with sale
-            for sale_item in sale_items:
-                sale_item.sale_id = sale.id
-                self.session.add(sale_item)
-            
-            # 4. Create Payment record
-            payment = Payment(
+        standalone = self._session is None and current_session() is None
+        writer = fast_checkout.active_writer() if standalone else None
+
+        product_ids = [item['product_id'] for item in items]
+        if writer:
+            def price(pending_quantity):
+                with session_scope(read_only=True) as session:
+                    held = reservations.held_elsewhere(session, product_ids, cart_id)
+                    return self.price_items(
+                        session, items, lambda product_id: pending_quantity(product_id) + held.get(product_id, 0)
+                    )
+
+            sale = writer.submit(price, payment_method)
+            if cart_id:
+                # Journaled units already count as pending.
+                reservations.release(cart_id)
+            return sale
+
+        with self._session_scope() as session:
+            # 1. Validate items and price them
+            held = reservations.held_elsewhere(session, product_ids, cart_id)
+            lines = self.price_items(session, items, lambda product_id: held.get(product_id, 0))
+            if cart_id:
+                reservations.release(cart_id, session)
+
+            # 2. Record sale, line items, stock and payment
+            sale = self.apply_sale(session, lines, payment_method, sold_at=store_now())
+            session.flush()
+
+            product_ids = [line['product_id'] for line in lines]
+            after_commit(session, lambda: self.publish_sale(sale.id, product_ids))
+            return sale
+
+    @staticmethod
+    def publish_sale(sale_id: uuid.UUID, product_ids: List[uuid.UUID]):
+        """Announce a committed sale to the rest of the app."""
+        product_ids = tuple(dict.fromkeys(product_ids))
+        bus.publish(StockChanged(product_ids))
+        bus.publish(SaleCompleted(sale_id, product_ids))
+
+    @staticmethod
+    def publish_adjustment(sale_id: uuid.UUID, adjustment_id: uuid.UUID, product_ids: List[uuid.UUID]):
+        """Announce a committed refund or void."""
+        product_ids = tuple(product_ids)
+        bus.publish(StockChanged(product_ids))
+        bus.publish(SaleAdjusted(sale_id, adjustment_id, product_ids))
+
+    @requires(Permission.REFUND_SALES)
+    def refund_sale(self, sale_id: uuid.UUID, items: Optional[List[Dict[str, Any]]] = None) -> Sale:
+        """
+        Refund a sale in full, or only ``items`` (dicts with 'product_id' and
+        'quantity') of it. May be called again until every unit is returned.
+
+        Returns the adjustment sale carrying the negative amounts.
+        """
+        return self._reverse_sale(sale_id, items, void=False)
+
+    @requires(Permission.VOID_SALES)
+    def void_sale(self, sale_id: uuid.UUID) -> Sale:
+        """Cancel a sale outright. Only sales without refunds can be voided."""
+        return self._reverse_sale(sale_id, None, void=True)
+
+    def price_items(
+        self,
+        session: Session,
+        items: List[Dict[str, Any]],
+        pending_quantity: Callable[[uuid.UUID], int],
+    ) -> List[Dict[str, Any]]:
+        """Check stock for each cart item and capture its current prices.
+
+        pending_quantity reports units that are spoken for elsewhere: sold
+        but not yet committed (fast checkout) or held by other carts.
+        """
+        lines = []
+        for item in items:
+            product_id = item['product_id']
+            quantity = item['quantity']
+
+            product = session.get(Product, product_id)
+            if not product:
+                raise ValueError(f"Product with ID {product_id} not found")
+
+            available = product.quantity - pending_quantity(product_id)
+            if not product.in_stock or available < quantity:
+                raise ValueError(f"Not enough stock for product: {product.name}")
+
+            lines.append({
+                'product_id': product_id,
+                'quantity': quantity,
+                'unit_price': product.price,
+                'cost_price': product.cost_price,
+            })
+        return lines
+
+    def apply_sale(
+        self,
+        session: Session,
+        lines: List[Dict[str, Any]],
+        payment_method: PaymentMethod,
+        *,
+        sold_at: datetime,
+        sale_id: Optional[uuid.UUID] = None,
+    ) -> Sale:
+        """Write a priced sale into the session without committing.
+
+        Shared by the direct checkout path and the journal writer, so
+        every side effect of a sale lives here.
+        """
+        total_amount = 0.0
+        sale = Sale(
+            total_amount=0.0,
+            status="completed",
+            created_at=sold_at
+        )
+        if sale_id:
+            sale.id = sale_id
+
+        for line in lines:
+            product = session.get(Product, line['product_id'])
+            quantity = line['quantity']
+            total_amount += line['unit_price'] * quantity
+
+            session.add(SaleItem(
                 sale_id=sale.id,
-                amount=total_amount,
-                payment_method=payment_method,
-                status=PaymentStatus.COMPLETED,
-                created_at=datetime.now(),
-                updated_at=datetime.now()
+                product_id=line['product_id'],
+                quantity=quantity,
+                unit_price=line['unit_price'],
+                cost_price=line['cost_price']
+            ))
+
+            # A journaled sale may be replayed after its product was deleted.
+            if product is None:
+                continue
+
+            # Update stock
+            product.quantity -= quantity
+            if product.quantity <= 0:
+                product.in_stock = False
+            self.velocity.record_sale(session, product, quantity, sold_at)
+            session.add(product)
+            sync.record_stock_change(session, product)
+
+        sale.total_amount = total_amount
+        session.add(sale)
+        heatmap.record_sale(session, sold_at, total_amount)
+
+        session.add(Payment(
+            sale_id=sale.id,
+            amount=total_amount,
+            payment_method=payment_method,
+            status=PaymentStatus.COMPLETED,
+            created_at=sold_at,
+            updated_at=sold_at
+        ))
+        return sale
+
+    def apply_adjustment(
+        self,
+        session: Session,
+        sale: Sale,
+        returns: Dict[uuid.UUID, Dict[str, Any]],
+        *,
+        adjusted_at: datetime,
+        void: bool = False,
+    ) -> Sale:
+        """Write the negative side of a refund or void without committing.
+
+        ``returns`` maps product_id to its 'quantity', 'unit_price' and
+        'cost_price'. The original sale is left as it was, apart from its
+        status; revenue, profit, heatmap and velocity are corrected by
+        deltas, so nothing is recomputed however many refunds a day sees.
+        """
+        amount = sum(line['unit_price'] * line['quantity'] for line in returns.values())
+        adjustment = Sale(
+            total_amount=-amount,
+            status=SaleStatus.ADJUSTMENT.value,
+            created_at=adjusted_at,
+            adjusts_sale_id=sale.id,
+        )
+        session.add(adjustment)
+        session.add_all(
+            SaleItem(
+                sale_id=adjustment.id,
+                product_id=product_id,
+                quantity=-line['quantity'],
+                unit_price=line['unit_price'],
+                cost_price=line['cost_price'],
             )
-            self.session.add(payment)
+            for product_id, line in returns.items()
+        )
 
-            self.session.commit()
-            self.session.refresh(sale)
-            return sale
-        except Exception as e:
-            self.session.rollback()
-            raise e
-        finally:
-            if local_session:
-                self.session.close()
-                self.session = None
+        reorder_points = {}
+        for product_id, line in returns.items():
+            reorder_point = self.velocity.record_return(session, product_id, line['quantity'])
+            if reorder_point is not None:
+                reorder_points[product_id] = reorder_point
+        self._restock(session, {product_id: line['quantity'] for product_id, line in returns.items()}, reorder_points)
+
+        # The refund lands on today's revenue; a void also takes the
+        # transaction back out of the hour it was made in.
+        heatmap.record_sale(session, adjusted_at, -amount, transactions=0)
+        if void:
+            heatmap.record_sale(session, sale.created_at, 0.0, transactions=-1)
+
+        original_payment = session.exec(_SALE_PAYMENT, params={"sale_id": sale.id}).first()
+        session.add(Payment(
+            sale_id=adjustment.id,
+            amount=-amount,
+            payment_method=original_payment.payment_method if original_payment else PaymentMethod.CASH,
+            status=PaymentStatus.REFUNDED,
+            created_at=adjusted_at,
+            updated_at=adjusted_at
+        ))
+        return adjustment
 
     def get_payment(self, payment_id: uuid.UUID) -> Optional[Payment]:
-        local_session = False
-        if not self.session:
-            session_gen = get_session()
-            self.session = next(session_gen)
-            local_session = True
-            
-        try:
-            return self.session.get(Payment, payment_id)
-        finally:
-            if local_session:
-                self.session.close()
-                self.session = None
+        with self._session_scope(read_only=True) as session:
+            return session.get(Payment, payment_id)
 
     def get_all_payments(self) -> List[Payment]:
-        local_session = False
-        if not self.session:
-            session_gen = get_session()
-            self.session = next(session_gen)
-            local_session = True
-            
-        try:
-            statement = select(Payment).order_by(Payment.created_at.desc())
-            return self.session.exec(statement).all()
-        finally:
-            if local_session:
-                self.session.close()
-                self.session = None
\ No newline at end of file
+        with self._session_scope(read_only=True) as session:
+            return session.exec(_ALL_PAYMENTS).all()
+
+    # Internal helpers -----------------------------------------------------------
+
+    def _reverse_sale(
+        self,
+        sale_id: uuid.UUID,
+        items: Optional[List[Dict[str, Any]]],
+        *,
+        void: bool,
+    ) -> Sale:
+        with self._session_scope() as session:
+            sale = session.get(Sale, sale_id)
+            if not sale or sale.status == SaleStatus.ADJUSTMENT:
+                raise ValueError(f"Sale with ID {sale_id} not found")
+            if void and sale.status != SaleStatus.COMPLETED:
+                raise ValueError(f"Sale is {sale.status.replace('_', ' ')} and can no longer be voided")
+            if sale.status not in REFUNDABLE_STATUSES:
+                raise ValueError(f"Sale is already {sale.status.replace('_', ' ')}")
+
+            returnable = {
+                row[0]: {'quantity': int(row[1]), 'unit_price': row[2], 'cost_price': row[3]}
+                for row in session.exec(_RETURNABLE_LINES, params={"sale_id": sale_id})
+                if row[1] > 0
+            }
+            returns = self._select_returns(returnable, items)
+            status_before = sale.status
+
+            adjustment = self.apply_adjustment(
+                session, sale, returns, adjusted_at=store_now(), void=void
+            )
+            if void:
+                sale.status = SaleStatus.VOIDED.value
+            elif all(
+                product_id in returns and returns[product_id]['quantity'] == line['quantity']
+                for product_id, line in returnable.items()
+            ):
+                sale.status = SaleStatus.REFUNDED.value
+            else:
+                sale.status = SaleStatus.PARTIALLY_REFUNDED.value
+            session.add(sale)
+            session.flush()
+
+            product_ids = list(returns)
+            adjustment_id = adjustment.id
+            audit_after = {
+                "status": sale.status,
+                "adjustment_id": adjustment_id,
+                "amount": adjustment.total_amount,
+                "items": {str(product_id): line['quantity'] for product_id, line in returns.items()},
+            }
+            after_commit(session, lambda: audit.record(
+                "sale.void" if void else "sale.refund", "sale", sale_id,
+                before={"status": status_before}, after=audit_after,
+            ))
+            after_commit(session, lambda: self.publish_adjustment(sale_id, adjustment_id, product_ids))
+            return adjustment
+
+    @staticmethod
+    def _select_returns(
+        returnable: Dict[uuid.UUID, Dict[str, Any]],
+        items: Optional[List[Dict[str, Any]]],
+    ) -> Dict[uuid.UUID, Dict[str, Any]]:
+        if not returnable:
+            raise ValueError("Nothing left to refund on this sale")
+        if items is None:
+            return returnable
+
+        quantities: Dict[uuid.UUID, int] = {}
+        for item in items:
+            quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+
+        returns = {}
+        for product_id, quantity in quantities.items():
+            line = returnable.get(product_id)
+            if quantity <= 0:
+                raise ValueError("Refund quantities must be positive")
+            if line is None or quantity > line['quantity']:
+                raise ValueError(f"Cannot refund {quantity} of product {product_id} on this sale")
+            returns[product_id] = {**line, 'quantity': quantity}
+        if not returns:
+            raise ValueError("No items to refund")
+        return returns
+
+    @staticmethod
+    def _restock(
+        session: Session,
+        quantities: Dict[uuid.UUID, int],
+        reorder_points: Dict[uuid.UUID, int],
+    ):
+        """Put returned units back on the shelf with a single UPDATE."""
+        returned = case(quantities, value=Product.id, else_=0)
+        values = {
+            Product.quantity: Product.quantity + returned,
+            Product.in_stock: Product.quantity + returned > 0,
+        }
+        if reorder_points:
+            values[Product.reorder_point] = case(
+                (Product.reorder_point_manual, Product.reorder_point),
+                else_=case(reorder_points, value=Product.id, else_=Product.reorder_point),
+            )
+        statement = (
+            update(Product)
+            .where(Product.id.in_(list(quantities)))
+            .values(values)
+            .returning(Product.id, Product.quantity, Product.in_stock)
+        )
+        # Products deleted since the sale simply have nothing to restock.
+        for product_id, quantity, in_stock in session.execute(statement).all():
+            sync.record_stock_level(session, product_id, quantity, in_stock)
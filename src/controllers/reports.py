@@ -0,0 +1,453 @@
+from __future__ import annotations
+
+import csv
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import func
+from sqlmodel import select
+
+from controllers.authorization import requires, Permission
+from db.conn import session_scope
+from models.item import Product
+from models.payment import Payment
+from models.sale import Sale, SaleItem, COUNTED_STATUSES
+from utils.clock import to_epoch, utc_now
+from utils.events import bus, ReportJobChanged
+from utils.logger import get_logger
+from utils.xlsx import XlsxWriter
+
+logger = get_logger()
+
+TEMP_DIR = "storage/temp"
+TEMP_RETENTION = timedelta(days=2)
+
+# Rows fetched (and written) per round trip; progress is reported per chunk.
+CHUNK_SIZE = 2000
+
+
+class ReportKind(str, Enum):
+    SALES = "sales"
+    SALES_LEDGER = "sales_ledger"
+    PAYMENTS = "payments"
+    INVENTORY = "inventory"
+    # Every sheet above in one spreadsheet (XLSX only).
+    WORKBOOK = "workbook"
+
+
+class ReportFormat(str, Enum):
+    CSV = "csv"
+    XLSX = "xlsx"
+
+
+MULTI_SHEET_KINDS = (ReportKind.WORKBOOK,)
+
+
+class ReportJobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = (ReportJobStatus.COMPLETED, ReportJobStatus.FAILED, ReportJobStatus.CANCELLED)
+
+
+class ReportCancelled(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class ReportSheet:
+    name: str
+    header: List[str]
+    total: int
+    rows: Iterator[Sequence[Any]]
+
+    @classmethod
+    def from_statement(cls, name: str, header: List[str], statement) -> "ReportSheet":
+        # rows is a generator, so its query only runs once the writer pulls on it.
+        return cls(name, header, _count(statement), _stream(statement))
+
+
+@dataclass(slots=True)
+class ReportJob:
+    kind: ReportKind
+    format: ReportFormat
+    params: Dict[str, Any]
+    output_path: str
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+    status: ReportJobStatus = ReportJobStatus.QUEUED
+    progress: float = 0.0
+    rows: int = 0
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=utc_now)
+    finished_at: Optional[datetime] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def file_name(self) -> str:
+        return os.path.basename(self.output_path)
+
+
+class ReportQueue:
+    """Runs report jobs in a process pool so big exports never block the UI.
+
+    Workers stream their query in chunks, write CSV or XLSX (utils/xlsx.py) to
+    ``storage/temp`` and report progress over a queue; a listener thread folds
+    progress into the job records and publishes ReportJobChanged on the event
+    bus. Queued jobs are cancelled through their future, running ones through
+    a marker file the worker checks between chunks.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self._executor: Executor
+        if getattr(sys, "frozen", False):
+            # A frozen build has no interpreter to spawn workers with; the
+            # queries run on the read pool, so threads still keep the UI free.
+            self._progress = queue.Queue()
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="report-worker",
+                initializer=_init_worker,
+                initargs=(self._progress,),
+            )
+        else:
+            # spawn: forking a process that runs UI and pool threads is unsafe.
+            context = multiprocessing.get_context("spawn")
+            self._progress = context.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self._progress,),
+            )
+        self._lock = threading.Lock()
+        self._jobs: Dict[uuid.UUID, ReportJob] = {}
+        self._futures: Dict[uuid.UUID, Future] = {}
+        self._listener = threading.Thread(target=self._listen, name="report-progress", daemon=True)
+        self._listener.start()
+
+    # Public API -----------------------------------------------------------------
+
+    @requires(Permission.EXPORT_REPORTS)
+    def submit(self, kind: ReportKind, fmt: ReportFormat = ReportFormat.CSV, **params) -> ReportJob:
+        if fmt == ReportFormat.CSV and kind in MULTI_SHEET_KINDS:
+            raise ValueError(f"{kind.value} report has several sheets and needs XLSX")
+
+        os.makedirs(TEMP_DIR, exist_ok=True)
+        job = ReportJob(kind=kind, format=fmt, params=params, output_path="")
+        stamp = job.created_at.strftime("%Y%m%d-%H%M%S")
+        job.output_path = os.path.join(
+            TEMP_DIR, f"{kind.value}_{stamp}_{job.id.hex[:8]}.{fmt.value}"
+        )
+
+        with self._lock:
+            self._jobs[job.id] = job
+            future = self._executor.submit(
+                run_report, job.id, job.kind, job.format, job.params, job.output_path
+            )
+            self._futures[job.id] = future
+        future.add_done_callback(lambda f, job_id=job.id: self._on_done(job_id, f))
+        logger.info(f"Queued {kind.value} report {job.id}")
+        self._publish(job)
+        return job
+
+    def cancel(self, job_id: uuid.UUID) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            future = self._futures.get(job_id)
+        if job is None or job.finished:
+            return False
+        # A queued job never starts; a running one stops at its next chunk.
+        if future is None or not future.cancel():
+            open(_cancel_marker(job.output_path), "w").close()
+        return True
+
+    def get(self, job_id: uuid.UUID) -> Optional[ReportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[ReportJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def shutdown(self):
+        with self._lock:
+            futures = list(self._futures.values())
+        for future in futures:
+            future.cancel()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._progress.put(None)
+        self._listener.join(timeout=5)
+
+    # Internal helpers -----------------------------------------------------------
+
+    def _listen(self):
+        while True:
+            message = self._progress.get()
+            if message is None:
+                return
+            job_id, rows, progress = message
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.finished:
+                    continue
+                job.status = ReportJobStatus.RUNNING
+                job.rows = rows
+                job.progress = progress
+            self._publish(job)
+
+    def _on_done(self, job_id: uuid.UUID, future: Future):
+        with self._lock:
+            job = self._jobs[job_id]
+            self._futures.pop(job_id, None)
+            try:
+                job.rows = future.result()
+                job.status = ReportJobStatus.COMPLETED
+                job.progress = 1.0
+            except (CancelledError, ReportCancelled):
+                job.status = ReportJobStatus.CANCELLED
+            except Exception as e:
+                job.status = ReportJobStatus.FAILED
+                job.error = str(e)
+            job.finished_at = utc_now()
+
+        if job.status == ReportJobStatus.FAILED:
+            logger.error(f"Report {job_id} failed: {job.error}")
+        else:
+            logger.info(f"Report {job_id} {job.status.value} ({job.rows} rows)")
+        self._publish(job)
+
+    @staticmethod
+    def _publish(job: ReportJob):
+        bus.publish(ReportJobChanged(job.id, job.status.value, job.progress))
+
+
+_queue: Optional[ReportQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_report_queue() -> ReportQueue:
+    """The app-wide report queue, started on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            cleanup_temp()
+            _queue = ReportQueue()
+        return _queue
+
+
+def shutdown_report_queue():
+    global _queue
+    with _queue_lock:
+        queue, _queue = _queue, None
+    if queue:
+        queue.shutdown()
+
+
+def cleanup_temp(max_age: timedelta = TEMP_RETENTION) -> int:
+    """Delete report files older than ``max_age``. Returns the number removed."""
+    if not os.path.isdir(TEMP_DIR):
+        return 0
+    cutoff = time.time() - max_age.total_seconds()
+    removed = 0
+    for entry in os.scandir(TEMP_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    return removed
+
+
+# Worker side ------------------------------------------------------------------------
+
+_worker_progress = None
+
+
+def _init_worker(progress_queue):
+    global _worker_progress
+    _worker_progress = progress_queue
+
+
+def _cancel_marker(output_path: str) -> str:
+    return output_path + ".cancel"
+
+
+def run_report(
+    job_id: uuid.UUID,
+    kind: ReportKind,
+    fmt: ReportFormat,
+    params: Dict[str, Any],
+    output_path: str,
+) -> int:
+    """Build one report into ``output_path``. Runs in a worker process.
+
+    Writes to a partial file and renames it on success, so a cancelled or
+    failed job never leaves a truncated report behind. Returns the row count.
+    """
+    # One read transaction for the whole job: every sheet and the row
+    # counts behind the progress bar come from the same snapshot.
+    with session_scope(read_only=True):
+        sheets = REPORT_BUILDERS[kind](**params)
+        total = sum(sheet.total for sheet in sheets)
+        partial_path = output_path + ".part"
+        marker = _cancel_marker(output_path)
+        written = 0
+
+        def chunks(sheet: ReportSheet) -> Iterator[List[Sequence[Any]]]:
+            nonlocal written
+            for chunk in _chunks(sheet.rows, CHUNK_SIZE):
+                if os.path.exists(marker):
+                    raise ReportCancelled(job_id)
+                yield chunk
+                written += len(chunk)
+                if _worker_progress is not None:
+                    _worker_progress.put((job_id, written, min(written / total, 1.0) if total else 1.0))
+
+        try:
+            if fmt == ReportFormat.XLSX:
+                with XlsxWriter(partial_path) as workbook:
+                    for sheet in sheets:
+                        workbook.add_sheet(sheet.name, sheet.header)
+                        for chunk in chunks(sheet):
+                            workbook.write_rows(chunk)
+            else:
+                (sheet,) = sheets
+                with open(partial_path, "w", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(sheet.header)
+                    for chunk in chunks(sheet):
+                        writer.writerows(chunk)
+            os.replace(partial_path, output_path)
+            return written
+        finally:
+            for sheet in sheets:
+                sheet.rows.close()
+            for path in (partial_path, marker):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def _chunks(rows: Iterator[Sequence[Any]], size: int) -> Iterator[List[Sequence[Any]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _stream(statement) -> Iterator[Sequence[Any]]:
+    with session_scope(read_only=True) as session:
+        yield from session.exec(statement.execution_options(yield_per=CHUNK_SIZE))
+
+
+def _sales_window(statement, start: Optional[datetime], end: Optional[datetime]):
+    statement = statement.where(Sale.status.in_(COUNTED_STATUSES))
+    if start:
+        statement = statement.where(Sale.created_at_epoch >= to_epoch(start))
+    if end:
+        statement = statement.where(Sale.created_at_epoch <= to_epoch(end))
+    return statement
+
+
+def _count(statement) -> int:
+    with session_scope(read_only=True) as session:
+        return session.exec(select(func.count()).select_from(statement.subquery())).one()
+
+
+def _sales_report(start: Optional[datetime] = None, end: Optional[datetime] = None):
+    statement = _sales_window(
+        select(Sale.id, Sale.created_at, Sale.total_amount, Sale.status), start, end
+    ).order_by(Sale.created_at_epoch.desc(), Sale.id.desc())
+    return [ReportSheet.from_statement("Sales", ["ID", "Date", "Total Amount", "Status"], statement)]
+
+
+def _sales_ledger_report(start: Optional[datetime] = None, end: Optional[datetime] = None):
+    statement = _sales_window(
+        select(
+            Sale.id,
+            Sale.created_at,
+            SaleItem.product_id,
+            Product.name,
+            SaleItem.quantity,
+            SaleItem.unit_price,
+            SaleItem.cost_price,
+            SaleItem.unit_price * SaleItem.quantity,
+        )
+        .join(SaleItem, SaleItem.sale_id == Sale.id)
+        .outerjoin(Product, Product.id == SaleItem.product_id),
+        start,
+        end,
+    ).order_by(Sale.created_at_epoch, Sale.id)
+    header = [
+        "Sale ID", "Date", "Product ID", "Product", "Quantity",
+        "Unit Price", "Cost Price", "Line Total",
+    ]
+    return [ReportSheet.from_statement("Line Items", header, statement)]
+
+
+def _payments_report(start: Optional[datetime] = None, end: Optional[datetime] = None):
+    statement = select(
+        Payment.id,
+        Payment.sale_id,
+        Payment.created_at,
+        Payment.payment_method,
+        Payment.amount,
+        Payment.status,
+    ).order_by(Payment.created_at, Payment.id)
+    if start:
+        statement = statement.where(Payment.created_at >= start)
+    if end:
+        statement = statement.where(Payment.created_at <= end)
+    header = ["ID", "Sale ID", "Date", "Method", "Amount", "Status"]
+    return [ReportSheet.from_statement("Payments", header, statement)]
+
+
+def _inventory_report():
+    statement = select(
+        Product.id,
+        Product.name,
+        Product.category,
+        Product.price,
+        Product.cost_price,
+        Product.quantity,
+        Product.in_stock,
+    ).order_by(Product.name)
+    header = ["ID", "Name", "Category", "Price", "Cost", "Quantity", "In Stock"]
+    return [ReportSheet.from_statement("Inventory", header, statement)]
+
+
+def _workbook_report(start: Optional[datetime] = None, end: Optional[datetime] = None):
+    return [
+        *_sales_report(start, end),
+        *_sales_ledger_report(start, end),
+        *_payments_report(start, end),
+        *_inventory_report(),
+    ]
+
+
+REPORT_BUILDERS = {
+    ReportKind.SALES: _sales_report,
+    ReportKind.SALES_LEDGER: _sales_ledger_report,
+    ReportKind.PAYMENTS: _payments_report,
+    ReportKind.INVENTORY: _inventory_report,
+    ReportKind.WORKBOOK: _workbook_report,
+}
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Generator, Iterable, Optional, Tuple
+import uuid
+
+from sqlalchemy import bindparam, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from db.conn import session_scope, after_commit
+from controllers import fast_checkout
+from models.item import Product
+from models.reservation import StockReservation
+from utils.events import bus, AvailabilityChanged
+from utils.clock import utc_now
+from utils.logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_TTL = timedelta(minutes=10)
+
+_ON_HAND = select(Product.name, Product.quantity, Product.in_stock).where(
+    Product.id == bindparam("product_id")
+)
+
+# Stands in for "no cart" so one statement serves both cases.
+_NO_CART = uuid.UUID(int=0)
+
+_HELD_ELSEWHERE = (
+    select(StockReservation.product_id, func.sum(StockReservation.quantity))
+    .where(
+        StockReservation.product_id.in_(bindparam("product_ids", expanding=True)),
+        StockReservation.expires_at > bindparam("now"),
+        StockReservation.cart_id != bindparam("cart_id"),
+    )
+    .group_by(StockReservation.product_id)
+)
+
+_TOUCH_CART = (
+    StockReservation.__table__.update()
+    .where(StockReservation.__table__.c.cart_id == bindparam("hold_cart_id"))
+    .values(expires_at=bindparam("renewed_until"))
+)
+
+
+class ReservationError(ValueError):
+    """The requested quantity is more than is available to sell."""
+
+    def __init__(self, name: str, requested: int, available: int):
+        super().__init__(f"Only {max(available, 0)} of {name} available")
+        self.requested = requested
+        self.available = available
+
+
+class ReservationService:
+    """TTL stock holds for open carts.
+
+    Available-to-sell is on-hand minus every live hold of other carts (and
+    sales still in the fast checkout journal), so two terminals can no longer
+    fill carts with the same last unit: the second one fails at cart time
+    instead of at payment.
+
+    The ``stockreservation`` table is the source of truth, so processes
+    sharing the database see each other's holds. A hold is one short write
+    transaction on that table; ``product`` is only read. This process's own
+    holds are mirrored in memory, which lets a cart shrink or release its
+    holds without counting anybody else's. Expired holds stop counting at
+    once and are deleted by a background sweep.
+    """
+
+    def __init__(
+        self,
+        session: Optional[Session] = None,
+        *,
+        ttl: timedelta = DEFAULT_TTL,
+        sweep_interval: timedelta = timedelta(minutes=1),
+    ):
+        self._session = session
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        # cart_id -> {product_id: (quantity, expires_at)}
+        self._holds: Dict[uuid.UUID, Dict[uuid.UUID, Tuple[int, datetime]]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Public API -----------------------------------------------------------------
+
+    def reserve(self, cart_id: uuid.UUID, product_id: uuid.UUID, quantity: int) -> int:
+        """Set the cart's hold on a product to ``quantity`` (0 releases it).
+
+        Renews every hold of the cart. Raises ReservationError when more is
+        asked for than is available; returns the quantity now held.
+        """
+        if quantity < 0:
+            raise ValueError("Quantity cannot be negative")
+        now = utc_now()
+        expires_at = now + self.ttl
+        current = self.held(cart_id).get(product_id, 0)
+
+        with self._session_scope() as session:
+            # Shrinking a hold can never oversell, so it skips the count.
+            if quantity > current:
+                self._check_available(session, cart_id, product_id, quantity)
+
+            table = StockReservation.__table__
+            if quantity:
+                upsert = sqlite_insert(table).values(
+                    cart_id=cart_id, product_id=product_id, quantity=quantity, expires_at=expires_at
+                )
+                session.execute(upsert.on_conflict_do_update(
+                    index_elements=[table.c.cart_id, table.c.product_id],
+                    set_={"quantity": upsert.excluded.quantity, "expires_at": upsert.excluded.expires_at},
+                ))
+            else:
+                session.execute(delete(StockReservation).where(
+                    StockReservation.cart_id == cart_id,
+                    StockReservation.product_id == product_id,
+                ))
+            session.execute(_TOUCH_CART, {"hold_cart_id": cart_id, "renewed_until": expires_at})
+
+            after_commit(session, lambda: self._remember(cart_id, product_id, quantity, expires_at))
+        return quantity
+
+    def release(self, cart_id: uuid.UUID, session: Optional[Session] = None):
+        """Drop every hold of a cart (checked out, cleared or abandoned).
+
+        With ``session`` the delete joins the caller's transaction.
+        """
+        if session is None:
+            with self._session_scope() as session:
+                self.release(cart_id, session)
+            return
+        session.execute(delete(StockReservation).where(StockReservation.cart_id == cart_id))
+        after_commit(session, lambda: self._forget(cart_id))
+
+    def held(self, cart_id: uuid.UUID) -> Dict[uuid.UUID, int]:
+        """This process's live holds for a cart."""
+        now = utc_now()
+        with self._lock:
+            holds = self._holds.get(cart_id, {})
+            return {pid: quantity for pid, (quantity, expires_at) in holds.items() if expires_at > now}
+
+    def held_elsewhere(
+        self,
+        session: Session,
+        product_ids: Iterable[uuid.UUID],
+        cart_id: Optional[uuid.UUID] = None,
+    ) -> Dict[uuid.UUID, int]:
+        """Units of each product held by live carts other than ``cart_id``."""
+        params = {
+            "product_ids": list(product_ids),
+            "now": utc_now(),
+            "cart_id": cart_id or _NO_CART,
+        }
+        return {row[0]: int(row[1]) for row in session.exec(_HELD_ELSEWHERE, params=params)}
+
+    def available(self, product_ids: Iterable[uuid.UUID], cart_id: Optional[uuid.UUID] = None) -> Dict[uuid.UUID, int]:
+        """Available-to-sell per product, from ``cart_id``'s point of view."""
+        product_ids = list(product_ids)
+        with self._session_scope(read_only=True) as session:
+            on_hand = {
+                row[0]: row[1] if row[2] else 0
+                for row in session.exec(
+                    select(Product.id, Product.quantity, Product.in_stock).where(Product.id.in_(product_ids))
+                )
+            }
+            held = self.held_elsewhere(session, on_hand, cart_id)
+        writer = fast_checkout.active_writer()
+        return {
+            pid: quantity - held.get(pid, 0) - (writer.pending_quantity(pid) if writer else 0)
+            for pid, quantity in on_hand.items()
+        }
+
+    def sweep(self) -> int:
+        """Delete expired holds. Returns the number removed."""
+        now = utc_now()
+        with self._session_scope() as session:
+            product_ids = session.execute(
+                delete(StockReservation)
+                .where(StockReservation.expires_at <= now)
+                .returning(StockReservation.product_id)
+            ).scalars().all()
+        with self._lock:
+            for cart_id in list(self._holds):
+                holds = self._holds[cart_id]
+                for pid in [pid for pid, (_, expires_at) in holds.items() if expires_at <= now]:
+                    del holds[pid]
+                if not holds:
+                    del self._holds[cart_id]
+        if product_ids:
+            logger.info(f"Swept {len(product_ids)} expired stock reservations")
+            bus.publish(AvailabilityChanged(tuple(set(product_ids))))
+        return len(product_ids)
+
+    def start(self) -> threading.Thread:
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reservation-sweeper", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    # Internal helpers -----------------------------------------------------------
+
+    @contextmanager
+    def _session_scope(self, *, read_only: bool = False) -> Generator[Session, None, None]:
+        if self._session:
+            yield self._session
+            return
+
+        with session_scope(read_only=read_only) as session:
+            yield session
+
+    def _check_available(
+        self,
+        session: Session,
+        cart_id: uuid.UUID,
+        product_id: uuid.UUID,
+        quantity: int,
+    ):
+        row = session.exec(_ON_HAND, params={"product_id": product_id}).first()
+        if row is None:
+            raise ValueError(f"Product with ID {product_id} not found")
+        name, on_hand, in_stock = row
+        held = self.held_elsewhere(session, [product_id], cart_id).get(product_id, 0)
+        writer = fast_checkout.active_writer()
+        pending = writer.pending_quantity(product_id) if writer else 0
+        available = (on_hand if in_stock else 0) - held - pending
+        if quantity > available:
+            raise ReservationError(name, quantity, available)
+
+    def _remember(self, cart_id: uuid.UUID, product_id: uuid.UUID, quantity: int, expires_at: datetime):
+        with self._lock:
+            holds = self._holds.setdefault(cart_id, {})
+            if quantity:
+                holds[product_id] = (quantity, expires_at)
+            else:
+                holds.pop(product_id, None)
+            # Every hold of the cart was renewed with this one.
+            for pid, (held, _) in holds.items():
+                holds[pid] = (held, expires_at)
+            if not holds:
+                del self._holds[cart_id]
+        bus.publish(AvailabilityChanged((product_id,)))
+
+    def _forget(self, cart_id: uuid.UUID):
+        with self._lock:
+            holds = self._holds.pop(cart_id, {})
+        if holds:
+            bus.publish(AvailabilityChanged(tuple(holds)))
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_interval.total_seconds()):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.exception(f"Stock reservation sweep failed: {e}")
+
+
+reservations = ReservationService()
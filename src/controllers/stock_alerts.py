@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import threading
+from typing import List, Optional
+
+from sqlalchemy import bindparam, event, update
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from db.conn import session_scope
+from models.item import Product
+from models.stock_alert import StockAlert
+from utils.events import bus, LowStockAlert
+from utils.logger import get_logger
+
+logger = get_logger()
+
+_PENDING_ALERTS = (
+    select(StockAlert, Product.name)
+    .outerjoin(Product, Product.id == StockAlert.product_id)
+    .where(StockAlert.delivered == False)  # noqa: E712 - matches the partial index
+    .order_by(StockAlert.id)
+    .limit(bindparam("limit"))
+)
+
+# session.info key set when a unit of work wrote to product, the only table
+# whose triggers queue alerts.
+_PRODUCTS_WRITTEN = "products_written"
+
+
+class StockAlertDispatcher:
+    """Publishes queued low-stock alerts as LowStockAlert events.
+
+    Alerts are written by triggers in the same transaction as the stock
+    change, so nothing can move stock without queuing one. Committing a
+    unit of work that wrote products wakes the dispatcher, which publishes
+    whatever is pending and then marks it delivered; alerts queued while
+    the app was closed go out on start. A crash in between repeats an alert rather than losing it.
+    """
+
+    def __init__(self, *, batch_size: int = 100, poll_interval: float = 30.0):
+        self.batch_size = batch_size
+        # Safety net only; product writes wake the thread straight away.
+        self.poll_interval = poll_interval
+        self._dispatch_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Public API -----------------------------------------------------------------
+
+    def start(self) -> threading.Thread:
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+        for name, listener in self._listeners():
+            event.listen(Session, name, listener)
+        self._thread = threading.Thread(target=self._run, name="stock-alerts", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        for name, listener in self._listeners():
+            if event.contains(Session, name, listener):
+                event.remove(Session, name, listener)
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def dispatch(self) -> int:
+        """Publish pending alerts now. Returns the number published."""
+        # One dispatch at a time, so a batch is never published twice.
+        with self._dispatch_lock:
+            published = 0
+            while True:
+                with session_scope(read_only=True) as session:
+                    rows = session.exec(_PENDING_ALERTS, params={"limit": self.batch_size}).all()
+                if not rows:
+                    return published
+
+                for alert, name in rows:
+                    # The product may have been deleted since.
+                    if name is None:
+                        continue
+                    bus.publish(LowStockAlert(
+                        product_id=alert.product_id,
+                        name=name,
+                        quantity=alert.quantity,
+                        reorder_point=alert.reorder_point,
+                    ))
+                    published += 1
+
+                alert_ids: List[int] = [alert.id for alert, _ in rows]
+                with session_scope() as session:
+                    session.execute(
+                        update(StockAlert).where(StockAlert.id.in_(alert_ids)).values(delivered=True)
+                    )
+                if len(rows) < self.batch_size:
+                    return published
+
+    # Internal helpers -----------------------------------------------------------
+
+    def _listeners(self):
+        return (
+            ("after_flush", self._on_flush),
+            ("do_orm_execute", self._on_execute),
+            ("after_commit", self._on_commit),
+            ("after_rollback", self._on_rollback),
+        )
+
+    @staticmethod
+    def _on_flush(session, flush_context):
+        # new and dirty still hold what this flush wrote.
+        if any(isinstance(instance, Product) for instance in (*session.new, *session.dirty)):
+            session.info[_PRODUCTS_WRITTEN] = True
+
+    @staticmethod
+    def _on_execute(orm_execute_state):
+        # Bulk UPDATE/INSERT statements (restocks, reorder points) skip the flush.
+        if orm_execute_state.is_update or orm_execute_state.is_insert:
+            if orm_execute_state.statement.entity_description["table"] is Product.__table__:
+                orm_execute_state.session.info[_PRODUCTS_WRITTEN] = True
+
+    def _on_commit(self, session):
+        if session.info.pop(_PRODUCTS_WRITTEN, False):
+            self._wake.set()
+
+    @staticmethod
+    def _on_rollback(session):
+        session.info.pop(_PRODUCTS_WRITTEN, None)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Cleared before dispatching, so a commit landing meanwhile is not lost.
+            self._wake.clear()
+            try:
+                self.dispatch()
+            except Exception as e:
+                logger.exception(f"Stock alert dispatch failed: {e}")
+            self._wake.wait(self.poll_interval)
+
+
+stock_alerts = StockAlertDispatcher()
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import json
+import threading
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+import uuid
+
+from sqlalchemy import and_, bindparam, delete, func
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select
+
+from db.conn import session_scope
+from models.change_log import ChangeLogEntry, ChangeLogState, ChangeOp
+from models.item import Product
+from utils.clock import utc_now
+from utils.logger import get_logger
+
+logger = get_logger()
+
+_PRODUCT_FIELDS = (
+    "name", "description", "price", "cost_price", "category",
+    "quantity", "reorder_point", "reorder_point_manual", "in_stock",
+)
+
+_MAX_SEQ = select(func.coalesce(func.max(ChangeLogEntry.seq), 0))
+
+_ENTRIES_AFTER = (
+    select(ChangeLogEntry)
+    .where(ChangeLogEntry.seq > bindparam("seq"))
+    .order_by(ChangeLogEntry.seq)
+    .limit(bindparam("limit"))
+)
+
+
+@dataclass(slots=True)
+class ChangeSet:
+    seq: int
+    changes: List[Dict[str, Any]]
+    # The requested position was compacted away; the caller must reload in full.
+    reset_required: bool = False
+    has_more: bool = False
+
+
+# Writers (called inside the mutating transaction) --------------------------------
+
+def record_product_upsert(session: Session, product: Product):
+    payload = {field: getattr(product, field) for field in _PRODUCT_FIELDS}
+    _record(session, product.id, ChangeOp.UPSERT, payload)
+
+
+def record_stock_change(session: Session, product: Product):
+    record_stock_level(session, product.id, product.quantity, product.in_stock)
+
+
+def record_stock_level(session: Session, product_id: uuid.UUID, quantity: int, in_stock: bool):
+    """Like record_stock_change, for set-based updates that never load the Product."""
+    _record(session, product_id, ChangeOp.STOCK, {
+        "quantity": quantity,
+        "in_stock": in_stock,
+    })
+
+
+def record_product_delete(session: Session, product_id: uuid.UUID):
+    _record(session, product_id, ChangeOp.DELETE, None)
+
+
+def _record(session: Session, product_id: uuid.UUID, op: ChangeOp, payload: Optional[Dict[str, Any]]):
+    session.add(ChangeLogEntry(
+        entity_id=product_id,
+        op=op,
+        payload=json.dumps(payload, separators=(",", ":")) if payload is not None else None,
+    ))
+
+
+# Readers --------------------------------------------------------------------------
+
+def latest_seq(session: Optional[Session] = None) -> int:
+    if session is None:
+        with session_scope(read_only=True) as session:
+            return latest_seq(session)
+    seq = session.exec(_MAX_SEQ).one()
+    # Compaction may have removed the newest entries (expired tombstones).
+    state = session.get(ChangeLogState, 1)
+    return max(seq, state.compacted_through if state else 0)
+
+
+def changes_since(seq: int, *, limit: int = 1000) -> ChangeSet:
+    """Return the net product changes after ``seq``, one delta per product.
+
+    Several entries for the same product are folded together, so a product
+    that changed fifty times since ``seq`` costs one delta.
+    """
+    with session_scope(read_only=True) as session:
+        state = session.get(ChangeLogState, 1)
+        if state and seq < state.compacted_through:
+            return ChangeSet(seq=latest_seq(session), changes=[], reset_required=True)
+
+        entries = session.exec(_ENTRIES_AFTER, params={"seq": seq, "limit": limit + 1}).all()
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    deltas: Dict[uuid.UUID, Dict[str, Any]] = {}
+    for entry in entries:
+        payload = json.loads(entry.payload) if entry.payload else {}
+        delta = deltas.get(entry.entity_id)
+        if entry.op == ChangeOp.DELETE:
+            deltas[entry.entity_id] = {"id": entry.entity_id, "op": ChangeOp.DELETE.value}
+        elif entry.op == ChangeOp.UPSERT or delta is None or delta["op"] == ChangeOp.DELETE.value:
+            deltas[entry.entity_id] = {"id": entry.entity_id, "op": entry.op.value, **payload}
+        else:
+            # A stock change on top of a pending upsert or stock delta.
+            delta.update(payload)
+
+    return ChangeSet(
+        seq=entries[-1].seq if entries else seq,
+        changes=list(deltas.values()),
+        has_more=has_more,
+    )
+
+
+# Compaction -----------------------------------------------------------------------
+
+def compact(*, tombstone_retention: timedelta = timedelta(days=7)) -> int:
+    """Drop entries superseded by a later entry for the same product.
+
+    Old delete tombstones are dropped too; terminals that last synced before
+    them get ``reset_required`` and reload the catalog. Returns the number of
+    entries removed.
+    """
+    newer = aliased(ChangeLogEntry)
+    superseded_by_full_state = select(newer.seq).where(
+        and_(
+            newer.entity_id == ChangeLogEntry.entity_id,
+            newer.seq > ChangeLogEntry.seq,
+            newer.op.in_([ChangeOp.UPSERT, ChangeOp.DELETE]),
+        )
+    ).exists()
+    superseded_stock = select(newer.seq).where(
+        and_(
+            newer.entity_id == ChangeLogEntry.entity_id,
+            newer.seq > ChangeLogEntry.seq,
+            newer.op == ChangeOp.STOCK,
+        )
+    ).exists()
+
+    with session_scope() as session:
+        removed = session.execute(
+            delete(ChangeLogEntry).where(superseded_by_full_state)
+        ).rowcount
+        removed += session.execute(
+            delete(ChangeLogEntry).where(ChangeLogEntry.op == ChangeOp.STOCK, superseded_stock)
+        ).rowcount
+
+        cutoff = utc_now() - tombstone_retention
+        expired = select(ChangeLogEntry.seq).where(
+            ChangeLogEntry.op == ChangeOp.DELETE,
+            ChangeLogEntry.created_at < cutoff,
+        )
+        expired_through = session.exec(select(func.max(expired.subquery().c.seq))).one()
+        if expired_through:
+            removed += session.execute(
+                delete(ChangeLogEntry).where(
+                    ChangeLogEntry.op == ChangeOp.DELETE,
+                    ChangeLogEntry.seq <= expired_through,
+                )
+            ).rowcount
+            state = session.get(ChangeLogState, 1) or ChangeLogState(id=1)
+            state.compacted_through = max(state.compacted_through, expired_through)
+            session.add(state)
+
+    logger.info(f"Compacted product change log, removed {removed} entries")
+    return removed
+
+
+def start_compaction(interval: timedelta = timedelta(hours=1)) -> threading.Thread:
+    """Compact the change log on a background timer."""
+    def run():
+        stop = threading.Event()
+        while not stop.wait(interval.total_seconds()):
+            try:
+                compact()
+            except Exception as e:
+                logger.exception(f"Change log compaction failed: {e}")
+
+    thread = threading.Thread(target=run, name="change-log-compaction", daemon=True)
+    thread.start()
+    return thread
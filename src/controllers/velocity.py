@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import math
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Generator, Iterable, List, Optional, Tuple
+import uuid
+
+from sqlalchemy import bindparam, case, false, func, or_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from db.conn import session_scope
+from models.item import Product
+from models.sale import Sale, SaleItem, COUNTED_STATUSES
+from models.velocity import ProductVelocity
+from utils.clock import store_now, to_epoch
+from utils.logger import get_logger
+
+logger = get_logger()
+
+SHORT_WINDOW_DAYS = 7
+LONG_WINDOW_DAYS = 28
+HISTORY_WINDOW_DAYS = 90
+
+# Leaves reorder points a manager set by hand alone.
+_SET_COMPUTED_REORDER_POINT = (
+    update(Product.__table__)
+    .where(
+        Product.__table__.c.id == bindparam("product_id"),
+        Product.__table__.c.reorder_point_manual == false(),
+    )
+    .values(reorder_point=bindparam("new_reorder_point"))
+)
+
+
+class VelocityService:
+    """Computes per-product sales velocity and reorder points from SaleItem history.
+
+    The full recompute is a single grouped query over the history window, so
+    it scales with the number of line items rather than with one query per
+    product. Between full runs, ``record_sale`` keeps the counters moving as
+    sales arrive; ``start_recompute`` runs the full pass on a timer so sales
+    that have left the 7- and 28-day windows stop counting.
+    """
+
+    def __init__(
+        self,
+        session: Optional[Session] = None,
+        *,
+        lead_time_days: float = 7.0,
+        safety_days: float = 3.0,
+        min_reorder_point: int = 1,
+    ):
+        self._session = session
+        self.lead_time_days = lead_time_days
+        self.safety_days = safety_days
+        self.min_reorder_point = min_reorder_point
+
+    @contextmanager
+    def _session_scope(self, *, read_only: bool = False) -> Generator[Session, None, None]:
+        if self._session:
+            yield self._session
+            return
+
+        with session_scope(read_only=read_only) as session:
+            yield session
+
+    # Public API -----------------------------------------------------------------
+
+    def recompute(
+        self,
+        *,
+        product_ids: Optional[Iterable[uuid.UUID]] = None,
+        now: Optional[datetime] = None,
+    ) -> int:
+        """Recompute velocity for every product (or only ``product_ids``).
+
+        The history is aggregated on a read snapshot, so checkouts are not
+        held up by the scan, and the results are stored in a short write
+        transaction afterwards. A product whose counters a sale or return
+        changed in between keeps them until the next run.
+
+        Returns the number of velocity rows written.
+        """
+        now = now or store_now()
+        with self._session_scope(read_only=True) as session:
+            rows = self._aggregate(session, now, product_ids)
+        with self._session_scope() as session:
+            written = self._store(session, rows)
+        logger.info(f"Recomputed sales velocity for {written} products")
+        return written
+
+    def get_velocity(self, product_id: uuid.UUID) -> Optional[ProductVelocity]:
+        with self._session_scope(read_only=True) as session:
+            return session.get(ProductVelocity, product_id)
+
+    def record_sale(self, session: Session, product: Product, quantity: int, sold_at: datetime):
+        """Fold a just-sold line into the product's counters.
+
+        Runs inside the caller's transaction. The sliding windows are only
+        trimmed by ``recompute``, so counters may overshoot until the next
+        scheduled run.
+        """
+        velocity = session.get(ProductVelocity, product.id)
+        if velocity is None:
+            velocity = ProductVelocity(product_id=product.id)
+
+        velocity.units_7d += quantity
+        velocity.units_28d += quantity
+        velocity.units_90d += quantity
+        velocity.last_sale_at = sold_at
+        self._apply_rates(velocity)
+        velocity.computed_at = sold_at
+        session.add(velocity)
+
+        if not product.reorder_point_manual:
+            product.reorder_point = velocity.reorder_point
+
+    def record_return(self, session: Session, product_id: uuid.UUID, quantity: int) -> Optional[int]:
+        """Take returned units back out of the product's counters.
+
+        Runs inside the caller's transaction and returns the new reorder
+        point, or None if the product has no velocity yet.
+        """
+        velocity = session.get(ProductVelocity, product_id)
+        if velocity is None:
+            return None
+
+        velocity.units_7d = max(0, velocity.units_7d - quantity)
+        velocity.units_28d = max(0, velocity.units_28d - quantity)
+        velocity.units_90d = max(0, velocity.units_90d - quantity)
+        self._apply_rates(velocity)
+        # Marks the counters as changed for a recompute running meanwhile.
+        velocity.computed_at = store_now()
+        session.add(velocity)
+        return velocity.reorder_point
+
+    def reorder_point_for(self, daily_demand: float) -> int:
+        cover_days = self.lead_time_days + self.safety_days
+        return max(self.min_reorder_point, math.ceil(daily_demand * cover_days))
+
+    # Internal helpers -----------------------------------------------------------
+
+    def _apply_rates(self, velocity: ProductVelocity):
+        velocity.avg_daily_7d = velocity.units_7d / SHORT_WINDOW_DAYS
+        velocity.avg_daily_28d = velocity.units_28d / LONG_WINDOW_DAYS
+        # React to a recent surge without forgetting the longer trend.
+        velocity.daily_demand = max(velocity.avg_daily_7d, velocity.avg_daily_28d)
+        velocity.reorder_point = self.reorder_point_for(velocity.daily_demand)
+
+    def _aggregate(
+        self,
+        session: Session,
+        now: datetime,
+        product_ids: Optional[Iterable[uuid.UUID]],
+    ) -> List[Tuple[ProductVelocity, Optional[datetime], int, bool]]:
+        """``(velocity, computed_at as read, reorder point, manual)`` per product."""
+        short_start = now - timedelta(days=SHORT_WINDOW_DAYS)
+        long_start = now - timedelta(days=LONG_WINDOW_DAYS)
+        history_start = now - timedelta(days=HISTORY_WINDOW_DAYS)
+
+        sales = (
+            select(
+                SaleItem.product_id.label("product_id"),
+                func.sum(
+                    case((Sale.created_at_epoch >= to_epoch(short_start), SaleItem.quantity), else_=0)
+                ).label("units_7d"),
+                func.sum(
+                    case((Sale.created_at_epoch >= to_epoch(long_start), SaleItem.quantity), else_=0)
+                ).label("units_28d"),
+                func.sum(SaleItem.quantity).label("units_90d"),
+                func.max(Sale.created_at).label("last_sale_at"),
+            )
+            .join(Sale, Sale.id == SaleItem.sale_id)
+            .where(Sale.status.in_(COUNTED_STATUSES))
+            .where(Sale.created_at_epoch >= to_epoch(history_start))
+            .group_by(SaleItem.product_id)
+            .subquery()
+        )
+
+        statement = (
+            select(
+                Product.id,
+                Product.reorder_point,
+                Product.reorder_point_manual,
+                sales.c.units_7d,
+                sales.c.units_28d,
+                sales.c.units_90d,
+                sales.c.last_sale_at,
+                ProductVelocity.last_sale_at,
+                ProductVelocity.computed_at,
+            )
+            .outerjoin(sales, sales.c.product_id == Product.id)
+            .outerjoin(ProductVelocity, ProductVelocity.product_id == Product.id)
+            # Products that never sold keep their configured reorder point.
+            .where(or_(sales.c.product_id.is_not(None), ProductVelocity.product_id.is_not(None)))
+        )
+        if product_ids is not None:
+            statement = statement.where(Product.id.in_(list(product_ids)))
+
+        rows = []
+        for row in session.exec(statement):
+            velocity = ProductVelocity(
+                product_id=row[0],
+                # Returns of units sold before the window can net below zero.
+                units_7d=max(0, int(row[3] or 0)),
+                units_28d=max(0, int(row[4] or 0)),
+                units_90d=max(0, int(row[5] or 0)),
+                last_sale_at=row[6] or row[7],
+                computed_at=now,
+            )
+            self._apply_rates(velocity)
+            rows.append((velocity, row[8], row[1], row[2]))
+        return rows
+
+    def _store(
+        self,
+        session: Session,
+        rows: List[Tuple[ProductVelocity, Optional[datetime], int, bool]],
+    ) -> int:
+        if not rows:
+            return 0
+        # Counters a sale or return touched after the snapshot are newer
+        # than what was computed from it.
+        current = dict(
+            session.exec(
+                select(ProductVelocity.product_id, ProductVelocity.computed_at).where(
+                    ProductVelocity.product_id.in_([velocity.product_id for velocity, *_ in rows])
+                )
+            ).all()
+        )
+        velocity_rows: List[Dict] = []
+        reorder_updates: List[Dict] = []
+        for velocity, seen, reorder_point, manual in rows:
+            if current.get(velocity.product_id) != seen:
+                continue
+            velocity_rows.append(velocity.model_dump())
+            if not manual and velocity.reorder_point != reorder_point:
+                reorder_updates.append({"product_id": velocity.product_id, "new_reorder_point": velocity.reorder_point})
+
+        if velocity_rows:
+            upsert = sqlite_insert(ProductVelocity.__table__)
+            upsert = upsert.on_conflict_do_update(
+                index_elements=[ProductVelocity.__table__.c.product_id],
+                set_={
+                    column.name: upsert.excluded[column.name]
+                    for column in ProductVelocity.__table__.columns
+                    if column.name != "product_id"
+                },
+            )
+            session.execute(upsert, velocity_rows)
+        if reorder_updates:
+            session.execute(_SET_COMPUTED_REORDER_POINT, reorder_updates)
+
+        return len(velocity_rows)
+
+
+def start_recompute(interval: timedelta = timedelta(hours=1)) -> threading.Thread:
+    """Recompute velocity now and then on a background timer."""
+    def run():
+        stop = threading.Event()
+        while True:
+            try:
+                VelocityService().recompute()
+            except Exception as e:
+                logger.exception(f"Sales velocity recompute failed: {e}")
+            stop.wait(interval.total_seconds())
+
+    thread = threading.Thread(target=run, name="velocity-recompute", daemon=True)
+    thread.start()
+    return thread
@@ -1,4 +1,10 @@
-from sqlmodel import create_engine, Session, SQLModel
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Generator, Optional
+from sqlalchemy import event
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlmodel import create_engine, Session
 import os
 
 # Ensure the storage directory exists
@@ -6,11 +12,157 @@ os.makedirs("storage/data", exist_ok=True)
 
 DATABASE_URL = "sqlite:///storage/data/hyperspin.db"
 
-engine = create_engine(DATABASE_URL, echo=True)
+def _create_engine(pool_size: int, max_overflow: int):
+    return create_engine(
+        DATABASE_URL,
+        echo=os.environ.get("HYPERSPIN_SQL_ECHO", "0") == "1",
+        # Pooled connections are shared by the UI thread and background workers.
+        connect_args={"check_same_thread": False, "timeout": 30},
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=10,
+        # Room for every prebuilt statement plus the ad-hoc ones.
+        query_cache_size=1000,
+    )
+
+# Checkout, inventory edits and background writers.
+engine = _create_engine(pool_size=4, max_overflow=4)
+
+# Analytics and reports get their own pool, so a long export can never take
+# the connections (or locks) a checkout is waiting for.
+read_engine = _create_engine(pool_size=8, max_overflow=8)
+
+def _configure_connection(dbapi_connection):
+    # Let SQLAlchemy issue BEGIN itself (see the begin listeners) instead of
+    # pysqlite's implicit, DML-only transactions.
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    # Lets the maintenance scheduler hand free pages back in small batches
+    # (controllers/maintenance.py). Only a new, empty file can take it, and
+    # it has to come before the WAL switch writes the header; on an existing
+    # file it would wait for the write lock, hence the check.
+    if cursor.execute("PRAGMA page_count").fetchone()[0] == 0:
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL lets readers work from a snapshot while a checkout is writing.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=FULL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    # Checkpoints truncate the WAL back to this size instead of leaving it
+    # at its high-water mark.
+    cursor.execute("PRAGMA journal_size_limit=67108864")
+    cursor.close()
+
+@event.listens_for(engine, "connect")
+def _configure_writer(dbapi_connection, connection_record):
+    _configure_connection(dbapi_connection)
+
+@event.listens_for(read_engine, "connect")
+def _configure_reader(dbapi_connection, connection_record):
+    _configure_connection(dbapi_connection)
+    # Anything that tries to write through the read pool fails loudly.
+    dbapi_connection.execute("PRAGMA query_only=ON")
+
+@event.listens_for(engine, "begin")
+def _begin_write(conn):
+    # Writers take the write lock up front so their reads and writes form one
+    # serializable unit (no lost stock updates between concurrent checkouts).
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+@event.listens_for(read_engine, "begin")
+def _begin_read(conn):
+    # A deferred transaction pins one WAL snapshot for the whole unit of
+    # work without ever taking the write lock.
+    conn.exec_driver_sql("BEGIN")
+
+# Compiled statement cache -----------------------------------------------------
+
+_compile_cache_counts: Counter = Counter()
+
+def _count_compile_cache(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and context.compiled is not None:
+        _compile_cache_counts[context.cache_hit] += 1
+
+for _engine in (engine, read_engine):
+    event.listen(_engine, "after_cursor_execute", _count_compile_cache)
+
+def compile_cache_stats() -> Dict[str, float]:
+    """Hits and misses of SQLAlchemy's compiled statement cache since start/reset."""
+    hits = _compile_cache_counts[CacheStats.CACHE_HIT]
+    misses = _compile_cache_counts[CacheStats.CACHE_MISS]
+    uncached = sum(_compile_cache_counts.values()) - hits - misses
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "uncached": uncached,
+        "hit_ratio": hits / lookups if lookups else 0.0,
+        "cached_statements": sum(
+            len(e._compiled_cache or ()) for e in (engine, read_engine)
+        ),
+    }
+
+def reset_compile_cache_stats():
+    _compile_cache_counts.clear()
 
 def init_db():
-    SQLModel.metadata.create_all(engine)
+    """Create or migrate the schema; one version read when it is current."""
+    # Imported here: the migrations pull in every model module.
+    from db.migrations import migrate
+    migrate(engine)
+
+# Unit of work -----------------------------------------------------------------
+
+_current_session: ContextVar[Optional[Session]] = ContextVar("hyperspin_session", default=None)
+
+def current_session() -> Optional[Session]:
+    """The session of the enclosing session_scope, if any."""
+    return _current_session.get()
+
+@contextmanager
+def session_scope(*, read_only: bool = False) -> Generator[Session, None, None]:
+    """Run a block as one unit of work.
 
-def get_session():
-    with Session(engine) as session:
+    The outermost scope owns the session: it commits on success, rolls back
+    on error and always closes. Nested scopes (e.g. one controller calling
+    another, or a caller wrapping several controller calls) join the
+    outer transaction instead of opening their own.
+
+    Read-only scopes run on the separate query_only read pool against a
+    WAL snapshot and never flush or commit, so a write scope cannot join
+    one and raises instead. Sessions are per thread/context, so concurrent
+    callers never share one.
+    """
+    session = _current_session.get()
+    if session is not None:
+        if not read_only and session.info["read_only"]:
+            raise RuntimeError("A write unit of work cannot be nested inside a read-only one")
+        yield session
+        return
+
+    session = Session(
+        read_engine if read_only else engine,
+        autoflush=not read_only,
+        expire_on_commit=False,
+    )
+    session.info["read_only"] = read_only
+    token = _current_session.set(session)
+    try:
         yield session
+        # Read-only scopes just close: a rollback would expire the loaded objects.
+        if not read_only:
+            session.commit()
+    except Exception:
+        session.rollback()
+        session.info.pop("after_commit", None)
+        raise
+    finally:
+        _current_session.reset(token)
+        session.close()
+
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+def after_commit(session: Session, callback: Callable[[], None]):
+    """Run ``callback`` once the outermost unit of work has committed."""
+    session.info.setdefault("after_commit", []).append(callback)
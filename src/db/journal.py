@@ -0,0 +1,65 @@
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Dict, Iterator
+
+from utils.logger import get_logger
+
+logger = get_logger()
+
+JOURNAL_PATH = "storage/data/checkout.journal"
+
+# Every entry is framed as <payload length><crc32 of payload><payload>.
+_HEADER = struct.Struct("<II")
+
+
+class CheckoutJournal:
+    """Append-only, checksummed log of checkout records.
+
+    Appends are fsynced before they return, so an entry that was appended
+    survives a crash. A torn or corrupt tail (e.g. power loss mid-write) is
+    detected by its checksum and ignored on read.
+    """
+
+    def __init__(self, path: str = JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "ab")
+
+    def append(self, record: Dict[str, Any]):
+        payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+        frame = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            self._file.write(frame)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def entries(self) -> Iterator[Dict[str, Any]]:
+        """Yield every intact entry, stopping at the first torn or corrupt frame."""
+        with open(self.path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if not header:
+                    return
+                if len(header) < _HEADER.size:
+                    logger.warning("Checkout journal ends with a torn header; ignoring tail")
+                    return
+                length, checksum = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    logger.warning("Checkout journal has a corrupt entry; ignoring tail")
+                    return
+                yield json.loads(payload)
+
+    def truncate(self):
+        with self._lock:
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
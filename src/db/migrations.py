@@ -0,0 +1,574 @@
+"""Versioned schema migrations.
+
+The schema version lives in a one-row ``schema_version`` table, so a launch
+with nothing pending costs a single read. Pending migrations run in order,
+each in its own IMMEDIATE transaction together with the version bump, so a
+failure leaves the database at the previous version.
+
+A migration that has to touch every row of a big table adds a ``backfill``.
+The backfill runs in batches, each in its own short transaction with a
+pause after it, so other terminals on the same file keep selling while it
+runs. The version row marks the migration incomplete until the backfill
+reports no rows left, so an interrupted backfill resumes on the next
+launch. Both parts must be idempotent: columns are only added when
+missing, and tables, indexes and triggers use IF NOT EXISTS.
+
+Databases that predate versioning are brought to the first versioned
+schema by the baseline migration. A brand-new file is created from the
+models and stamped with the latest version straight away.
+
+To change the schema, edit the model and append a Migration that makes the
+same change on existing databases, with its DDL written out in full.
+Released migrations are never edited.
+"""
+from __future__ import annotations
+
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+
+# A new database is created from the metadata, so every model has to be on it.
+import models.audit  # noqa: F401
+import models.change_log  # noqa: F401
+import models.heatmap  # noqa: F401
+import models.inventory_stats  # noqa: F401
+import models.item  # noqa: F401
+import models.maintenance  # noqa: F401
+import models.payment  # noqa: F401
+import models.reservation  # noqa: F401
+import models.sale  # noqa: F401
+import models.stock_alert  # noqa: F401
+import models.user  # noqa: F401
+import models.velocity  # noqa: F401
+from utils.clock import to_epoch
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# Rows per backfill transaction, and the pause that lets other writers in between.
+BATCH_SIZE = 5000
+BATCH_PAUSE = 0.05
+
+_CREATE_VERSION_TABLE = text(
+    "CREATE TABLE IF NOT EXISTS schema_version ("
+    " id INTEGER PRIMARY KEY CHECK (id = 1),"
+    " version INTEGER NOT NULL,"
+    " complete BOOLEAN NOT NULL,"
+    " updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+)
+_READ_VERSION = text("SELECT version, complete FROM schema_version WHERE id = 1")
+_WRITE_VERSION = text(
+    "INSERT INTO schema_version (id, version, complete, updated_at)"
+    " VALUES (1, :version, :complete, CURRENT_TIMESTAMP)"
+    " ON CONFLICT (id) DO UPDATE SET version = excluded.version,"
+    " complete = excluded.complete, updated_at = excluded.updated_at"
+)
+_VERSION_TABLE_EXISTS = text("SELECT 1 FROM sqlite_schema WHERE type = 'table' AND name = 'schema_version'")
+_USER_TABLES = text("SELECT count(*) FROM sqlite_schema WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+
+
+@dataclass(frozen=True, slots=True)
+class Migration:
+    version: int
+    description: str
+    # Schema changes; runs in one transaction with the version bump.
+    upgrade: Callable[[Connection], None]
+    # One batch of row updates per call, returning the rows it touched;
+    # called until it returns 0.
+    backfill: Optional[Callable[[Connection], int]] = None
+
+
+# Helpers ----------------------------------------------------------------------------
+
+def table_columns(conn: Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")')]
+
+
+def add_column(conn: Connection, table: str, column: str, definition: str):
+    """``ALTER TABLE ADD COLUMN``, unless the column already exists.
+
+    ``definition`` is the literal column DDL. SQLite needs a constant
+    default for NOT NULL columns.
+    """
+    if column in table_columns(conn, table):
+        return
+    conn.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {definition}')
+    logger.info(f"Added column {table}.{column}")
+
+
+def execute_all(conn: Connection, statements: Iterable[str]):
+    for statement in statements:
+        conn.exec_driver_sql(statement)
+
+
+def backfill_batch(conn: Connection, table: str, assignments: str, where: str, batch_size: int = BATCH_SIZE) -> int:
+    """Apply ``SET assignments`` to at most ``batch_size`` rows matching ``where``.
+
+    ``where`` must stop matching a row once it has been updated, so that
+    repeated calls make progress and finish at 0.
+    """
+    result = conn.exec_driver_sql(
+        f'UPDATE "{table}" SET {assignments} WHERE rowid IN '
+        f'(SELECT rowid FROM "{table}" WHERE {where} LIMIT {int(batch_size)})'
+    )
+    return result.rowcount
+
+
+# Migrations -------------------------------------------------------------------------
+#
+# The DDL is written out as it was when each migration shipped, never taken
+# from the models: a migration must do the same thing however the models
+# change later.
+
+# Columns of the first release's tables that ALTER TABLE can add (nullable,
+# or with a constant default), so databases lacking any of them catch up.
+_V1_COLUMNS = (
+    ("product", "description", "VARCHAR"),
+    ("product", "cost_price", "FLOAT NOT NULL DEFAULT 0.0"),
+    ("product", "category", "VARCHAR"),
+    ("product", "reorder_point", "INTEGER NOT NULL DEFAULT 5"),
+    ("product", "in_stock", "BOOLEAN NOT NULL DEFAULT 1"),
+    ("sale", "tax", "FLOAT NOT NULL DEFAULT 0.0"),
+    ("sale", "discount", "FLOAT NOT NULL DEFAULT 0.0"),
+    ("sale", "status", "VARCHAR NOT NULL DEFAULT 'completed'"),
+    ("sale", "adjusts_sale_id", 'CHAR(32) REFERENCES "sale" ("id")'),
+    ("saleitem", "cost_price", "FLOAT NOT NULL DEFAULT 0.0"),
+    ("payment", "sale_id", 'CHAR(32) REFERENCES "sale" ("id")'),
+    ("payment", "currency", "VARCHAR NOT NULL DEFAULT 'USD'"),
+    ("payment", "status", "VARCHAR(9) NOT NULL DEFAULT 'PENDING'"),
+    ("payment", "transaction_id", "VARCHAR"),
+    ("user", "role", "VARCHAR(17) NOT NULL DEFAULT 'USER'"),
+    ("user", "pin_hash", "VARCHAR"),
+    ("user", "is_active", "BOOLEAN NOT NULL DEFAULT 1"),
+)
+
+_V1_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS product (
+        id CHAR(32) NOT NULL,
+        name VARCHAR NOT NULL,
+        description VARCHAR,
+        price FLOAT NOT NULL,
+        cost_price FLOAT NOT NULL,
+        category VARCHAR,
+        quantity INTEGER NOT NULL,
+        reorder_point INTEGER NOT NULL,
+        in_stock BOOLEAN NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sale (
+        id CHAR(32) NOT NULL,
+        total_amount FLOAT NOT NULL,
+        tax FLOAT NOT NULL,
+        discount FLOAT NOT NULL,
+        created_at DATETIME NOT NULL,
+        status VARCHAR NOT NULL,
+        adjusts_sale_id CHAR(32),
+        PRIMARY KEY (id),
+        FOREIGN KEY(adjusts_sale_id) REFERENCES sale (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS saleitem (
+        id CHAR(32) NOT NULL,
+        sale_id CHAR(32) NOT NULL,
+        product_id CHAR(32) NOT NULL,
+        quantity INTEGER NOT NULL,
+        unit_price FLOAT NOT NULL,
+        cost_price FLOAT NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(sale_id) REFERENCES sale (id),
+        FOREIGN KEY(product_id) REFERENCES product (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS payment (
+        id CHAR(32) NOT NULL,
+        sale_id CHAR(32),
+        amount FLOAT NOT NULL,
+        currency VARCHAR NOT NULL,
+        payment_method VARCHAR(13) NOT NULL,
+        status VARCHAR(9) NOT NULL,
+        transaction_id VARCHAR,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(sale_id) REFERENCES sale (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user (
+        id CHAR(32) NOT NULL,
+        username VARCHAR NOT NULL,
+        role VARCHAR(17) NOT NULL,
+        email VARCHAR NOT NULL,
+        password_hash VARCHAR NOT NULL,
+        pin_hash VARCHAR,
+        is_active BOOLEAN NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS auditentry (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+        occurred_at DATETIME NOT NULL,
+        actor_id CHAR(32),
+        actor_name VARCHAR,
+        action VARCHAR NOT NULL,
+        entity VARCHAR NOT NULL,
+        entity_id VARCHAR,
+        "before" VARCHAR,
+        "after" VARCHAR
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS changelogentry (
+        seq INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+        entity VARCHAR NOT NULL,
+        entity_id CHAR(32) NOT NULL,
+        op VARCHAR(6) NOT NULL,
+        payload VARCHAR,
+        created_at DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS changelogstate (
+        id INTEGER NOT NULL,
+        compacted_through INTEGER NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inventorystats (
+        id INTEGER NOT NULL,
+        product_count INTEGER NOT NULL,
+        inventory_value FLOAT NOT NULL,
+        low_stock_count INTEGER NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS maintenancerun (
+        id INTEGER NOT NULL,
+        task VARCHAR NOT NULL,
+        started_at DATETIME NOT NULL,
+        duration_ms FLOAT NOT NULL,
+        status VARCHAR NOT NULL,
+        reclaimed_bytes INTEGER NOT NULL,
+        detail VARCHAR,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS productvelocity (
+        product_id CHAR(32) NOT NULL,
+        units_7d INTEGER NOT NULL,
+        units_28d INTEGER NOT NULL,
+        units_90d INTEGER NOT NULL,
+        avg_daily_7d FLOAT NOT NULL,
+        avg_daily_28d FLOAT NOT NULL,
+        daily_demand FLOAT NOT NULL,
+        reorder_point INTEGER NOT NULL,
+        last_sale_at DATETIME,
+        computed_at DATETIME NOT NULL,
+        PRIMARY KEY (product_id),
+        FOREIGN KEY(product_id) REFERENCES product (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS salesheatmapday (
+        day DATE NOT NULL,
+        revenue BLOB NOT NULL,
+        transactions BLOB NOT NULL,
+        PRIMARY KEY (day)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stockalert (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+        product_id CHAR(32) NOT NULL,
+        quantity INTEGER NOT NULL,
+        reorder_point INTEGER NOT NULL,
+        created_at DATETIME NOT NULL,
+        delivered BOOLEAN NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stockreservation (
+        cart_id CHAR(32) NOT NULL,
+        product_id CHAR(32) NOT NULL,
+        quantity INTEGER NOT NULL,
+        expires_at DATETIME NOT NULL,
+        PRIMARY KEY (cart_id, product_id)
+    )
+    """,
+)
+
+_V1_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_product_category ON product (category)",
+    "CREATE INDEX IF NOT EXISTS ix_product_low_stock ON product (quantity) WHERE quantity < reorder_point",
+    "CREATE INDEX IF NOT EXISTS ix_sale_adjusts_sale_id ON sale (adjusts_sale_id)",
+    "CREATE INDEX IF NOT EXISTS ix_sale_created_at_id ON sale (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_sale_status_created_at ON sale (status, created_at, id, total_amount)",
+    "CREATE INDEX IF NOT EXISTS ix_saleitem_product_id ON saleitem (product_id)",
+    "CREATE INDEX IF NOT EXISTS ix_saleitem_sale_product_totals"
+    " ON saleitem (sale_id, product_id, quantity, unit_price, cost_price)",
+    "CREATE INDEX IF NOT EXISTS ix_payment_sale_method ON payment (sale_id, payment_method)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_user_username ON user (username)",
+    "CREATE INDEX IF NOT EXISTS ix_auditentry_actor_time ON auditentry (actor_id, occurred_at)",
+    "CREATE INDEX IF NOT EXISTS ix_auditentry_entity_time ON auditentry (entity, entity_id, occurred_at)",
+    "CREATE INDEX IF NOT EXISTS ix_auditentry_occurred_at ON auditentry (occurred_at)",
+    "CREATE INDEX IF NOT EXISTS ix_changelogentry_entity_id ON changelogentry (entity_id)",
+    "CREATE INDEX IF NOT EXISTS ix_maintenancerun_task_time ON maintenancerun (task, started_at)",
+    "CREATE INDEX IF NOT EXISTS ix_stockalert_pending ON stockalert (id) WHERE delivered = 0",
+    "CREATE INDEX IF NOT EXISTS ix_stockalert_product_id ON stockalert (product_id)",
+    "CREATE INDEX IF NOT EXISTS ix_stockreservation_expires_at ON stockreservation (expires_at)",
+    "CREATE INDEX IF NOT EXISTS ix_stockreservation_product_expiry"
+    " ON stockreservation (product_id, expires_at, quantity)",
+)
+
+# Seeded before the stats triggers exist, so no row is counted twice.
+_V1_SEED_AND_TRIGGERS = (
+    """
+    INSERT OR IGNORE INTO inventorystats (id, product_count, inventory_value, low_stock_count)
+    SELECT 1, COUNT(*), COALESCE(SUM(price * quantity), 0.0), COALESCE(SUM(quantity < reorder_point), 0)
+    FROM product
+    WHERE NOT EXISTS (SELECT 1 FROM inventorystats)
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS auditentry_no_update BEFORE UPDATE ON auditentry
+    BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS auditentry_no_delete BEFORE DELETE ON auditentry
+    BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_stats_insert AFTER INSERT ON product
+    BEGIN
+        UPDATE inventorystats SET
+            product_count = product_count + 1,
+            inventory_value = inventory_value + NEW.price * NEW.quantity,
+            low_stock_count = low_stock_count + (NEW.quantity < NEW.reorder_point)
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_stats_update
+    AFTER UPDATE OF price, quantity, reorder_point ON product
+    BEGIN
+        UPDATE inventorystats SET
+            inventory_value = inventory_value + NEW.price * NEW.quantity - OLD.price * OLD.quantity,
+            low_stock_count = low_stock_count
+                + (NEW.quantity < NEW.reorder_point) - (OLD.quantity < OLD.reorder_point)
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_stats_delete AFTER DELETE ON product
+    BEGIN
+        UPDATE inventorystats SET
+            product_count = product_count - 1,
+            inventory_value = inventory_value - OLD.price * OLD.quantity,
+            low_stock_count = low_stock_count - (OLD.quantity < OLD.reorder_point)
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_low_stock_insert AFTER INSERT ON product
+    WHEN NEW.quantity < NEW.reorder_point
+    BEGIN
+        INSERT INTO stockalert (product_id, quantity, reorder_point, created_at, delivered)
+        VALUES (NEW.id, NEW.quantity, NEW.reorder_point, strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'), 0);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_low_stock_update
+    AFTER UPDATE OF quantity, reorder_point ON product
+    WHEN NEW.quantity < NEW.reorder_point AND OLD.quantity >= OLD.reorder_point
+    BEGIN
+        INSERT INTO stockalert (product_id, quantity, reorder_point, created_at, delivered)
+        VALUES (NEW.id, NEW.quantity, NEW.reorder_point, strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'), 0);
+    END
+    """,
+)
+
+
+def _baseline(conn: Connection):
+    # Databases from before versioning. Columns go first, so the triggers
+    # created afterwards find them.
+    existing = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_schema WHERE type = 'table'")}
+    for table, column, definition in _V1_COLUMNS:
+        if table in existing:
+            add_column(conn, table, column, definition)
+    execute_all(conn, _V1_TABLES)
+    execute_all(conn, _V1_INDEXES)
+    execute_all(conn, _V1_SEED_AND_TRIGGERS)
+
+
+def _add_sale_epoch(conn: Connection):
+    add_column(conn, "sale", "created_at_epoch", "INTEGER")
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_sale_status_epoch ON sale (status, created_at_epoch, total_amount)"
+    )
+
+
+def _backfill_sale_epoch(conn: Connection) -> int:
+    # Existing created_at values are store wall-clock time (checkout always
+    # stamped them with the local clock), converted the same way new sales are.
+    rows = conn.exec_driver_sql(
+        f"SELECT rowid, created_at FROM sale WHERE created_at_epoch IS NULL LIMIT {BATCH_SIZE}"
+    ).all()
+    if rows:
+        conn.exec_driver_sql(
+            "UPDATE sale SET created_at_epoch = ? WHERE rowid = ?",
+            [(to_epoch(datetime.fromisoformat(created_at)), rowid) for rowid, created_at in rows],
+        )
+    return len(rows)
+
+
+def _widen_sale_epoch_index(conn: Connection):
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_sale_status_epoch")
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_sale_status_epoch ON sale (status, created_at_epoch, id, total_amount)"
+    )
+
+
+def _add_manual_reorder_point(conn: Connection):
+    add_column(conn, "product", "reorder_point_manual", "BOOLEAN NOT NULL DEFAULT 0")
+
+
+def _index_sales_by_epoch(conn: Connection):
+    # Nothing filters or orders sales on the text created_at any more.
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_sale_status_created_at")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_sale_created_at_id")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_sale_epoch_id ON sale (created_at_epoch, id)")
+
+
+def _utc_stock_alert_times(conn: Connection):
+    execute_all(conn, (
+        "DROP TRIGGER IF EXISTS product_low_stock_insert",
+        "DROP TRIGGER IF EXISTS product_low_stock_update",
+        """
+        CREATE TRIGGER product_low_stock_insert AFTER INSERT ON product
+        WHEN NEW.quantity < NEW.reorder_point
+        BEGIN
+            INSERT INTO stockalert (product_id, quantity, reorder_point, created_at, delivered)
+            VALUES (NEW.id, NEW.quantity, NEW.reorder_point, strftime('%Y-%m-%d %H:%M:%S', 'now'), 0);
+        END
+        """,
+        """
+        CREATE TRIGGER product_low_stock_update
+        AFTER UPDATE OF quantity, reorder_point ON product
+        WHEN NEW.quantity < NEW.reorder_point AND OLD.quantity >= OLD.reorder_point
+        BEGIN
+            INSERT INTO stockalert (product_id, quantity, reorder_point, created_at, delivered)
+            VALUES (NEW.id, NEW.quantity, NEW.reorder_point, strftime('%Y-%m-%d %H:%M:%S', 'now'), 0);
+        END
+        """,
+    ))
+
+
+MIGRATIONS: Tuple[Migration, ...] = (
+    Migration(1, "baseline: bring pre-versioning databases up to the first versioned schema", _baseline),
+    Migration(2, "sale.created_at_epoch for integer trend bucketing", _add_sale_epoch, _backfill_sale_epoch),
+    Migration(3, "sale.id in ix_sale_status_epoch for epoch-windowed joins", _widen_sale_epoch_index),
+    Migration(4, "product.reorder_point_manual so velocity keeps hand-set reorder points", _add_manual_reorder_point),
+    Migration(5, "sales history and exports keyed on created_at_epoch", _index_sales_by_epoch),
+    Migration(6, "stock alert triggers stamp UTC like utc_now()", _utc_stock_alert_times),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# Runner -----------------------------------------------------------------------------
+
+def current_version(engine: Engine) -> Tuple[int, bool]:
+    """``(version, complete)``; ``(0, True)`` for a database without a version row."""
+    with engine.connect() as conn:
+        # Straight on the driver connection: an autocommit read that does
+        # not open the writer's IMMEDIATE transaction.
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            row = cursor.execute("SELECT version, complete FROM schema_version WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:
+            return 0, True
+        finally:
+            cursor.close()
+    return (row[0], bool(row[1])) if row else (0, True)
+
+
+def migrate(engine: Engine) -> int:
+    """Bring the database to LATEST_VERSION. Returns the number of migrations applied."""
+    version, complete = current_version(engine)
+    if _is_applied(LATEST_VERSION, version, complete):
+        return 0
+
+    applied = 0
+    for migration in MIGRATIONS:
+        if _is_applied(migration.version, version, complete):
+            continue
+        with engine.begin() as conn:
+            # Re-read under the write lock: another terminal may have got here first.
+            version, complete = _read_version(conn)
+            if version == 0 and conn.execute(_USER_TABLES).scalar() == 0:
+                SQLModel.metadata.create_all(conn)
+                _write_version(conn, LATEST_VERSION, True)
+                logger.info(f"Created database schema at version {LATEST_VERSION}")
+                return applied + 1
+            if _is_applied(migration.version, version, complete):
+                continue
+            # A migration at the current, incomplete version only has its backfill left.
+            if migration.version > version:
+                started = time.perf_counter()
+                migration.upgrade(conn)
+                _write_version(conn, migration.version, migration.backfill is None)
+                logger.info(
+                    f"Applied migration {migration.version} ({migration.description}) "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+        if migration.backfill is not None:
+            _run_backfill(engine, migration)
+        version, complete = migration.version, True
+        applied += 1
+    return applied
+
+
+def _is_applied(target: int, version: int, complete: bool) -> bool:
+    return target < version or (target == version and complete)
+
+
+def _run_backfill(engine: Engine, migration: Migration):
+    started, total = time.perf_counter(), 0
+    while True:
+        with engine.begin() as conn:
+            rows = migration.backfill(conn)
+            if not rows:
+                _write_version(conn, migration.version, True)
+                break
+        total += rows
+        time.sleep(BATCH_PAUSE)
+    logger.info(
+        f"Backfilled {total} rows for migration {migration.version} "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+
+
+def _read_version(conn: Connection) -> Tuple[int, bool]:
+    if conn.execute(_VERSION_TABLE_EXISTS).first() is None:
+        return 0, True
+    row = conn.execute(_READ_VERSION).first()
+    return (row[0], bool(row[1])) if row else (0, True)
+
+
+def _write_version(conn: Connection, version: int, complete: bool):
+    conn.execute(_CREATE_VERSION_TABLE)
+    conn.execute(_WRITE_VERSION, {"version": version, "complete": complete})
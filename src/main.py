@@ -1,13 +1,35 @@
 import flet as ft
+import atexit
+import multiprocessing
+import os
+import threading
 from db.conn import init_db
+from controllers import velocity
+from controllers import heatmap
+from controllers.fast_checkout import start_fast_checkout, stop_fast_checkout
+from controllers import sync, inventory_stats
+from controllers.reports import shutdown_report_queue
+from controllers.authentication import auth
+from controllers.authorization import authz
+from controllers.audit import audit
+from controllers.stock_alerts import stock_alerts
+from controllers.reservations import reservations
+from controllers.maintenance import maintenance
+from controllers.backup import backups
 from components.product_section import ProductSection
 from components.payment_section import PaymentSection
 from components.status_section import StatusSection
 from components.report_section import ReportSection
+from components.login_section import LoginSection
+from utils.events import bus, Debouncer, LowStockAlert
+from utils.theme import AppColors
 from utils.logger import get_logger
 
 logger = get_logger()
 
+# Journal checkouts and commit them in the background (see controllers/fast_checkout.py).
+FAST_CHECKOUT = os.environ.get("HYPERSPIN_FAST_CHECKOUT", "0") == "1"
+
 def main(page: ft.Page):
     page.title = "HyperSpin POS"
     page.theme_mode = ft.ThemeMode.LIGHT
@@ -20,6 +42,38 @@ def main(page: ft.Page):
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
 
+    if FAST_CHECKOUT:
+        try:
+            start_fast_checkout()
+            atexit.register(stop_fast_checkout)
+            logger.info("Fast checkout enabled")
+        except Exception as e:
+            logger.error(f"Failed to start fast checkout, using direct commits: {e}")
+
+    # Refresh reorder points off the UI thread, then hourly so old sales age
+    # out of the windows; create_sale keeps them moving in between.
+    velocity.start_recompute()
+
+    sync.start_compaction()
+
+    # Audit events are buffered; the final flush runs at exit.
+    audit.start()
+    atexit.register(audit.stop)
+
+    # Report workers are only spawned on the first export.
+    atexit.register(shutdown_report_queue)
+    atexit.register(auth.shutdown)
+
+    # Repair the running inventory aggregates if anything wrote around the triggers.
+    threading.Thread(target=inventory_stats.check, daemon=True).start()
+
+    # Databases created before the sales heatmap existed need a one-off backfill.
+    try:
+        if heatmap.is_empty():
+            threading.Thread(target=heatmap.rebuild, kwargs={"only_if_empty": True}, daemon=True).start()
+    except Exception as e:
+        logger.error(f"Failed to check sales heatmap: {e}")
+
     # Initialize Sections
     payment_section = PaymentSection()
     product_section = ProductSection()
@@ -31,7 +85,7 @@ def main(page: ft.Page):
         if index == 0:
             status_section.load_data()
         elif index == 1:
-            payment_section.load_products()
+            payment_section.sync_products()
         elif index == 2:
             product_section.load_products()
         elif index == 3:
@@ -67,12 +121,81 @@ def main(page: ft.Page):
         expand=True,
     )
 
-    page.add(
-        ft.SafeArea(
-            t,
-            expand=True,
-        )
-    )
+    def show_low_stock_alerts(events):
+        names = list(dict.fromkeys(event.name for event in events))
+        if len(names) == 1:
+            event = events[-1]
+            message = f"Low stock: {event.name} ({event.quantity} left, reorder at {event.reorder_point})"
+        else:
+            message = f"Low stock: {', '.join(names[:3])}" + (f" and {len(names) - 3} more" if len(names) > 3 else "")
+
+        def view(e):
+            t.selected_index = 0
+            page.update()
+            status_section.open_low_stock_dialog(e)
+
+        page.open(ft.SnackBar(
+            content=ft.Text(message),
+            bgcolor=AppColors.WARNING,
+            action="View",
+            on_action=view,
+        ))
+
+    # Alerts are raised at write time; a burst (e.g. a reorder-point
+    # recompute) becomes one notification.
+    bus.subscribe(LowStockAlert, Debouncer(show_low_stock_alerts, delay=0.5))
+    stock_alerts.start()
+    atexit.register(stock_alerts.stop)
+
+    # Expired cart holds already stop counting; the sweep just deletes them.
+    reservations.start()
+    atexit.register(reservations.stop)
+
+    # ANALYZE, optimize, vacuum and checkpoints while no checkout is running.
+    maintenance.start()
+    atexit.register(maintenance.stop)
+    backups.start()
+    atexit.register(backups.stop)
+
+    terminal = ft.SafeArea(t, expand=True)
+    operator_text = ft.Text(color=AppColors.TEXT_INVERSE)
+
+    def show_terminal():
+        page.controls[:] = [terminal]
+        if auth.active:
+            operator_text.value = f"{auth.active.username} ({auth.active.role.value})"
+            page.appbar = ft.AppBar(
+                title=ft.Text("HyperSpin POS"),
+                bgcolor=AppColors.PRIMARY,
+                color=AppColors.TEXT_INVERSE,
+                actions=[
+                    operator_text,
+                    ft.IconButton(ft.Icons.LOGOUT, tooltip="Log out", icon_color=AppColors.TEXT_INVERSE, on_click=log_out),
+                ],
+            )
+        page.update()
+        status_section.load_data()
+
+    def show_login():
+        login_section.reset()
+        page.appbar = None
+        page.controls[:] = [login_section]
+        page.update()
+
+    def log_out(e):
+        auth.end_shift()
+        show_login()
+
+    # Every guarded action needs a logged-in operator unless the terminal
+    # was explicitly set up for single-operator mode.
+    login_section = LoginSection(on_login=lambda auth_session: show_terminal())
+    if authz.single_operator or auth.active:
+        show_terminal()
+    else:
+        show_login()
 
 if __name__ == "__main__":
+    # Report workers are spawned processes; in a frozen build they start by
+    # re-running this executable and must not launch the app again.
+    multiprocessing.freeze_support()
     ft.app(target=main)
@@ -0,0 +1,40 @@
+from sqlalchemy import DDL, Index, event
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+import uuid
+
+from utils.clock import utc_now
+
+class AuditEntry(SQLModel, table=True):
+    """One privileged mutation: who did what to which entity, before and after.
+
+    Append-only: triggers reject UPDATE and DELETE on the table.
+    """
+    __table_args__ = (
+        Index("ix_auditentry_actor_time", "actor_id", "occurred_at"),
+        Index("ix_auditentry_entity_time", "entity", "entity_id", "occurred_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # UTC, so the append-only log stays in one zone across DST and timezone changes.
+    occurred_at: datetime = Field(default_factory=utc_now, index=True)
+    # None when the terminal runs without a logged-in operator.
+    actor_id: Optional[uuid.UUID] = None
+    actor_name: Optional[str] = None
+    action: str
+    entity: str
+    entity_id: Optional[str] = None
+    before: Optional[str] = None  # JSON
+    after: Optional[str] = None  # JSON
+
+    def __repr__(self):
+        return f"AuditEntry(id={self.id}, action={self.action}, entity={self.entity}, entity_id={self.entity_id}, actor={self.actor_name})"
+
+for _operation in ("UPDATE", "DELETE"):
+    event.listen(AuditEntry.__table__, "after_create", DDL(
+        f"CREATE TRIGGER IF NOT EXISTS auditentry_no_{_operation.lower()} "
+        f"BEFORE {_operation} ON auditentry "
+        "BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END"
+    ))
@@ -0,0 +1,32 @@
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+import uuid
+
+from utils.clock import utc_now
+
+class ChangeOp(str, Enum):
+    UPSERT = "upsert"
+    STOCK = "stock"
+    DELETE = "delete"
+
+class ChangeLogEntry(SQLModel, table=True):
+    # AUTOINCREMENT so compaction never lets a sequence number be reused.
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq: Optional[int] = Field(default=None, primary_key=True)
+    entity: str = Field(default="product")
+    entity_id: uuid.UUID = Field(index=True)
+    op: ChangeOp
+    payload: Optional[str] = None
+    # UTC, like the tombstone retention cutoff in controllers/sync.py.
+    created_at: datetime = Field(default_factory=utc_now)
+
+    def __repr__(self):
+        return f"ChangeLogEntry(seq={self.seq}, entity={self.entity}, entity_id={self.entity_id}, op={self.op})"
+
+class ChangeLogState(SQLModel, table=True):
+    id: int = Field(default=1, primary_key=True)
+    # Sequence numbers at or below this may have been compacted away.
+    compacted_through: int = 0
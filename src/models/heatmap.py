@@ -0,0 +1,39 @@
+from sqlmodel import SQLModel, Field
+from datetime import date
+from typing import List
+import struct
+
+HOURS_PER_DAY = 24
+
+# Fixed little-endian layouts keep the blobs portable between platforms.
+_REVENUE_CELLS = struct.Struct(f"<{HOURS_PER_DAY}d")
+_TRANSACTION_CELLS = struct.Struct(f"<{HOURS_PER_DAY}I")
+
+class SalesHeatmapDay(SQLModel, table=True):
+    """Per-hour revenue and transaction counts for one calendar day.
+
+    Each row holds 24 packed cells, so a year of history is 365 small rows
+    regardless of how many sales were made.
+    """
+    day: date = Field(primary_key=True)
+    revenue: bytes = Field(default_factory=lambda: _REVENUE_CELLS.pack(*([0.0] * HOURS_PER_DAY)))
+    transactions: bytes = Field(default_factory=lambda: _TRANSACTION_CELLS.pack(*([0] * HOURS_PER_DAY)))
+
+    def revenue_cells(self) -> List[float]:
+        return list(_REVENUE_CELLS.unpack(self.revenue))
+
+    def transaction_cells(self) -> List[int]:
+        return list(_TRANSACTION_CELLS.unpack(self.transactions))
+
+    def add(self, hour: int, amount: float, transactions: int = 1):
+        revenue = self.revenue_cells()
+        counts = self.transaction_cells()
+        revenue[hour] += amount
+        # Cells are unsigned: a void of a sale the heatmap never counted
+        # (synced in, or made before a rebuild) must not push one below zero.
+        counts[hour] = max(0, counts[hour] + transactions)
+        self.revenue = _REVENUE_CELLS.pack(*revenue)
+        self.transactions = _TRANSACTION_CELLS.pack(*counts)
+
+    def __repr__(self):
+        return f"SalesHeatmapDay(day={self.day}, transactions={sum(self.transaction_cells())})"
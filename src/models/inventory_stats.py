@@ -0,0 +1,67 @@
+from sqlalchemy import DDL, event
+from sqlmodel import SQLModel, Field
+
+class InventoryStats(SQLModel, table=True):
+    """Running catalog aggregates, one row (id=1).
+
+    Kept exact by triggers on ``product``, so every writer, including
+    set-based updates that never load a Product, moves them in the same
+    transaction. A dashboard read is a primary-key lookup however large the
+    catalog is; controllers.inventory_stats can check and rebuild them.
+    """
+    id: int = Field(default=1, primary_key=True)
+    product_count: int = 0
+    inventory_value: float = 0.0
+    # Products with quantity below their reorder point.
+    low_stock_count: int = 0
+
+    def __repr__(self):
+        return f"InventoryStats(products={self.product_count}, value={self.inventory_value}, low_stock={self.low_stock_count})"
+
+_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS product_stats_insert AFTER INSERT ON product
+    BEGIN
+        UPDATE inventorystats SET
+            product_count = product_count + 1,
+            inventory_value = inventory_value + NEW.price * NEW.quantity,
+            low_stock_count = low_stock_count + (NEW.quantity < NEW.reorder_point)
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_stats_update
+    AFTER UPDATE OF price, quantity, reorder_point ON product
+    BEGIN
+        UPDATE inventorystats SET
+            inventory_value = inventory_value + NEW.price * NEW.quantity - OLD.price * OLD.quantity,
+            low_stock_count = low_stock_count
+                + (NEW.quantity < NEW.reorder_point) - (OLD.quantity < OLD.reorder_point)
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_stats_delete AFTER DELETE ON product
+    BEGIN
+        UPDATE inventorystats SET
+            product_count = product_count - 1,
+            inventory_value = inventory_value - OLD.price * OLD.quantity,
+            low_stock_count = low_stock_count - (OLD.quantity < OLD.reorder_point)
+        WHERE id = 1;
+    END
+    """,
+)
+
+# Seeds the row from the catalog the first time. Afterwards the constant
+# NOT EXISTS term is false before the scan starts, so this costs nothing.
+_SEED = """
+    INSERT OR IGNORE INTO inventorystats (id, product_count, inventory_value, low_stock_count)
+    SELECT 1, COUNT(*), COALESCE(SUM(price * quantity), 0.0), COALESCE(SUM(quantity < reorder_point), 0)
+    FROM product
+    WHERE NOT EXISTS (SELECT 1 FROM inventorystats)
+"""
+
+# On the metadata rather than the table: existing databases gain the table
+# without ``product`` being created again, and both must exist first.
+for _statement in (_SEED, *_TRIGGERS):
+    event.listen(SQLModel.metadata, "after_create", DDL(_statement))
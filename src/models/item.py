@@ -1,15 +1,27 @@
+from sqlalchemy import Index, text
 from sqlmodel import SQLModel, Field
 from typing import Optional
 import uuid
 
+DEFAULT_REORDER_POINT = 5
+
 class Product(SQLModel, table=True):
+    __table_args__ = (
+        # Only low-stock products are in this index, so the low-stock
+        # drill-down reads a handful of entries instead of the catalog.
+        Index("ix_product_low_stock", "quantity", sqlite_where=text("quantity < reorder_point")),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     name: str
     description: Optional[str] = None
     price: float
     cost_price: float = Field(default=0.0)
-    category: Optional[str] = None
+    category: Optional[str] = Field(default=None, index=True)
     quantity: int
+    reorder_point: int = Field(default=DEFAULT_REORDER_POINT)
+    # Set when a manager chose the reorder point; velocity then leaves it alone.
+    reorder_point_manual: bool = False
     in_stock: bool = True
 
     def __repr__(self):
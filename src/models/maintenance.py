@@ -0,0 +1,24 @@
+from sqlalchemy import Index
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+
+from utils.clock import utc_now
+
+class MaintenanceRun(SQLModel, table=True):
+    """One run of a database maintenance task (see controllers/maintenance.py)."""
+    __table_args__ = (
+        Index("ix_maintenancerun_task_time", "task", "started_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    task: str
+    started_at: datetime = Field(default_factory=utc_now)
+    duration_ms: float = 0.0
+    # ok, skipped, interrupted (ran into the blocking budget) or failed.
+    status: str = "ok"
+    reclaimed_bytes: int = 0
+    detail: Optional[str] = None
+
+    def __repr__(self):
+        return f"MaintenanceRun(task={self.task}, status={self.status}, duration_ms={self.duration_ms:.1f}, reclaimed_bytes={self.reclaimed_bytes})"
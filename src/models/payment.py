@@ -1,9 +1,12 @@
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List
 from enum import Enum
 from datetime import datetime
 import uuid
 
+from utils.clock import store_now
+
 class PaymentStatus(str, Enum):
     PENDING = "pending"
     COMPLETED = "completed"
@@ -17,6 +20,11 @@ class PaymentMethod(str, Enum):
     CASH = "cash"
 
 class Payment(SQLModel, table=True):
+    __table_args__ = (
+        # Sale -> payment lookups, including the sales-history method filter.
+        Index("ix_payment_sale_method", "sale_id", "payment_method"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     sale_id: Optional[uuid.UUID] = Field(foreign_key="sale.id", default=None)
     amount: float
@@ -24,8 +32,8 @@ class Payment(SQLModel, table=True):
     payment_method: PaymentMethod
     status: PaymentStatus = Field(default=PaymentStatus.PENDING)
     transaction_id: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=store_now)
+    updated_at: datetime = Field(default_factory=store_now)
 
     def __repr__(self):
         return f"Payment(id={self.id}, amount={self.amount}, status={self.status}, created_at={self.created_at})"
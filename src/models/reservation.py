@@ -0,0 +1,21 @@
+from sqlalchemy import Index
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+import uuid
+
+class StockReservation(SQLModel, table=True):
+    """Units of a product held by an open cart until ``expires_at`` (UTC)."""
+    __table_args__ = (
+        # Live holds per product, summed from the index alone.
+        Index("ix_stockreservation_product_expiry", "product_id", "expires_at", "quantity"),
+        # The sweeper's range delete.
+        Index("ix_stockreservation_expires_at", "expires_at"),
+    )
+
+    cart_id: uuid.UUID = Field(primary_key=True)
+    product_id: uuid.UUID = Field(primary_key=True)
+    quantity: int
+    expires_at: datetime
+
+    def __repr__(self):
+        return f"StockReservation(cart_id={self.cart_id}, product_id={self.product_id}, quantity={self.quantity}, expires_at={self.expires_at})"
@@ -1,24 +1,72 @@
+from sqlalchemy import Index, event
 from sqlmodel import SQLModel, Field, Relationship
 from typing import List, Optional
 from datetime import datetime
+from enum import Enum
 import uuid
 
+from utils.clock import store_now, to_epoch
+
+class SaleStatus(str, Enum):
+    COMPLETED = "completed"
+    PARTIALLY_REFUNDED = "partially_refunded"
+    REFUNDED = "refunded"
+    VOIDED = "voided"
+    # Negative sale written by a refund or void; adjusts_sale_id names the original.
+    ADJUSTMENT = "adjustment"
+
+# Sales whose amounts count towards revenue, units and profit. Refunded and
+# voided sales keep their original amounts and are netted out by their
+# adjustment sales, so corrections land on the day they were made.
+COUNTED_STATUSES = tuple(status.value for status in SaleStatus)
+
+# Sales that count as customer transactions.
+TRANSACTION_STATUSES = (
+    SaleStatus.COMPLETED.value,
+    SaleStatus.PARTIALLY_REFUNDED.value,
+    SaleStatus.REFUNDED.value,
+)
+
+REFUNDABLE_STATUSES = (SaleStatus.COMPLETED.value, SaleStatus.PARTIALLY_REFUNDED.value)
+
 class Sale(SQLModel, table=True):
+    __table_args__ = (
+        # Keyset pagination of the sales history and exports on (created_at_epoch, id).
+        Index("ix_sale_epoch_id", "created_at_epoch", "id"),
+        # Dashboard window totals, trend bucketing and the join to SaleItem
+        # (one range per status), answered from the index alone.
+        Index("ix_sale_status_epoch", "status", "created_at_epoch", "id", "total_amount"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     total_amount: float
     tax: float = 0.0
     discount: float = 0.0
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    status: str = "completed"
-    
+    # Store wall-clock time (utils/clock.py).
+    created_at: datetime = Field(default_factory=store_now)
+    # The same instant as UTC epoch seconds; filled in on insert.
+    created_at_epoch: Optional[int] = None
+    status: str = SaleStatus.COMPLETED.value
+    adjusts_sale_id: Optional[uuid.UUID] = Field(default=None, foreign_key="sale.id", index=True)
+
     items: List["SaleItem"] = Relationship(back_populates="sale")
     # We will add the payment relationship after updating the Payment model to avoid circular imports issues if possible, 
     # but SQLModel handles string forward references well.
 
+@event.listens_for(Sale, "before_insert")
+def _set_created_at_epoch(mapper, connection, sale: Sale):
+    if sale.created_at_epoch is None:
+        sale.created_at_epoch = to_epoch(sale.created_at)
+
 class SaleItem(SQLModel, table=True):
+    __table_args__ = (
+        # Lets per-product and per-category breakdowns aggregate from the index alone.
+        Index("ix_saleitem_sale_product_totals", "sale_id", "product_id", "quantity", "unit_price", "cost_price"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     sale_id: uuid.UUID = Field(foreign_key="sale.id")
-    product_id: uuid.UUID = Field(foreign_key="product.id")
+    product_id: uuid.UUID = Field(foreign_key="product.id", index=True)
     quantity: int
     unit_price: float
     cost_price: float = 0.0
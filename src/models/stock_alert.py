@@ -0,0 +1,59 @@
+from sqlalchemy import DDL, Index, event, text
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+import uuid
+
+from utils.clock import utc_now
+
+class StockAlert(SQLModel, table=True):
+    """A product crossing below its reorder point.
+
+    Rows are queued by triggers on ``product`` inside the transaction that
+    moved the stock, so every writer raises them; the dispatcher in
+    controllers/stock_alerts.py publishes them once committed.
+    """
+    __table_args__ = (
+        # Undelivered alerts, the dispatcher's only query.
+        Index("ix_stockalert_pending", "id", sqlite_where=text("delivered = 0")),
+        {"sqlite_autoincrement": True},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    product_id: uuid.UUID = Field(index=True)
+    quantity: int
+    reorder_point: int
+    # UTC, from utc_now() or the trigger's strftime(..., 'now').
+    created_at: datetime = Field(default_factory=utc_now)
+    delivered: bool = False
+
+    def __repr__(self):
+        return f"StockAlert(id={self.id}, product_id={self.product_id}, quantity={self.quantity}, reorder_point={self.reorder_point})"
+
+# Only crossings raise an alert: a product that stays low while it keeps
+# selling does not repeat it.
+_ALERT_COLUMNS = "product_id, quantity, reorder_point, created_at, delivered"
+# DDL statements are %-formatted, hence the doubled percent signs.
+_ALERT_VALUES = "NEW.id, NEW.quantity, NEW.reorder_point, strftime('%%Y-%%m-%%d %%H:%%M:%%S', 'now'), 0"
+
+_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_low_stock_insert AFTER INSERT ON product
+    WHEN NEW.quantity < NEW.reorder_point
+    BEGIN
+        INSERT INTO stockalert ({_ALERT_COLUMNS}) VALUES ({_ALERT_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_low_stock_update
+    AFTER UPDATE OF quantity, reorder_point ON product
+    WHEN NEW.quantity < NEW.reorder_point AND OLD.quantity >= OLD.reorder_point
+    BEGIN
+        INSERT INTO stockalert ({_ALERT_COLUMNS}) VALUES ({_ALERT_VALUES});
+    END
+    """,
+)
+
+# See models/inventory_stats.py: both tables must exist first.
+for _statement in _TRIGGERS:
+    event.listen(SQLModel.metadata, "after_create", DDL(_statement))
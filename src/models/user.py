@@ -1,17 +1,23 @@
 from sqlmodel import SQLModel, Field
+from typing import Optional
 import uuid
 from enum import Enum
 
 class Role(str, Enum):
     ADMIN = "admin"
+    INVENTORY_MANAGER = "inventory_manager"
+    CASHIER = "cashier"
+    # Pre-existing accounts; same rights as CASHIER.
     USER = "user"
 
 class User(SQLModel, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    username: str
+    username: str = Field(index=True, unique=True)
     role: Role = Field(default=Role.USER)
     email: str
     password_hash: str = Field(repr=False)
+    # Short cashier PIN for switching operators; hashed like the password.
+    pin_hash: Optional[str] = Field(default=None, repr=False)
     is_active: bool = True
 
     def __repr__(self):
@@ -0,0 +1,21 @@
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+import uuid
+
+from utils.clock import store_now
+
+class ProductVelocity(SQLModel, table=True):
+    product_id: uuid.UUID = Field(foreign_key="product.id", primary_key=True)
+    units_7d: int = 0
+    units_28d: int = 0
+    units_90d: int = 0
+    avg_daily_7d: float = 0.0
+    avg_daily_28d: float = 0.0
+    daily_demand: float = 0.0
+    reorder_point: int = 0
+    last_sale_at: Optional[datetime] = None
+    computed_at: datetime = Field(default_factory=store_now)
+
+    def __repr__(self):
+        return f"ProductVelocity(product_id={self.product_id}, avg_daily_28d={self.avg_daily_28d}, reorder_point={self.reorder_point})"
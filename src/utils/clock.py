@@ -0,0 +1,120 @@
+"""Store-local time.
+
+Sale timestamps are kept twice: ``created_at`` as the naive wall-clock time
+in the store's timezone (what receipts, reports and the heatmap show) and
+``created_at_epoch`` as integer UTC seconds, which analytics range-scan and
+bucket with plain integer arithmetic.
+
+The store timezone is ``HYPERSPIN_TIMEZONE`` (an IANA name such as
+``Europe/Berlin``), defaulting to the machine's zone.
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import List, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from utils.logger import get_logger
+
+logger = get_logger()
+
+_DAY = 86400
+_UNIX_EPOCH = datetime(1970, 1, 1)
+
+
+def _configured_zone() -> tzinfo:
+    name = os.environ.get("HYPERSPIN_TIMEZONE") or os.environ.get("TZ")
+    if not name:
+        # /etc/localtime links into the zoneinfo tree on Linux and macOS.
+        target = os.path.realpath("/etc/localtime")
+        if "zoneinfo" + os.sep in target:
+            name = target.split("zoneinfo" + os.sep, 1)[1]
+    if name:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"Unknown timezone {name!r}; using the machine's current UTC offset")
+    # Last resort (e.g. Windows without tzdata): a fixed offset, no DST.
+    return datetime.now().astimezone().tzinfo
+
+
+STORE_TIMEZONE = _configured_zone()
+
+
+def store_now() -> datetime:
+    """The current wall-clock time in the store, naive like every stored timestamp."""
+    return datetime.now(STORE_TIMEZONE).replace(tzinfo=None)
+
+
+def utc_now() -> datetime:
+    """The current UTC time, naive; for internal deadlines and logs that must
+    not jump when the store's clocks change."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_epoch(wall: datetime) -> int:
+    """Store wall-clock time to UTC epoch seconds.
+
+    In the repeated hour when clocks go back, the first occurrence is used.
+    """
+    if wall.tzinfo is None:
+        wall = wall.replace(tzinfo=STORE_TIMEZONE)
+    return int(wall.timestamp())
+
+
+def from_epoch(epoch: int) -> datetime:
+    """UTC epoch seconds to naive store wall-clock time."""
+    return datetime.fromtimestamp(epoch, STORE_TIMEZONE).replace(tzinfo=None)
+
+
+def from_local_seconds(seconds: int) -> datetime:
+    """Seconds since 1970-01-01 00:00 wall-clock time (epoch plus UTC offset) as a datetime."""
+    return _UNIX_EPOCH + timedelta(seconds=seconds)
+
+
+def utc_offset(epoch: int) -> int:
+    """The store's UTC offset in seconds at an instant."""
+    return int(datetime.fromtimestamp(epoch, STORE_TIMEZONE).utcoffset().total_seconds())
+
+
+def utc_offsets(start_epoch: int, end_epoch: int) -> Tuple[int, List[Tuple[int, int]]]:
+    """The offset at ``start_epoch`` and every ``(instant, new offset)`` change up to ``end_epoch``.
+
+    Lets SQL turn epochs into local time with one CASE over the handful of
+    DST changes in a window instead of a per-row timezone lookup.
+    """
+    first_year = datetime.fromtimestamp(start_epoch, timezone.utc).year
+    last_year = datetime.fromtimestamp(end_epoch, timezone.utc).year
+    changes = [
+        change
+        for year in range(first_year, last_year + 1)
+        for change in _changes_in_year(year)
+        if start_epoch < change[0] <= end_epoch
+    ]
+    return utc_offset(start_epoch), changes
+
+
+@lru_cache(maxsize=64)
+def _changes_in_year(year: int) -> Tuple[Tuple[int, int], ...]:
+    # Day steps find each change, a bisection pins it to the second.
+    start = int(datetime(year, 1, 1, tzinfo=timezone.utc).timestamp())
+    end = int(datetime(year + 1, 1, 1, tzinfo=timezone.utc).timestamp())
+    changes = []
+    previous, instant = utc_offset(start), start
+    while instant < end:
+        following = min(instant + _DAY, end)
+        offset = utc_offset(following)
+        if offset != previous:
+            low, high = instant, following
+            while high - low > 1:
+                middle = (low + high) // 2
+                if utc_offset(middle) == previous:
+                    low = middle
+                else:
+                    high = middle
+            changes.append((high, offset))
+            previous = offset
+        instant = following
+    return tuple(changes)
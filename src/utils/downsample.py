@@ -0,0 +1,48 @@
+"""Downsampling of chart series to a fixed point budget.
+
+Charts get at most ``max_points`` points whatever the length of the
+history behind them, so the payload sent to the client and the render
+time stay bounded.
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Sequence
+
+
+def bucket_sum(
+    points: Sequence[Dict[str, Any]],
+    max_points: int,
+    *,
+    sum_keys: Sequence[str],
+    label_key: str = "label",
+) -> List[Dict[str, Any]]:
+    """Merge runs of consecutive points so that at most ``max_points`` remain.
+
+    Each bucket keeps its first point's other fields. The ``sum_keys`` are
+    summed, so totals are preserved, which suits bar charts of per-period
+    amounts. Each bucket also records ``<key>_min`` and ``<key>_max`` over the
+    merged points and their count as ``periods``. A merged bucket is labelled
+    with its first and last label.
+    """
+    if max_points < 1:
+        raise ValueError("max_points must be at least 1")
+    if len(points) <= max_points:
+        return list(points)
+
+    size = math.ceil(len(points) / max_points)
+    merged = []
+    for offset in range(0, len(points), size):
+        bucket = points[offset:offset + size]
+        first, last = bucket[0], bucket[-1]
+        point = dict(first)
+        for key in sum_keys:
+            values = [p[key] for p in bucket]
+            point[key] = sum(values)
+            point[f"{key}_min"] = min(values)
+            point[f"{key}_max"] = max(values)
+        point["periods"] = len(bucket)
+        if len(bucket) > 1:
+            point[label_key] = f"{first[label_key]} – {last[label_key]}"
+        merged.append(point)
+    return merged
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import threading
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple, Type
+
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+# Events -----------------------------------------------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class ProductChanged:
+    """Products were added, edited or deleted."""
+    product_ids: Tuple[uuid.UUID, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class StockChanged:
+    """On-hand quantities moved (sales, refunds, adjustments)."""
+    product_ids: Tuple[uuid.UUID, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class AvailabilityChanged:
+    """Cart holds on these products were taken, changed, released or expired."""
+    product_ids: Tuple[uuid.UUID, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class LowStockAlert:
+    """A product dropped below its reorder point."""
+    product_id: uuid.UUID
+    name: str
+    quantity: int
+    reorder_point: int
+
+
+@dataclass(frozen=True, slots=True)
+class SaleCompleted:
+    sale_id: uuid.UUID
+    product_ids: Tuple[uuid.UUID, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class SaleAdjusted:
+    """A sale was refunded (in full or in part) or voided."""
+    sale_id: uuid.UUID
+    adjustment_id: uuid.UUID
+    product_ids: Tuple[uuid.UUID, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class ReportJobChanged:
+    """A background report was queued, progressed or finished."""
+    job_id: uuid.UUID
+    status: str
+    progress: float
+
+
+# Bus --------------------------------------------------------------------------------
+
+class EventBus:
+    """In-process publish/subscribe.
+
+    Controllers publish after their transaction commits; handlers run on the
+    publishing thread, so anything slow should be wrapped in a Debouncer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers: Dict[type, List[Callable]] = defaultdict(list)
+
+    def subscribe(self, event_type: Type, handler: Callable) -> Callable[[], None]:
+        """Register a handler and return a function that unregisters it."""
+        with self._lock:
+            self._handlers[event_type].append(handler)
+
+        def unsubscribe():
+            with self._lock:
+                if handler in self._handlers[event_type]:
+                    self._handlers[event_type].remove(handler)
+
+        return unsubscribe
+
+    def publish(self, event):
+        with self._lock:
+            handlers = list(self._handlers[type(event)])
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                logger.exception(f"Event handler {handler} failed for {event}: {e}")
+
+
+class Debouncer:
+    """Collects events for ``delay`` seconds and hands them over as one batch.
+
+    The window starts at the first event, so a steady stream of events still
+    flushes every ``delay`` seconds instead of starving the callback.
+    """
+
+    def __init__(self, callback: Callable[[List], None], delay: float = 0.3):
+        self.callback = callback
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._events: List = []
+        self._timer: threading.Timer | None = None
+
+    def __call__(self, event):
+        with self._lock:
+            self._events.append(event)
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+            self._timer = None
+        if events:
+            try:
+                self.callback(events)
+            except Exception as e:
+                logger.exception(f"Debounced handler {self.callback} failed: {e}")
+
+
+def affected_products(events) -> set:
+    """Union of the product ids carried by a batch of events."""
+    ids = set()
+    for event in events:
+        ids.update(getattr(event, "product_ids", ()))
+    return ids
+
+
+bus = EventBus()
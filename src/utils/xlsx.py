@@ -0,0 +1,273 @@
+"""Streaming XLSX writer.
+
+Sheets are written row by row straight into the zip stream, with strings
+stored inline (no shared-strings table), so memory stays bounded by one
+chunk of rows however large the workbook gets. Only what reports need is
+supported: typed number, boolean, date and text cells, a bold header row and
+several sheets per workbook, written one after the other.
+"""
+from __future__ import annotations
+
+import math
+import re
+import uuid
+import zipfile
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Iterable, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+# Characters XML 1.0 does not allow at all.
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# Cell style indexes into styles.xml cellXfs.
+_STYLE_HEADER = 1
+_STYLE_DATETIME = 2
+_STYLE_DATE = 3
+
+# Sheet rows are buffered and handed to the zip stream in chunks of this size.
+_FLUSH_ROWS = 500
+
+_SHEET_NAME_MAX = 31
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}'
+    '</Types>'
+)
+
+_SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{index}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}'
+    '<Relationship Id="rIdStyles" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2">'
+    '<numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd"/>'
+    '</numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews>'
+    '<sheetData>'
+)
+
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def column_letter(index: int) -> str:
+    """Zero-based column index to its spreadsheet letter (0 -> A, 26 -> AA)."""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def excel_serial(value: datetime) -> float:
+    """Days since Excel's 1900 epoch, the on-disk form of date cells."""
+    return (value - _EXCEL_EPOCH).total_seconds() / 86400
+
+
+class XlsxWriter:
+    """Writes a workbook one sheet, and one row, at a time.
+
+        with XlsxWriter(path) as workbook:
+            workbook.add_sheet("Sales", ["ID", "Date", "Total"])
+            workbook.write_rows(rows)
+            workbook.add_sheet("Inventory", [...])
+            ...
+
+    Starting a sheet closes the previous one; sheets cannot be reopened.
+    """
+
+    def __init__(self, path: str):
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self._sheet_names: List[str] = []
+        self._stream = None
+        self._columns: List[str] = []
+        self._row_number = 0
+
+    def __enter__(self) -> "XlsxWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Public API -----------------------------------------------------------------
+
+    def add_sheet(self, name: str, header: Optional[Sequence[str]] = None):
+        self._close_sheet()
+        self._sheet_names.append(self._unique_name(name))
+        index = len(self._sheet_names)
+        # force_zip64: the entry size is unknown up front and may pass 4 GiB.
+        self._stream = self._zip.open(f"xl/worksheets/sheet{index}.xml", "w", force_zip64=True)
+        self._stream.write(_SHEET_HEAD.encode("utf-8"))
+        self._columns = []
+        self._row_number = 0
+        if header:
+            self._write([self._row(header, style=_STYLE_HEADER)])
+
+    def write_row(self, values: Sequence[Any]):
+        self._write([self._row(values)])
+
+    def write_rows(self, rows: Iterable[Sequence[Any]]) -> int:
+        """Append rows to the current sheet. Returns the number written."""
+        written = 0
+        buffer: List[str] = []
+        for values in rows:
+            buffer.append(self._row(values))
+            if len(buffer) >= _FLUSH_ROWS:
+                self._write(buffer)
+                written += len(buffer)
+                buffer = []
+        if buffer:
+            self._write(buffer)
+            written += len(buffer)
+        return written
+
+    def close(self):
+        if self._zip is None:
+            return
+        if not self._sheet_names:
+            self.add_sheet("Sheet1")
+        self._close_sheet()
+
+        count = len(self._sheet_names)
+        self._zip.writestr("[Content_Types].xml", _CONTENT_TYPES.format(
+            sheets="".join(_SHEET_CONTENT_TYPE.format(index=i) for i in range(1, count + 1))
+        ))
+        self._zip.writestr("_rels/.rels", _ROOT_RELS)
+        self._zip.writestr("xl/workbook.xml", _WORKBOOK.format(sheets="".join(
+            f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+            for i, name in enumerate(self._sheet_names, start=1)
+        )))
+        self._zip.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS.format(sheets="".join(
+            f'<Relationship Id="rId{i}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, count + 1)
+        )))
+        self._zip.writestr("xl/styles.xml", _STYLES)
+        self._zip.close()
+        self._zip = None
+
+    # Internal helpers -----------------------------------------------------------
+
+    def _write(self, rows: List[str]):
+        if self._stream is None:
+            raise RuntimeError("add_sheet() must be called before writing rows")
+        self._stream.write("".join(rows).encode("utf-8"))
+
+    def _close_sheet(self):
+        if self._stream is not None:
+            self._stream.write(_SHEET_TAIL.encode("utf-8"))
+            self._stream.close()
+            self._stream = None
+
+    def _unique_name(self, name: str) -> str:
+        # Excel limits names to 31 characters and forbids []:*?/\
+        base = re.sub(r"[\[\]:*?/\\]", "_", name)[:_SHEET_NAME_MAX] or "Sheet"
+        candidate, suffix = base, 2
+        taken = {existing.lower() for existing in self._sheet_names}
+        while candidate.lower() in taken:
+            tail = f" ({suffix})"
+            candidate = base[:_SHEET_NAME_MAX - len(tail)] + tail
+            suffix += 1
+        return candidate
+
+    def _column(self, index: int) -> str:
+        while len(self._columns) <= index:
+            self._columns.append(column_letter(len(self._columns)))
+        return self._columns[index]
+
+    def _row(self, values: Sequence[Any], style: int = 0) -> str:
+        self._row_number += 1
+        row = self._row_number
+        cells = []
+        for index, value in enumerate(values):
+            if value is None:
+                continue
+            ref = f"{self._column(index)}{row}"
+            cells.append(self._cell(ref, value, style))
+        return f'<row r="{row}">{"".join(cells)}</row>'
+
+    @staticmethod
+    def _cell(ref: str, value: Any, style: int) -> str:
+        style_attr = f' s="{style}"' if style else ""
+        if isinstance(value, Enum):
+            value = value.value
+        if isinstance(value, bool):
+            return f'<c r="{ref}" t="b"{style_attr}><v>{int(value)}</v></c>'
+        if isinstance(value, float) and not math.isfinite(value):
+            # SpreadsheetML has no NaN or infinity; leave the cell empty.
+            return ""
+        if isinstance(value, (int, float)):
+            return f'<c r="{ref}"{style_attr}><v>{value!r}</v></c>'
+        if isinstance(value, datetime):
+            return f'<c r="{ref}" s="{_STYLE_DATETIME}"><v>{excel_serial(value.replace(tzinfo=None))!r}</v></c>'
+        if isinstance(value, date):
+            serial = excel_serial(datetime(value.year, value.month, value.day))
+            return f'<c r="{ref}" s="{_STYLE_DATE}"><v>{serial!r}</v></c>'
+        if isinstance(value, uuid.UUID):
+            value = str(value)
+        text = escape(_ILLEGAL_XML.sub("", str(value)))
+        return f'<c r="{ref}" t="inlineStr"{style_attr}><is><t xml:space="preserve">{text}</t></is></c>'
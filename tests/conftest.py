@@ -0,0 +1,33 @@
+"""The app imports its modules from ``src`` and keeps its database under
+``storage/data`` relative to the working directory, so tests run from a
+scratch directory with ``src`` on the path."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+# Before anything imports db.conn, which creates storage/data on import.
+os.chdir(tempfile.mkdtemp(prefix="hyperspin-tests-"))
+
+
+@pytest.fixture(scope="session")
+def database():
+    from db.conn import init_db
+    init_db()
+
+
+@pytest.fixture
+def make_product(database):
+    """Insert a product and return its id."""
+    from db.conn import session_scope
+    from models.item import Product
+
+    def make(quantity: int = 10, price: float = 2.0, **fields):
+        product = Product(name=f"product-{quantity}", price=price, quantity=quantity, **fields)
+        with session_scope() as session:
+            session.add(product)
+        return product.id
+
+    return make
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from controllers.analytics import AnalyticsService, SalesHistoryFilter
+from db.conn import session_scope
+from models.sale import Sale
+
+
+def test_sales_history_pages_through_tied_timestamps(database):
+    tied = datetime(2019, 5, 5, 12, 0, 0)
+    earlier = datetime(2019, 5, 5, 11, 59, 59)
+    sales = [Sale(total_amount=1.0, status="completed", created_at=tied) for _ in range(7)]
+    sales += [Sale(total_amount=1.0, status="completed", created_at=earlier) for _ in range(2)]
+    with session_scope() as session:
+        session.add_all(sales)
+
+    service = AnalyticsService()
+    filters = SalesHistoryFilter(start=earlier, end=tied)
+    seen, after, pages = [], None, 0
+    while True:
+        page = service.get_sales_history(filters, after=after, limit=3)
+        seen += [row["id"] for row in page.rows]
+        pages += 1
+        if page.next_cursor is None:
+            break
+        after = page.next_cursor
+
+    assert pages == 3
+    assert len(seen) == len(set(seen)) == len(sales)
+    # Newest first, ties broken by id descending.
+    expected = sorted(sales, key=lambda sale: (sale.created_at, sale.id), reverse=True)
+    assert seen == [sale.id for sale in expected]
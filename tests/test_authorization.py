@@ -0,0 +1,143 @@
+import uuid
+
+import pytest
+
+import controllers.authentication as authentication
+from controllers.authentication import auth
+from controllers.authorization import NotAuthenticated, Permission, PermissionDenied, authz, requires
+from db.conn import session_scope
+from models.user import Role, User
+
+
+@requires(Permission.VIEW_REVENUE)
+def view_revenue():
+    return "revenue"
+
+
+@pytest.fixture
+def account(database, monkeypatch):
+    """Create a user with the given role, as an administrator would."""
+    monkeypatch.setattr(authentication, "SCRYPT_N", 2 ** 10)
+
+    def create(role: Role):
+        username = f"user-{uuid.uuid4().hex[:8]}"
+        with monkeypatch.context() as setup:
+            setup.setattr(auth, "active", None)
+            setup.setattr(authz, "single_operator", True)
+            return auth.create_user(username, f"{username}@example.com", "secret", role=role)
+
+    return create
+
+
+@pytest.fixture
+def operator(account):
+    """Log in a fresh user with the given role; everyone is logged out afterwards."""
+    def login(role: Role):
+        user = account(role)
+        auth.login(user.username, "secret")
+        return user
+
+    yield login
+    auth.end_shift()
+
+
+def test_no_operator_is_denied(database):
+    auth.end_shift()
+    with pytest.raises(NotAuthenticated):
+        view_revenue()
+    with pytest.raises(PermissionDenied):
+        authz.check(Permission.SELL)
+
+
+def test_single_operator_mode_is_opt_in(database, monkeypatch):
+    auth.end_shift()
+    monkeypatch.setattr(authz, "single_operator", True)
+    assert view_revenue() == "revenue"
+
+
+def test_role_is_checked(operator):
+    operator(Role.CASHIER)
+    with pytest.raises(PermissionDenied):
+        view_revenue()
+    operator(Role.ADMIN)
+    assert view_revenue() == "revenue"
+
+
+def test_logout_and_demotion_do_not_restore_access(operator):
+    admin = operator(Role.ADMIN)
+    assert view_revenue() == "revenue"
+    authz.degrade_role_from_admin(admin)
+    with pytest.raises(NotAuthenticated):
+        view_revenue()
+
+    operator(Role.ADMIN)
+    auth.end_shift()
+    with pytest.raises(NotAuthenticated):
+        view_revenue()
+
+
+def stored_role(user_id: uuid.UUID) -> Role:
+    with session_scope(read_only=True) as session:
+        return session.get(User, user_id).role
+
+
+def test_role_changes_need_manage_users_and_are_saved(operator, account):
+    target = account(Role.CASHIER)
+    operator(Role.INVENTORY_MANAGER)
+    with pytest.raises(PermissionDenied):
+        authz.assign_role(target, Role.ADMIN)
+    assert stored_role(target.id) == Role.CASHIER
+
+    operator(Role.ADMIN)
+    authz.assign_role(target, Role.ADMIN)
+    assert stored_role(target.id) == Role.ADMIN
+    authz.degrade_role_from_admin(target)
+    assert stored_role(target.id) == Role.USER
+
+
+def test_user_management_is_denied_to_cashiers(operator, account):
+    other = account(Role.ADMIN)
+    operator(Role.CASHIER)
+    with pytest.raises(PermissionDenied):
+        auth.create_user("intruder", "intruder@example.com", "secret", role=Role.ADMIN)
+    with pytest.raises(PermissionDenied):
+        auth.set_password(other.id, "hijacked")
+    with pytest.raises(PermissionDenied):
+        auth.set_pin(other.id, "0000")
+
+
+def test_operators_may_change_their_own_credentials(operator):
+    cashier = operator(Role.CASHIER)
+    auth.set_pin(cashier.id, "1234")
+    auth.set_password(cashier.id, "changed")
+    auth.login(cashier.username, "changed")
+
+
+def test_expired_session_is_denied(operator, monkeypatch):
+    operator(Role.ADMIN)
+    assert view_revenue() == "revenue"
+    expires_at = auth.active.expires_at
+    monkeypatch.setattr(authentication.time, "monotonic", lambda: expires_at + 1)
+    with pytest.raises(NotAuthenticated):
+        view_revenue()
+    assert auth.active is None
+
+
+def test_role_change_is_audited_once_committed(operator, account, monkeypatch):
+    from controllers.audit import audit
+
+    target = account(Role.CASHIER)
+    operator(Role.ADMIN)
+    recorded = []
+    monkeypatch.setattr(audit, "record", lambda *args, **kwargs: recorded.append((args, kwargs)))
+
+    authz.assign_role(target, Role.INVENTORY_MANAGER)
+    assert recorded == [(
+        ("user.role", "user", target.id),
+        {"before": {"role": Role.CASHIER}, "after": {"role": Role.INVENTORY_MANAGER}},
+    )]
+
+    # A change that does not happen leaves no entry.
+    recorded.clear()
+    authz.degrade_role_from_admin(target)
+    assert recorded == []
@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import uuid
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import controllers.fast_checkout as fast_checkout
+from controllers.fast_checkout import CheckoutJournalWriter
+from db.conn import session_scope
+from db.journal import CheckoutJournal
+from models.item import Product
+from models.payment import PaymentMethod
+from models.sale import Sale
+
+
+def record(product_id: uuid.UUID, quantity: int = 1, payment_method: str = PaymentMethod.CASH.value):
+    return {
+        "sale_id": str(uuid.uuid4()),
+        "sold_at": "2026-03-01T10:00:00",
+        "payment_method": payment_method,
+        "lines": [
+            {"product_id": str(product_id), "quantity": quantity, "unit_price": 2.0, "cost_price": 1.0},
+        ],
+    }
+
+
+def stock(product_id: uuid.UUID) -> int:
+    with session_scope(read_only=True) as session:
+        return session.get(Product, product_id).quantity
+
+
+def sales_with_ids(records) -> int:
+    ids = [uuid.UUID(r["sale_id"]) for r in records]
+    with session_scope(read_only=True) as session:
+        return sum(session.get(Sale, sale_id) is not None for sale_id in ids)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = CheckoutJournal(str(tmp_path / "checkout.journal"))
+    yield journal
+    journal.close()
+
+
+def test_torn_or_corrupt_tail_is_ignored(journal):
+    records = [record(uuid.uuid4()) for _ in range(3)]
+    for entry in records:
+        journal.append(entry)
+    assert list(journal.entries()) == records
+
+    # Power loss in the middle of the last frame.
+    os.truncate(journal.path, os.path.getsize(journal.path) - 5)
+    assert list(journal.entries()) == records[:2]
+
+    # A flipped byte in the second payload fails its checksum.
+    with open(journal.path, "r+b") as f:
+        f.seek(len(json.dumps(records[0], separators=(",", ":"))) + 8 + 8 + 2)
+        f.write(b"X")
+    assert list(journal.entries()) == records[:1]
+
+
+def test_recovery_replays_each_sale_once(journal, make_product):
+    product_id = make_product(quantity=10)
+    records = [record(product_id, quantity=2) for _ in range(3)]
+    torn = record(product_id, quantity=2)
+    for entry in records + [torn]:
+        journal.append(entry)
+    os.truncate(journal.path, os.path.getsize(journal.path) - 5)
+
+    writer = CheckoutJournalWriter(journal)
+    assert writer.recover() == 3
+    assert sales_with_ids(records) == 3
+    assert sales_with_ids([torn]) == 0
+    assert stock(product_id) == 4
+    assert list(journal.entries()) == []
+
+    # A crash after the commit but before the journal was reset replays
+    # the same entries again.
+    for entry in records:
+        journal.append(entry)
+    assert writer.recover() == 3
+    assert stock(product_id) == 4
+
+
+def test_concurrent_checkouts_share_a_commit(journal, make_product, monkeypatch):
+    product_id = make_product(quantity=100)
+    writer = CheckoutJournalWriter(journal, commit_interval=0.5)
+    batches = []
+    apply_batch = writer._apply_batch
+
+    def recording(records):
+        batches.append(len(records))
+        return apply_batch(records)
+
+    monkeypatch.setattr(writer, "_apply_batch", recording)
+    writer.start()
+
+    def price(pending_quantity):
+        return [{"product_id": product_id, "quantity": 1, "unit_price": 2.0, "cost_price": 1.0}]
+
+    buyers = [threading.Thread(target=writer.submit, args=(price, PaymentMethod.CASH)) for _ in range(10)]
+    for buyer in buyers:
+        buyer.start()
+    for buyer in buyers:
+        buyer.join()
+    writer.stop()
+
+    assert sum(batches) == 10
+    assert len(batches) < 10
+    assert stock(product_id) == 90
+
+
+def test_a_failing_checkout_is_dead_lettered(journal, make_product):
+    product_id = make_product(quantity=10)
+    good = [record(product_id), record(product_id)]
+    poison = record(product_id, payment_method="bogus")
+    for entry in (good[0], poison, good[1]):
+        journal.append(entry)
+
+    writer = CheckoutJournalWriter(journal)
+    assert writer.recover() == 2
+    assert sales_with_ids(good) == 2
+    assert stock(product_id) == 8
+
+    dead_letters = CheckoutJournal(writer.dead_letter_path)
+    try:
+        assert [entry["record"] for entry in dead_letters.entries()] == [poison]
+    finally:
+        dead_letters.close()
+    # Nothing is left to block the next start.
+    assert writer.recover() == 0
+
+
+def test_a_locked_database_is_retried(journal, make_product, monkeypatch):
+    product_id = make_product(quantity=10)
+    monkeypatch.setattr(fast_checkout, "RETRY_DELAY", 0.01)
+    writer = CheckoutJournalWriter(journal)
+    apply_batch = writer._apply_batch
+    failures = [OperationalError("COMMIT", {}, Exception("database is locked"))] * 2
+
+    def flaky(records):
+        if failures:
+            raise failures.pop()
+        return apply_batch(records)
+
+    monkeypatch.setattr(writer, "_apply_batch", flaky)
+    entry = record(product_id)
+    journal.append(entry)
+    assert writer.recover() == 1
+    assert sales_with_ids([entry]) == 1
+    assert not os.path.exists(writer.dead_letter_path)
@@ -0,0 +1,17 @@
+import os
+
+from controllers.maintenance import MaintenanceScheduler
+from db.conn import engine
+
+
+def test_idle_checkpoint_truncates_the_wal(make_product):
+    for quantity in range(50):
+        make_product(quantity=quantity)
+    wal = f"{engine.url.database}-wal"
+    assert os.path.getsize(wal) > 0
+
+    run = MaintenanceScheduler().run_task("wal_checkpoint")
+
+    assert run.status == "ok"
+    assert run.detail.startswith("TRUNCATE")
+    assert run.reclaimed_bytes > 0
@@ -0,0 +1,105 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+import db.migrations as migrations
+from db.migrations import LATEST_VERSION, current_version, execute_all, migrate
+from utils.clock import to_epoch
+
+
+@pytest.fixture
+def new_engine(tmp_path):
+    """An engine on a fresh database file; disposed afterwards."""
+    engines = []
+
+    def make(name: str):
+        engine = create_engine(f"sqlite:///{tmp_path / name}")
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Shrink backfill batches and count them instead of pausing."""
+    paused = []
+    monkeypatch.setattr(migrations, "BATCH_SIZE", 3)
+    monkeypatch.setattr(migrations.time, "sleep", paused.append)
+    return paused
+
+
+def schema(engine):
+    """Every table, index and trigger with its columns, bar the version table."""
+    with engine.connect() as conn:
+        objects = sorted(conn.exec_driver_sql(
+            "SELECT type, name FROM sqlite_schema WHERE name NOT LIKE 'sqlite_%' AND name != 'schema_version'"
+        ).all())
+        columns = {
+            name: sorted(row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{name}")'))
+            for kind, name in objects if kind == "table"
+        }
+    return objects, columns
+
+
+def v1_database(engine, sold_at):
+    """A database as the last release before versioning left it."""
+    with engine.begin() as conn:
+        execute_all(conn, migrations._V1_TABLES)
+        execute_all(conn, migrations._V1_INDEXES)
+        execute_all(conn, migrations._V1_SEED_AND_TRIGGERS)
+        conn.exec_driver_sql(
+            "INSERT INTO sale (id, total_amount, tax, discount, created_at, status) VALUES (?, 2.0, 0, 0, ?, 'completed')",
+            [(uuid.uuid4().hex, created_at.isoformat(" ")) for created_at in sold_at],
+        )
+
+
+def test_fresh_database_is_stamped_latest(new_engine, batches):
+    engine = new_engine("fresh.db")
+    assert migrate(engine) == 1
+    assert current_version(engine) == (LATEST_VERSION, True)
+    assert migrate(engine) == 0
+    assert not batches
+
+
+def test_v1_database_upgrades_to_latest(new_engine, batches):
+    engine = new_engine("v1.db")
+    sold_at = [datetime(2024, 3, 1, 9) + timedelta(hours=hour, microseconds=hour) for hour in range(10)]
+    v1_database(engine, sold_at)
+    assert current_version(engine) == (0, True)
+
+    assert migrate(engine) == LATEST_VERSION
+    assert current_version(engine) == (LATEST_VERSION, True)
+    # Ten rows in batches of three, each followed by a pause.
+    assert len(batches) == 4
+    with engine.connect() as conn:
+        epochs = dict(conn.exec_driver_sql("SELECT created_at, created_at_epoch FROM sale").all())
+    assert epochs == {created_at.isoformat(" "): to_epoch(created_at) for created_at in sold_at}
+
+    fresh = new_engine("fresh.db")
+    migrate(fresh)
+    assert schema(engine) == schema(fresh)
+    assert migrate(engine) == 0
+
+
+def test_interrupted_backfill_resumes(new_engine, batches):
+    engine = new_engine("resume.db")
+    sold_at = [datetime(2024, 3, 1, 9) + timedelta(days=day) for day in range(5)]
+    v1_database(engine, sold_at)
+    migrate(engine)
+
+    # As left by a launch that stopped after migration 2's first batch.
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE sale SET created_at_epoch = NULL WHERE created_at >= '2024-03-03'")
+        migrations._write_version(conn, 2, False)
+    batches.clear()
+
+    assert migrate(engine) == LATEST_VERSION - 1
+    assert current_version(engine) == (LATEST_VERSION, True)
+    assert len(batches) == 1
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT count(*) FROM sale WHERE created_at_epoch IS NULL").scalar() == 0
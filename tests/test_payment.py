@@ -0,0 +1,125 @@
+from datetime import datetime
+
+import pytest
+from sqlmodel import select
+
+from controllers.authorization import authz
+from controllers.payment import PaymentController
+from db.conn import session_scope
+from models.heatmap import SalesHeatmapDay
+from models.item import Product
+from models.payment import Payment, PaymentMethod, PaymentStatus
+from models.sale import Sale, SaleItem, SaleStatus
+from models.velocity import ProductVelocity
+from utils.clock import store_now
+
+
+@pytest.fixture
+def payments(database, monkeypatch):
+    monkeypatch.setattr(authz, "single_operator", True)
+    return PaymentController()
+
+
+def sell(quantities, sold_at=None):
+    """Commit a cash sale of ``{product_id: quantity}`` at 2.0 a unit and return its id."""
+    lines = [
+        {"product_id": product_id, "quantity": quantity, "unit_price": 2.0, "cost_price": 1.0}
+        for product_id, quantity in quantities.items()
+    ]
+    with session_scope() as session:
+        return PaymentController(session).apply_sale(
+            session, lines, PaymentMethod.CASH, sold_at=sold_at or store_now()
+        ).id
+
+
+def stock(product_id):
+    with session_scope(read_only=True) as session:
+        product = session.get(Product, product_id)
+        return product.quantity, product.in_stock
+
+
+def units_7d(product_id):
+    with session_scope(read_only=True) as session:
+        return session.get(ProductVelocity, product_id).units_7d
+
+
+def transactions(sold_at):
+    with session_scope(read_only=True) as session:
+        row = session.get(SalesHeatmapDay, sold_at.date())
+        return row.transaction_cells()[sold_at.hour]
+
+
+def test_refund_restocks_and_writes_a_negative_adjustment(payments, make_product):
+    kept, returned = make_product(quantity=5), make_product(quantity=3)
+    sale_id = sell({kept: 2, returned: 3})
+    assert stock(returned) == (0, False)
+
+    adjustment = payments.refund_sale(sale_id)
+
+    assert stock(kept) == (5, True)
+    assert stock(returned) == (3, True)
+    assert units_7d(kept) == 0 and units_7d(returned) == 0
+    with session_scope(read_only=True) as session:
+        assert session.get(Sale, sale_id).status == SaleStatus.REFUNDED
+        row = session.get(Sale, adjustment.id)
+        assert row.status == SaleStatus.ADJUSTMENT
+        assert row.adjusts_sale_id == sale_id
+        assert row.total_amount == -10.0
+        items = session.exec(select(SaleItem).where(SaleItem.sale_id == adjustment.id)).all()
+        assert {item.product_id: item.quantity for item in items} == {kept: -2, returned: -3}
+        payment = session.exec(select(Payment).where(Payment.sale_id == adjustment.id)).one()
+        assert payment.amount == -10.0
+        assert payment.status == PaymentStatus.REFUNDED
+
+
+def test_partial_refunds_until_nothing_is_left(payments, make_product):
+    first, second = make_product(quantity=10), make_product(quantity=10)
+    sale_id = sell({first: 4, second: 1})
+
+    payments.refund_sale(sale_id, [{"product_id": first, "quantity": 1}])
+    assert stock(first) == (7, True)
+    assert stock(second) == (9, True)
+    assert units_7d(first) == 3
+
+    payments.refund_sale(sale_id, [{"product_id": first, "quantity": 3}, {"product_id": second, "quantity": 1}])
+    assert stock(first) == (10, True)
+    assert stock(second) == (10, True)
+    with session_scope(read_only=True) as session:
+        assert session.get(Sale, sale_id).status == SaleStatus.REFUNDED
+    with pytest.raises(ValueError):
+        payments.refund_sale(sale_id)
+
+
+def test_over_refund_is_rejected(payments, make_product):
+    product_id = make_product(quantity=10)
+    sale_id = sell({product_id: 2})
+    with pytest.raises(ValueError):
+        payments.refund_sale(sale_id, [{"product_id": product_id, "quantity": 3}])
+    assert stock(product_id) == (8, True)
+
+
+def test_void_takes_the_transaction_out_of_the_heatmap(payments, make_product):
+    product_id = make_product(quantity=10)
+    sold_at = datetime(2021, 3, 4, 10, 30)
+    sale_id = sell({product_id: 2}, sold_at=sold_at)
+    assert transactions(sold_at) == 1
+
+    payments.void_sale(sale_id)
+
+    assert transactions(sold_at) == 0
+    assert stock(product_id) == (10, True)
+    with session_scope(read_only=True) as session:
+        assert session.get(Sale, sale_id).status == SaleStatus.VOIDED
+
+
+def test_void_of_a_sale_the_heatmap_never_counted(payments, make_product):
+    product_id = make_product(quantity=10)
+    sold_at = datetime(2021, 3, 5, 9, 0)
+    sale_id = sell({product_id: 1}, sold_at=sold_at)
+    with session_scope() as session:
+        session.delete(session.get(SalesHeatmapDay, sold_at.date()))
+
+    payments.void_sale(sale_id)
+
+    assert transactions(sold_at) == 0
+    assert stock(product_id) == (10, True)
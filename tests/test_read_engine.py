@@ -0,0 +1,100 @@
+import threading
+import time
+import uuid
+
+import pytest
+from sqlalchemy import func, insert, text
+from sqlmodel import select
+from sqlalchemy.exc import OperationalError
+
+from db.conn import engine, read_engine, session_scope
+from models.item import Product
+
+WRITERS = 4
+WRITES_PER_WRITER = 5
+# Each writer holds the write lock this long before committing.
+HOLD_SECONDS = 0.2
+READERS = 4
+# Far below the 5 s busy timeout a blocked reader would wait out.
+MAX_READ_SECONDS = 0.5
+
+
+def _write(hold: float):
+    with engine.begin() as conn:
+        conn.execute(insert(Product), {"id": uuid.uuid4(), "name": "load", "price": 1.0, "quantity": 1})
+        time.sleep(hold)
+
+
+def test_reads_are_not_blocked_by_writers(database):
+    stop = threading.Event()
+    errors = []
+    read_times = []
+
+    def writer():
+        try:
+            for _ in range(WRITES_PER_WRITER):
+                _write(HOLD_SECONDS)
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                with session_scope(read_only=True) as session:
+                    session.exec(select(func.count(Product.id))).one()
+                read_times.append(time.perf_counter() - started)
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=reader) for _ in range(READERS)]
+    writers = [threading.Thread(target=writer) for _ in range(WRITERS)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    assert not errors
+    assert read_times
+    assert max(read_times) < MAX_READ_SECONDS
+    with session_scope(read_only=True) as session:
+        assert session.exec(select(func.count(Product.id))).one() >= WRITERS * WRITES_PER_WRITER
+
+
+def test_read_snapshot_ignores_open_write_transaction(database):
+    with session_scope(read_only=True) as session:
+        before = session.exec(select(func.count(Product.id))).one()
+
+    holding = threading.Event()
+    release = threading.Event()
+
+    def writer():
+        with engine.begin() as conn:
+            conn.execute(insert(Product), {"id": uuid.uuid4(), "name": "pending", "price": 1.0, "quantity": 1})
+            holding.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        assert holding.wait(5)
+        started = time.perf_counter()
+        with session_scope(read_only=True) as session:
+            during = session.exec(select(func.count(Product.id))).one()
+        assert time.perf_counter() - started < MAX_READ_SECONDS
+        assert during == before
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_writes_through_read_pool_fail(database):
+    with pytest.raises(OperationalError, match="readonly"):
+        with session_scope(read_only=True) as session:
+            session.exec(text("DELETE FROM product"))
+    with pytest.raises(OperationalError, match="readonly"):
+        with read_engine.begin() as conn:
+            conn.execute(insert(Product), {"id": uuid.uuid4(), "name": "nope", "price": 1.0, "quantity": 1})
@@ -0,0 +1,30 @@
+import csv
+import threading
+import uuid
+
+from controllers import reports
+from controllers.reports import REPORT_BUILDERS, ReportFormat, ReportKind, run_report
+
+
+def test_report_reads_one_snapshot(make_product, monkeypatch, tmp_path):
+    make_product(quantity=1)
+    late = []
+
+    def inventory():
+        sheets = reports._inventory_report()
+        # Committed after the row count but before any row is streamed.
+        writer = threading.Thread(target=lambda: late.append(make_product(quantity=999_999)))
+        writer.start()
+        writer.join()
+        return sheets
+
+    monkeypatch.setitem(REPORT_BUILDERS, ReportKind.INVENTORY, inventory)
+    output_path = str(tmp_path / "inventory.csv")
+
+    written = run_report(uuid.uuid4(), ReportKind.INVENTORY, ReportFormat.CSV, {}, output_path)
+
+    with open(output_path, newline="") as f:
+        rows = list(csv.reader(f))[1:]
+    assert late
+    assert written == len(rows) > 0
+    assert str(late[0]) not in {row[0] for row in rows}
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from controllers import heatmap
+from controllers.stock_alerts import StockAlertDispatcher
+from db.conn import session_scope
+from models.item import Product
+
+
+@pytest.fixture
+def dispatcher(database):
+    """A dispatcher listening for commits, without its thread."""
+    dispatcher = StockAlertDispatcher()
+    for name, listener in dispatcher._listeners():
+        event.listen(Session, name, listener)
+    yield dispatcher
+    for name, listener in dispatcher._listeners():
+        event.remove(Session, name, listener)
+
+
+def woken(dispatcher):
+    was_set = dispatcher._wake.is_set()
+    dispatcher._wake.clear()
+    return was_set
+
+
+def test_only_product_writes_wake_the_dispatcher(dispatcher, make_product):
+    product_id = make_product(quantity=10)
+    assert woken(dispatcher)
+
+    with session_scope() as session:
+        heatmap.record_sale(session, datetime(2021, 6, 1, 12), 5.0)
+    assert not woken(dispatcher)
+
+    with session_scope() as session:
+        session.get(Product, product_id).quantity = 3
+    assert woken(dispatcher)
+
+    with session_scope() as session:
+        session.execute(update(Product).where(Product.id == product_id).values(quantity=2))
+    assert woken(dispatcher)
+
+
+def test_rolled_back_product_writes_do_not_wake_the_dispatcher(dispatcher, make_product):
+    product_id = make_product(quantity=10)
+    woken(dispatcher)
+
+    with pytest.raises(RuntimeError):
+        with session_scope() as session:
+            session.get(Product, product_id).quantity = 3
+            session.flush()
+            raise RuntimeError("checkout failed")
+    with session_scope() as session:
+        heatmap.record_sale(session, datetime(2021, 6, 2, 12), 5.0)
+    assert not woken(dispatcher)
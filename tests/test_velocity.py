@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from controllers.payment import PaymentController
+from controllers.velocity import VelocityService
+from db.conn import session_scope
+from models.item import Product
+from models.payment import PaymentMethod
+from models.velocity import ProductVelocity
+from utils.clock import store_now
+
+
+def sell(product_id, quantity, sold_at=None):
+    with session_scope() as session:
+        PaymentController(session).apply_sale(
+            session,
+            [{"product_id": product_id, "quantity": quantity, "unit_price": 2.0, "cost_price": 1.0}],
+            PaymentMethod.CASH,
+            sold_at=sold_at or store_now(),
+        )
+
+
+def reorder_point(product_id):
+    with session_scope(read_only=True) as session:
+        return session.get(Product, product_id).reorder_point
+
+
+def test_computed_reorder_point_follows_sales(make_product):
+    product_id = make_product(quantity=500)
+    sell(product_id, 70)
+    # 70 units in the last week: 10 a day over 7 + 3 days of cover.
+    assert reorder_point(product_id) == 100
+    sell(product_id, 70, sold_at=store_now() - timedelta(days=20))
+    VelocityService().recompute(product_ids=[product_id])
+    assert reorder_point(product_id) == 100
+
+
+def test_manual_reorder_point_is_kept(make_product):
+    product_id = make_product(quantity=500, reorder_point=42, reorder_point_manual=True)
+    sell(product_id, 70)
+    assert reorder_point(product_id) == 42
+    VelocityService().recompute(product_ids=[product_id])
+    assert reorder_point(product_id) == 42
+
+
+def test_recompute_keeps_counters_changed_after_its_snapshot(make_product):
+    product_id = make_product(quantity=500)
+    sell(product_id, 7)
+    service = VelocityService()
+    with session_scope(read_only=True) as session:
+        rows = service._aggregate(session, store_now(), [product_id])
+
+    sell(product_id, 7)
+    with session_scope() as session:
+        assert service._store(session, rows) == 0
+    with session_scope(read_only=True) as session:
+        assert session.get(ProductVelocity, product_id).units_7d == 14
@@ -0,0 +1,94 @@
+import uuid
+import zipfile
+from datetime import date, datetime
+from xml.etree import ElementTree
+
+from utils.xlsx import XlsxWriter, column_letter
+
+NS = {
+    "main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "rel": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+}
+
+
+def read_workbook(path):
+    """Sheet name -> {cell ref: (type, style, text)}, parsed back from the zip."""
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        for part in ("[Content_Types].xml", "_rels/.rels", "xl/_rels/workbook.xml.rels", "xl/styles.xml"):
+            ElementTree.fromstring(archive.read(part))
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        sheets = {}
+        for index, sheet in enumerate(workbook.iterfind("main:sheets/main:sheet", NS), start=1):
+            assert sheet.get(f"{{{NS['rel']}}}id") == f"rId{index}"
+            root = ElementTree.fromstring(archive.read(f"xl/worksheets/sheet{index}.xml"))
+            sheets[sheet.get("name")] = {
+                cell.get("r"): (
+                    cell.get("t"),
+                    cell.get("s"),
+                    "".join(cell.itertext()),
+                )
+                for cell in root.iterfind("main:sheetData/main:row/main:c", NS)
+            }
+        return sheets
+
+
+def test_column_letters():
+    assert [column_letter(i) for i in (0, 25, 26, 51, 701, 702)] == ["A", "Z", "AA", "AZ", "ZZ", "AAA"]
+
+
+def test_cells_round_trip(tmp_path):
+    path = tmp_path / "cells.xlsx"
+    sale_id = uuid.uuid4()
+    with XlsxWriter(str(path)) as workbook:
+        workbook.add_sheet("Sales", ["ID", "When", "Day", "Total", "Paid", "Note", "Missing"])
+        workbook.write_rows([
+            [sale_id, datetime(2024, 1, 1, 12), date(1900, 3, 1), 12.5, True, "a < b & \x07c", None],
+            [1, datetime(1899, 12, 31), date(2024, 2, 29), float("nan"), False, "", float("inf")],
+        ])
+
+    cells = read_workbook(path)["Sales"]
+    assert cells["A1"] == ("inlineStr", "1", "ID")
+    assert cells["A2"] == ("inlineStr", None, str(sale_id))
+    assert cells["B2"] == (None, "2", "45292.5")
+    assert cells["C2"] == (None, "3", "61.0")
+    assert cells["D2"] == (None, None, "12.5")
+    assert cells["E2"] == ("b", None, "1")
+    # Escaped on the way in; the control character XML cannot hold is dropped.
+    assert cells["F2"] == ("inlineStr", None, "a < b & c")
+    assert "G2" not in cells
+    assert cells["A3"] == (None, None, "1")
+    assert cells["B3"] == (None, "2", "1.0")
+    assert cells["C3"] == (None, "3", "45351.0")
+    # NaN and infinity have no spreadsheet form and become empty cells.
+    assert "D3" not in cells and "G3" not in cells
+    assert cells["E3"] == ("b", None, "0")
+
+
+def test_sheet_names_are_valid_and_unique(tmp_path):
+    path = tmp_path / "sheets.xlsx"
+    long_name = "Quarterly sales by product and category"
+    with XlsxWriter(str(path)) as workbook:
+        for name in ("Sales", "sales", "Q1/Q2: [draft]", long_name, long_name, 'Say "hi" & <bye>'):
+            workbook.add_sheet(name, ["Value"])
+            workbook.write_row([name])
+
+    sheets = read_workbook(path)
+    assert list(sheets) == [
+        "Sales",
+        "sales (2)",
+        "Q1_Q2_ _draft_",
+        long_name[:31],
+        long_name[:27] + " (2)",
+        'Say "hi" & <bye>',
+    ]
+    assert all(len(name) <= 31 for name in sheets)
+    # Each sheet holds its own rows.
+    assert [cells["A2"][2] for cells in sheets.values()][-1] == 'Say "hi" & <bye>'
+    assert sheets["sales (2)"]["A2"][2] == "sales"
+
+
+def test_empty_workbook_still_opens(tmp_path):
+    path = tmp_path / "empty.xlsx"
+    XlsxWriter(str(path)).close()
+    assert read_workbook(path) == {"Sheet1": {}}